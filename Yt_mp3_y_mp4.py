@@ -1,9 +1,9 @@
 import os
-import re
-import yt_dlp
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import threading
+
+import ytmusicdown
 
 # ============ CONFIGURACIÓN DE ESTILO ============
 BG_COLOR = "#e6f0ff"        
@@ -18,81 +18,76 @@ FONT_LABEL = ("Arial", 11)
 FONT_BUTTON = ("Arial", 11, "bold")
 FONT_SMALL = ("Arial", 9)
 
-INVALID_CHARS = r'[<>:"/\\|?*\x00-\x1F]'
 cookies_path = None
 
 # ============ LÓGICA DE DESCARGA ============
 
-def sanitize_filename(filename):
-    return re.sub(INVALID_CHARS, '_', filename)
-
-def obtener_info_playlist(url):
-    ydl_opts = {'quiet': True, 'skip_download': True, 'extract_flat': True}
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info_dict = ydl.extract_info(url, download=False)
-        nombre_playlist = info_dict.get('title', 'Playlist')
-        nombre_artista = 'Artista'
-        if 'entries' in info_dict and len(info_dict['entries']) > 0:
-            first_entry = info_dict['entries'][0]
-            if first_entry:
-                nombre_artista = first_entry.get('uploader') or first_entry.get('artist') or 'Varios'
-        return nombre_playlist, nombre_artista
-
-def descargar_playlist(url, download_dir, format_type, progress_var, status_var, btn_control):
-    try:
-        btn_control("disabled")
-        status_var.set("Analizando enlace...")
-        
-        nombre_playlist, nombre_artista = obtener_info_playlist(url)
-        nombre_carpeta = sanitize_filename(f"{nombre_artista} - {nombre_playlist}")
-        
-        full_download_dir = os.path.join(download_dir, nombre_carpeta)
-        if not os.path.exists(full_download_dir):
-            os.makedirs(full_download_dir)
-
-        ydl_opts = {
-            'outtmpl': os.path.join(full_download_dir, '%(playlist_index)02d - %(title)s.%(ext)s'),
-            'progress_hooks': [lambda d: progress_callback(d, progress_var, status_var)],
-            'ignoreerrors': True,
-            'geo_bypass': True,
-            'cookiefile': cookies_path if cookies_path else None,
-        }
-
-        if format_type == "MP3":
-            ydl_opts.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '192'}],
-            })
-        else:
-            # Configuración simplificada: Busca el mejor MP4 que ya contenga audio y video (single)
-            ydl_opts.update({
-                'format': 'best[ext=mp4]/best',
-            })
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-
-        status_var.set("¡Completado con éxito!")
-        progress_var.set(100)
-        messagebox.showinfo("Éxito", f"Archivos guardados en:\n{nombre_carpeta}")
-    except Exception as e:
-        status_var.set("Error detectado")
-        messagebox.showerror("Error", str(e))
-    finally:
-        btn_control("normal")
-
-def progress_callback(d, progress_var, status_var):
-    if d['status'] == 'downloading':
-        total = d.get('total_bytes') or d.get('total_bytes_estimate')
-        if total:
-            p = (d['downloaded_bytes'] / total) * 100
-            progress_var.set(p)
-            status_var.set(f"Descargando... {int(p)}%")
-    elif d['status'] == 'finished':
-        status_var.set("Finalizando archivo...")
+# Cola de trabajos: cada URL añadida se descarga en segundo plano, con concurrencia acotada.
+# El diario la conserva entre sesiones: lo que quedó a medias al cerrar se reanuda al abrir.
+# Cada trabajo deja además un log de eventos con lo que tardó cada etapa de cada pista.
+# La caché de metadatos, el diario y la cola se crean con la ventana ya a la vista (ver
+# iniciar_segundo_plano): la cola reanuda enseguida los trabajos del diario, que importan
+# yt_dlp en sus hilos y competirían con la creación de la ventana.
+cache_metadatos = None
+gestor = None
+
+# yt-dlp (importación, extractores, sesión HTTP) se carga en segundo plano cuando la
+# ventana ya está a la vista; hasta entonces, la URL espera para validarse
+precarga = None
+
+def descripcion_trabajo(trabajo):
+    if trabajo.estado == "Error":
+        return f"Error: {trabajo.error}"
+    if trabajo.estado == "Completado" and trabajo.resultado.fallidas:
+        return f"Completado, {len(trabajo.resultado.fallidas)} pistas fallidas"
+    if trabajo.estado == "Completado" and trabajo.resultado.diagnostico:
+        return f"Completado (limitado por {trabajo.resultado.diagnostico.limitado_por})"
+    return trabajo.estado
 
 # ============ INTERFAZ GRÁFICA ============
 
+# La URL se valida cuando se deja de escribir: buscar su extractor cuesta milisegundos por intento
+ESPERA_VALIDACION = 300   # ms
+validacion_pendiente = None
+
+def programar_validacion(*_):
+    global validacion_pendiente
+    if validacion_pendiente is not None:
+        root.after_cancel(validacion_pendiente)
+    validacion_pendiente = root.after(ESPERA_VALIDACION, validar_url)
+
+def validar_url():
+    global validacion_pendiente
+    validacion_pendiente = None
+    url = url_var.get().strip()
+    if not url:
+        lbl_url.config(text="")
+    elif precarga is None or not precarga.lista:
+        lbl_url.config(text="Preparando yt-dlp...", foreground="gray")
+    elif precarga.error:
+        lbl_url.config(text=f"yt-dlp no está disponible: {precarga.error}", foreground="red")
+    else:
+        extractor = precarga.extractor(url)
+        if extractor:
+            lbl_url.config(text=f"✓ Enlace reconocido ({extractor})", foreground=ACCENT_COLOR)
+        else:
+            lbl_url.config(text="✗ yt-dlp no reconoce este enlace", foreground="red")
+
+def iniciar_segundo_plano():
+    global cache_metadatos, gestor, precarga
+    precarga = ytmusicdown.Precarga().iniciar()
+    cache_metadatos = ytmusicdown.CacheMetadatos()  # metadatos de yt-dlp reutilizados entre ejecuciones
+    gestor = ytmusicdown.GestorTrabajos(diario=ytmusicdown.DiarioTrabajos(), carpeta_eventos=ytmusicdown.RUTA_EVENTOS,
+                                        ajustes=ytmusicdown.AjustesDescarga(cache=cache_metadatos))
+    esperar_precarga()
+
+def esperar_precarga():
+    # Sin bloquear el hilo de Tk: al terminar, se valida lo que ya se haya escrito
+    if precarga.lista:
+        validar_url()
+    else:
+        root.after(50, esperar_precarga)
+
 def seleccionar_carpeta():
     folder = filedialog.askdirectory()
     if folder: folder_var.set(folder)
@@ -104,19 +99,101 @@ def importar_cookies():
         cookies_path = file
         lbl_cookies.config(text=f"✓ Cookies: {os.path.basename(file)}", foreground=ACCENT_COLOR)
 
+def refrescar_progreso():
+    # Se aplica solo el último estado de cada pista, a ritmo fijo, desde el hilo de Tk
+    # La primera vez, antes de iniciar_segundo_plano, aún no hay cola
+    trabajos = gestor.trabajos() if gestor else []
+    for trabajo in trabajos:
+        trabajo.progreso.drenar()
+    actualizar_filas(trabajos)
+    activos = [t for t in trabajos if not t.terminado]
+    if activos:
+        progress_var.set(sum(t.progreso.porcentaje for t in activos) / len(activos))
+        en_curso = sum(1 for t in activos if t.estado == "Descargando")
+        status_var.set(f"Descargando... {en_curso} en curso, {len(activos) - en_curso} en cola o en pausa")
+    elif trabajos:
+        progress_var.set(100)
+        if all(t.estado == "Completado" and not t.resultado.fallidas for t in trabajos):
+            status_var.set("¡Completado con éxito!")
+        elif all(t.estado == "Completado" for t in trabajos):
+            status_var.set("Cola terminada: algunas pistas no se pudieron descargar (ver pistas fallidas)")
+        else:
+            status_var.set("Cola terminada: revisa los trabajos con error o cancelados")
+    root.after(1000 // ytmusicdown.FPS_PROGRESO, refrescar_progreso)
+
+def actualizar_filas(trabajos):
+    # Una fila por trabajo y, colgando de ella, una por pista en curso: las que terminan (bien o con
+    # error) se quitan, y las fallidas quedan contadas en la fila del trabajo
+    for trabajo in trabajos:
+        iid = f"t{trabajo.id}"
+        titulo = trabajo.progreso.estado.removeprefix("Descargando playlist: ") or trabajo.url
+        valores = (f"{int(trabajo.progreso.porcentaje)}%", f"{descripcion_trabajo(trabajo)} · P{trabajo.prioridad}")
+        if lista_pistas.exists(iid):
+            lista_pistas.item(iid, text=titulo, values=valores)
+        else:
+            lista_pistas.insert("", tk.END, iid=iid, text=titulo, values=valores, open=True)
+        pendientes = set(lista_pistas.get_children(iid))
+        for clave, pista in trabajo.progreso.pistas.items():
+            if pista.estado in ("Terminada", "Error"):
+                continue
+            hijo = f"{iid}:{clave}"
+            valores = (f"{int(pista.porcentaje)}%", pista.estado)
+            if hijo in pendientes:
+                lista_pistas.item(hijo, values=valores)
+                pendientes.discard(hijo)
+            else:
+                lista_pistas.insert(iid, tk.END, iid=hijo, text=pista.titulo, values=valores)
+        if pendientes:
+            lista_pistas.delete(*pendientes)
+
+def trabajo_seleccionado():
+    seleccion = lista_pistas.selection()
+    if not seleccion:
+        return None
+    return int(seleccion[0].split(":")[0][1:])
+
+def sobre_seleccion(accion):
+    id_trabajo = trabajo_seleccionado()
+    if id_trabajo is not None:
+        accion(id_trabajo)
+
+def mover_prioridad(delta):
+    def accion(id_trabajo):
+        trabajo = next(t for t in gestor.trabajos() if t.id == id_trabajo)
+        gestor.cambiar_prioridad(id_trabajo, trabajo.prioridad + delta)
+    sobre_seleccion(accion)
+
 def ejecutar():
     url = ent_url.get()
     dest = folder_var.get()
     fmt = cmb_format.get()
     if url and dest:
-        progress_var.set(0)
-        threading.Thread(target=descargar_playlist, args=(url, dest, fmt, progress_var, status_var, lambda s: btn_run.config(state=s)), daemon=True).start()
+        if precarga.lista and not precarga.error and not precarga.extractor(url) and not messagebox.askyesno(
+                "Enlace no reconocido", "yt-dlp no reconoce este enlace. ¿Añadirlo a la cola igualmente?"):
+            return
+        gestor.agregar(url, dest, fmt, cookiefile=cookies_path)
+        ent_url.delete(0, tk.END)
     else:
         messagebox.showwarning("Campos vacíos", "Por favor ingresa la URL y la ruta de guardado.")
 
+def cerrar_ventana():
+    # Interrumpe red y ffmpeg de los trabajos en curso; el diario los reanuda en la próxima sesión.
+    # Sus hilos se esperan fuera del de Tk, que sigue pintando la ventana mientras tanto
+    status_var.set("Guardando la cola de descargas...")
+    root.protocol("WM_DELETE_WINDOW", lambda: None)
+    cierre = threading.Thread(target=gestor.cerrar, name='cierre', daemon=True)
+    cierre.start()
+    esperar_cierre(cierre)
+
+def esperar_cierre(cierre):
+    if cierre.is_alive():
+        root.after(50, esperar_cierre, cierre)
+    else:
+        root.destroy()
+
 root = tk.Tk()
 root.title("YT Downloader Ew")
-root.geometry("700x600")
+root.geometry("700x800")
 root.configure(bg=BG_COLOR)
 
 style = ttk.Style()
@@ -131,6 +208,8 @@ style.configure("Main.TButton", background=BUTTON_COLOR, foreground="white", fon
 style.map("Main.TButton", background=[('active', '#357abd'), ('disabled', '#a0c4ff')])
 style.configure("Horizontal.TProgressbar", background=BUTTON_COLOR, troughcolor=BG_COLOR, thickness=15)
 
+url_var = tk.StringVar()
+url_var.trace_add("write", programar_validacion)
 folder_var = tk.StringVar(value=os.path.expanduser("~"))
 progress_var = tk.DoubleVar(value=0)
 status_var = tk.StringVar(value="Esperando instrucciones...")
@@ -143,8 +222,10 @@ card = ttk.Frame(root, style="Card.TFrame", padding=40)
 card.pack(padx=30, pady=10, fill=tk.BOTH, expand=True)
 
 ttk.Label(card, text="URL del Video o Playlist:", font=FONT_TITLE_MEDIUM).pack(anchor="w")
-ent_url = ttk.Entry(card, font=("Arial", 11))
-ent_url.pack(fill=tk.X, pady=(5, 20))
+ent_url = ttk.Entry(card, textvariable=url_var, font=("Arial", 11))
+ent_url.pack(fill=tk.X, pady=(5, 0))
+lbl_url = ttk.Label(card, text="", font=FONT_SMALL)
+lbl_url.pack(anchor="w", pady=(2, 12))
 
 ttk.Label(card, text="Directorio de descarga:", font=FONT_TITLE_MEDIUM).pack(anchor="w")
 f_frame = ttk.Frame(card, style="Card.TFrame")
@@ -163,7 +244,7 @@ fmt_box.pack(side=tk.LEFT, fill=tk.X, expand=True)
 ttk.Label(fmt_box, text="Formato final:", font=FONT_TITLE_MEDIUM).pack(anchor="w")
 
 # COMBOBOX SIMPLIFICADO
-cmb_format = ttk.Combobox(fmt_box, values=["MP3", "MP4"], state="readonly")
+cmb_format = ttk.Combobox(fmt_box, values=["MP3", "AUDIO", "M4A", "OPUS", "MP4", "MP3+MP4"], state="readonly")
 cmb_format.current(0)
 cmb_format.pack(anchor="w", pady=5)
 
@@ -175,7 +256,7 @@ btn_cook.pack(pady=5)
 lbl_cookies = ttk.Label(cook_box, text="Sin cookies cargadas", font=FONT_SMALL, foreground="gray")
 lbl_cookies.pack()
 
-btn_run = ttk.Button(card, text="DESCARGAR AHORA", style="Main.TButton", command=ejecutar, cursor="hand2")
+btn_run = ttk.Button(card, text="AÑADIR A LA COLA", style="Main.TButton", command=ejecutar, cursor="hand2")
 btn_run.pack(fill=tk.X, pady=(20, 0), ipady=12)
 
 pb = ttk.Progressbar(card, variable=progress_var, maximum=100, style="Horizontal.TProgressbar")
@@ -184,4 +265,25 @@ pb.pack(fill=tk.X, pady=(20, 5))
 lbl_status = ttk.Label(card, textvariable=status_var, style="Status.TLabel", anchor="center")
 lbl_status.pack(fill=tk.X)
 
+# Una fila por trabajo, con sus pistas en curso debajo, compartiendo la barra de progreso
+lista_pistas = ttk.Treeview(card, columns=("progreso", "estado"), show="tree headings", height=6)
+lista_pistas.heading("#0", text="Trabajo / Pista")
+lista_pistas.heading("progreso", text="%")
+lista_pistas.heading("estado", text="Estado")
+lista_pistas.column("#0", width=330)
+lista_pistas.column("progreso", width=50, anchor="center")
+lista_pistas.column("estado", width=170)
+lista_pistas.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
+
+acciones = ttk.Frame(card, style="Card.TFrame")
+acciones.pack(fill=tk.X, pady=(5, 0))
+ttk.Button(acciones, text="Pausar", command=lambda: sobre_seleccion(gestor.pausar)).pack(side=tk.LEFT)
+ttk.Button(acciones, text="Reanudar", command=lambda: sobre_seleccion(gestor.reanudar)).pack(side=tk.LEFT, padx=5)
+ttk.Button(acciones, text="Cancelar", command=lambda: sobre_seleccion(gestor.cancelar)).pack(side=tk.LEFT)
+ttk.Button(acciones, text="▼ Prioridad", command=lambda: mover_prioridad(-1)).pack(side=tk.RIGHT)
+ttk.Button(acciones, text="▲ Prioridad", command=lambda: mover_prioridad(+1)).pack(side=tk.RIGHT, padx=5)
+
+root.protocol("WM_DELETE_WINDOW", cerrar_ventana)
+refrescar_progreso()
+root.after_idle(iniciar_segundo_plano)
 root.mainloop()
\ No newline at end of file
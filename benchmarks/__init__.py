@@ -0,0 +1 @@
+"""Benchmarks de YTMusicDown sin red: servidor de medios local y extractor falso de yt-dlp."""
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .escenario import ESCENARIOS
+from .medios import generar_medios
+from .servidor import ServidorMedios
+
+# ============ RUNNER DE BENCHMARKS ============
+#
+# python -m benchmarks [--escenarios mp3,mp4] [--pistas 20] [--comparar base.json]
+#
+# Genera los medios, levanta el servidor local y ejecuta cada escenario varias veces,
+# cada una en un proceso nuevo. Guarda las medianas y las repeticiones en JSON y, con
+# --comparar, marca como regresión lo que empeore más que la tolerancia.
+#
+# Necesita ffmpeg y ffprobe: yt-dlp usa ffprobe para rehacer el contenedor de las
+# descargas HLS y ffmpeg para unir vídeo y audio y para la transcodificación a MP3.
+#
+# La CPU por pista que ahorra copiar el flujo en vez de transcodificar se mide aparte,
+# con python -m benchmarks.cpu_audio.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARPETA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+CARPETA_MEDIOS = os.path.join(tempfile.gettempdir(), 'ytmusicdown-benchmarks', 'medios')
+
+MENOR_ES_MEJOR = ('duracion', 'primera_pista', 'rss_max_mb', 'cpu_proceso', 'cpu_transcodificacion', 'cpu_por_pista',
+                  'conexiones_http')
+MAYOR_ES_MEJOR = ('pistas_por_segundo', 'mb_por_segundo')
+
+def ejecutar_escenario(nombre, url_servidor, pistas, hilos, ffmpeg=None):
+    with tempfile.TemporaryDirectory(prefix='ytmusicdown-bench-') as destino:
+        comando = [sys.executable, '-m', 'benchmarks.escenario', nombre, destino,
+                   '--pistas', str(pistas), '--hilos', str(hilos)]
+        if ffmpeg:
+            comando += ['--ffmpeg', ffmpeg]
+        proceso = subprocess.run(comando, cwd=RAIZ, env={**os.environ, 'YTMD_BENCH_URL': url_servidor},
+                                 capture_output=True, text=True)
+        if proceso.returncode != 0:
+            raise RuntimeError(f'El escenario {nombre} falló:\n{proceso.stderr}')
+        return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+def medianas(repeticiones):
+    resumen = {}
+    for metrica in (*MENOR_ES_MEJOR, *MAYOR_ES_MEJOR):
+        valores = [r[metrica] for r in repeticiones if r.get(metrica) is not None]
+        resumen[metrica] = statistics.median(valores) if valores else None
+    return resumen
+
+def comparar(base, actual, tolerancia):
+    """Devuelve [(escenario, métrica, antes, ahora, cambio)] de lo que empeoró más que tolerancia."""
+    regresiones = []
+    for nombre, datos in actual['escenarios'].items():
+        anterior = base.get('escenarios', {}).get(nombre)
+        if not anterior:
+            continue
+        for metrica, ahora in datos['mediana'].items():
+            antes = anterior['mediana'].get(metrica)
+            if not antes or ahora is None:
+                continue
+            cambio = (ahora - antes) / antes
+            if (metrica in MENOR_ES_MEJOR and cambio > tolerancia
+                    or metrica in MAYOR_ES_MEJOR and cambio < -tolerancia):
+                regresiones.append((nombre, metrica, antes, ahora, cambio))
+    return regresiones
+
+def crear_parser():
+    from ytmusicdown import DESCARGAS_SIMULTANEAS
+
+    parser = argparse.ArgumentParser(
+        prog='benchmarks', description='Benchmarks de descarga sin red, contra un servidor de medios local.')
+    parser.add_argument('--escenarios', default=','.join(ESCENARIOS),
+                        help=f'escenarios separados por comas (por defecto: {",".join(ESCENARIOS)})')
+    parser.add_argument('--pistas', type=int, default=20, help='pistas de cada playlist')
+    parser.add_argument('-j', '--hilos', type=int, default=DESCARGAS_SIMULTANEAS, help='pistas descargadas a la vez')
+    parser.add_argument('--repeticiones', type=int, default=3, help='ejecuciones de cada escenario')
+    parser.add_argument('--latencia', type=float, default=0.05, help='segundos de latencia por petición HTTP')
+    parser.add_argument('--ancho-banda', type=int, help='KiB/s por conexión (por defecto, sin límite)')
+    parser.add_argument('--ffmpeg', help='ruta al ejecutable de ffmpeg')
+    parser.add_argument('--salida', help='archivo JSON de resultados (por defecto, en benchmarks/resultados)')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior con el que comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.10, help='empeoramiento relativo admitido (0.10 = 10%%)')
+    return parser
+
+def main(argv=None):
+    import yt_dlp.version
+
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    escenarios = [nombre.strip() for nombre in args.escenarios.split(',') if nombre.strip()]
+    desconocidos = [nombre for nombre in escenarios if nombre not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f'Escenarios desconocidos: {", ".join(desconocidos)}')
+
+    print('Generando medios sintéticos...', file=sys.stderr)
+    generar_medios(CARPETA_MEDIOS, args.ffmpeg or 'ffmpeg')
+    ancho_banda = args.ancho_banda * 1024 if args.ancho_banda else None
+
+    resultados = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parametros': {
+            'pistas': args.pistas, 'hilos': args.hilos, 'repeticiones': args.repeticiones,
+            'latencia': args.latencia, 'ancho_banda': ancho_banda,
+        },
+        'escenarios': {},
+    }
+    with ServidorMedios(CARPETA_MEDIOS, args.latencia, ancho_banda) as servidor:
+        for nombre in escenarios:
+            repeticiones = []
+            for numero in range(1, args.repeticiones + 1):
+                print(f'[{nombre} {numero}/{args.repeticiones}]', file=sys.stderr)
+                conexiones = servidor.conexiones
+                repeticion = ejecutar_escenario(nombre, servidor.url, args.pistas, args.hilos, args.ffmpeg)
+                # Conexiones TCP que abrió el escenario: con la SesionHTTP, muchas menos que peticiones
+                repeticion['conexiones_http'] = servidor.conexiones - conexiones
+                repeticiones.append(repeticion)
+            fallidas = max(args.pistas - r['descargadas'] + r['errores_transcodificacion'] for r in repeticiones)
+            if fallidas:
+                print(f'  AVISO: {fallidas} pistas de {nombre} fallaron; sus tiempos no son comparables',
+                      file=sys.stderr)
+            resumen = medianas(repeticiones)
+            resultados['escenarios'][nombre] = {'mediana': resumen, 'repeticiones': repeticiones}
+            print(f'  {nombre}: {resumen["duracion"]:.2f} s, {resumen["pistas_por_segundo"]:.2f} pistas/s, '
+                  f'primera pista {resumen["primera_pista"] or 0:.2f} s', file=sys.stderr)
+
+    salida = args.salida or os.path.join(CARPETA_RESULTADOS, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=1)
+    print(f'Resultados guardados en {salida}', file=sys.stderr)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(base, resultados, args.tolerancia)
+        for nombre, metrica, antes, ahora, cambio in regresiones:
+            print(f'REGRESIÓN {nombre}.{metrica}: {antes:.3f} -> {ahora:.3f} ({cambio:+.0%})', file=sys.stderr)
+        if regresiones:
+            return 1
+        print(f'Sin regresiones respecto a {args.comparar}', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
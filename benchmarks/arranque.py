@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ============ COSTE DE ARRANQUE ============
+#
+# python -m benchmarks.arranque [--repeticiones 5] [--salida base.json] [--comparar base.json]
+#
+# Mide, cada vez en un intérprete nuevo, lo que cuesta arrancar antes de la primera
+# descarga:
+#   ytmusicdown   import ytmusicdown, lo único que paga la interfaz antes de mostrar su ventana
+#   importacion   importar yt_dlp y sus extractores          \
+#   extractores   compilar la expresión regular de cada uno    > la Precarga, en segundo plano
+#   sesion        crear el tarro de cookies y las conexiones   /
+#   validacion    buscar el extractor de una URL con la precarga ya hecha
+#   proceso       el proceso entero, con el arranque del intérprete
+# Avisa si import ytmusicdown llega a importar yt_dlp, que dejaría de estar diferido.
+# Con --comparar, marca como regresión la etapa cuya mediana empeore más que la tolerancia
+# y sale con código 1. Las diez importaciones más lentas de ytmusicdown (según
+# python -X importtime) van también en el JSON, para ver qué módulo se ha encarecido.
+
+ETAPAS = ('ytmusicdown', 'importacion', 'extractores', 'sesion', 'validacion', 'proceso')
+URL_VALIDACION = 'https://music.youtube.com/playlist?list=OLAK5uy_ytmusicdown'
+
+def medir_proceso():
+    """Tiempos de arranque de este intérprete, que aún no debe haber importado ytmusicdown."""
+    inicio = time.perf_counter()
+    import ytmusicdown
+
+    medidas = {'ytmusicdown': time.perf_counter() - inicio, 'yt_dlp_diferido': 'yt_dlp' not in sys.modules}
+    precarga = ytmusicdown.Precarga().iniciar()
+    precarga.esperar()
+    if precarga.error:
+        raise precarga.error
+    medidas.update(precarga.duraciones)
+    inicio = time.perf_counter()
+    precarga.extractor(URL_VALIDACION)
+    medidas['validacion'] = time.perf_counter() - inicio
+    return medidas
+
+def _ejecutar():
+    inicio = time.perf_counter()
+    proceso = subprocess.run([sys.executable, '-m', 'benchmarks.arranque', '--proceso'], cwd=RAIZ,
+                             capture_output=True, text=True)
+    duracion = time.perf_counter() - inicio
+    if proceso.returncode != 0:
+        raise RuntimeError(f'La medida de arranque falló:\n{proceso.stderr}')
+    return {**json.loads(proceso.stdout.strip().splitlines()[-1]), 'proceso': duracion}
+
+def importaciones_lentas(cantidad=10):
+    """[(módulo, segundos acumulados)] de las importaciones más lentas de import ytmusicdown."""
+    proceso = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ytmusicdown'], cwd=RAIZ,
+                             capture_output=True, text=True)
+    modulos = []
+    for linea in proceso.stderr.splitlines():
+        # "import time: propio | acumulado | módulo", en microsegundos
+        partes = linea.removeprefix('import time:').split('|')
+        if len(partes) == 3 and partes[1].strip().isdigit():
+            modulos.append((partes[2].strip(), int(partes[1]) / 1e6))
+    return sorted(modulos, key=lambda modulo: modulo[1], reverse=True)[:cantidad]
+
+def medir(repeticiones=5):
+    """{'mediana': {etapa: segundos}, 'repeticiones': [...], 'importaciones': [...]}."""
+    resultados = []
+    for numero in range(1, repeticiones + 1):
+        print(f'[arranque {numero}/{repeticiones}]', file=sys.stderr)
+        resultados.append(_ejecutar())
+    mediana = {etapa: statistics.median(r[etapa] for r in resultados) for etapa in ETAPAS}
+    return {
+        'mediana': mediana,
+        'yt_dlp_diferido': all(r['yt_dlp_diferido'] for r in resultados),
+        'repeticiones': resultados,
+        'importaciones': importaciones_lentas(),
+    }
+
+def comparar(base, actual, tolerancia):
+    """[(etapa, antes, ahora, cambio)] de las etapas que empeoraron más que tolerancia."""
+    regresiones = []
+    for etapa, ahora in actual['mediana'].items():
+        antes = base.get('mediana', {}).get(etapa)
+        if antes and (ahora - antes) / antes > tolerancia:
+            regresiones.append((etapa, antes, ahora, (ahora - antes) / antes))
+    return regresiones
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='benchmarks.arranque',
+        description='Coste de arranque: import ytmusicdown y la precarga de yt-dlp, en intérpretes nuevos.')
+    parser.add_argument('--repeticiones', type=int, default=5, help='intérpretes medidos')
+    parser.add_argument('--salida', help='archivo JSON donde guardar los resultados')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior con el que comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.20, help='empeoramiento relativo admitido (0.20 = 20%%)')
+    parser.add_argument('--proceso', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.proceso:
+        print(json.dumps(medir_proceso()))
+        return 0
+
+    resultados = medir(args.repeticiones)
+    for etapa in ETAPAS:
+        print(f'  {etapa:12s} {resultados["mediana"][etapa] * 1000:8.1f} ms', file=sys.stderr)
+    if not resultados['yt_dlp_diferido']:
+        print('  AVISO: import ytmusicdown importa yt_dlp; la ventana tendrá que esperarlo', file=sys.stderr)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=1)
+        print(f'Resultados guardados en {args.salida}', file=sys.stderr)
+    print(json.dumps(resultados['mediana']))
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regresiones = comparar(json.load(f), resultados, args.tolerancia)
+        for etapa, antes, ahora, cambio in regresiones:
+            print(f'REGRESIÓN {etapa}: {antes * 1000:.1f} ms -> {ahora * 1000:.1f} ms ({cambio:+.0%})',
+                  file=sys.stderr)
+        return 1 if regresiones or not resultados['yt_dlp_diferido'] else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
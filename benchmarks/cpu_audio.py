@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage no se puede medir la CPU de ffmpeg
+    resource = None
+
+from .medios import generar_medios
+
+# ============ CPU POR PISTA: COPIA DE FLUJO FRENTE A TRANSCODIFICAR ============
+#
+# python -m benchmarks.cpu_audio [--pistas 10] [--ffmpeg ruta]
+#
+# Procesa las mismas pistas (el audio AAC en .m4a y el Opus en .webm que sirve el
+# extractor falso) de tres formas y mide los segundos de CPU de ffmpeg por pista:
+#   extractaudio  FFmpegExtractAudio de yt-dlp a MP3 192k, el camino de las versiones antiguas
+#   mp3           la cola de ytmusicdown con el perfil MP3 (también transcodifica)
+#   audio         la cola con el perfil AUDIO: copia el flujo original, sin recodificar
+# y escribe el ahorro de 'audio' frente a 'extractaudio'. No necesita servidor ni red.
+
+ORIGENES = {'aac': 'audio.m4a', 'opus': 'audio.webm'}
+VARIANTES = ('extractaudio', 'mp3', 'audio')
+
+def _cpu_hijos():
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+def _copias(medio, carpeta, pistas):
+    extension = os.path.splitext(medio)[1]
+    archivos = []
+    for n in range(pistas):
+        archivo = os.path.join(carpeta, f'{n:03d}{extension}')
+        shutil.copyfile(medio, archivo)
+        archivos.append(archivo)
+    return archivos
+
+def _extractaudio(archivos, ffmpeg):
+    from yt_dlp import YoutubeDL
+    from yt_dlp.postprocessor import FFmpegExtractAudioPP
+
+    with YoutubeDL({'quiet': True, 'ffmpeg_location': ffmpeg}) as ydl:
+        pp = FFmpegExtractAudioPP(ydl, preferredcodec='mp3', preferredquality='192')
+        for archivo in archivos:
+            pp.run({'filepath': archivo, 'ext': os.path.splitext(archivo)[1].lstrip('.')})
+
+def _pipeline(archivos, codec, acodec, ffmpeg):
+    from ytmusicdown.perfiles import perfil_desde_texto
+    from ytmusicdown.transcodificacion import PipelineTranscodificacion
+
+    perfil = perfil_desde_texto(codec)
+    with PipelineTranscodificacion(perfil.codec, perfil.calidad, ffmpeg=ffmpeg) as pipeline:
+        for archivo in archivos:
+            pipeline.encolar(archivo, {'acodec': acodec})
+    return pipeline.diagnostico
+
+def medir(pistas, ffmpeg='ffmpeg', carpeta_medios=None):
+    """{origen: {variante: segundos de CPU por pista, ..., 'ahorro_por_pista': ...}}"""
+    carpeta_medios = carpeta_medios or os.path.join(tempfile.gettempdir(), 'ytmusicdown-benchmarks', 'medios')
+    generar_medios(carpeta_medios, ffmpeg)
+    resultados = {}
+    for acodec, nombre in ORIGENES.items():
+        resultados[acodec] = {}
+        for variante in VARIANTES:
+            with tempfile.TemporaryDirectory(prefix='ytmusicdown-cpu-') as carpeta:
+                archivos = _copias(os.path.join(carpeta_medios, nombre), carpeta, pistas)
+                antes = _cpu_hijos()
+                if variante == 'extractaudio':
+                    _extractaudio(archivos, ffmpeg)
+                else:
+                    diagnostico = _pipeline(archivos, variante.upper(), acodec, ffmpeg)
+                    if diagnostico.errores:
+                        raise RuntimeError(f'{diagnostico.errores} pistas fallaron en {variante} ({acodec})')
+                resultados[acodec][variante] = (_cpu_hijos() - antes) / pistas
+        resultados[acodec]['ahorro_por_pista'] = resultados[acodec]['extractaudio'] - resultados[acodec]['audio']
+    return resultados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks.cpu_audio',
+                                     description='Segundos de CPU por pista: copia de flujo frente a transcodificar.')
+    parser.add_argument('--pistas', type=int, default=10, help='pistas procesadas por variante')
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='ruta al ejecutable de ffmpeg')
+    args = parser.parse_args(argv)
+    if resource is None:
+        parser.error('Este benchmark necesita el módulo resource (Linux o macOS)')
+
+    resultados = medir(args.pistas, args.ffmpeg)
+    for acodec, datos in resultados.items():
+        print(f'{acodec}: ' + ', '.join(f'{variante} {datos[variante]:.3f} s' for variante in VARIANTES)
+              + f' -> ahorro {datos["ahorro_por_pista"]:.3f} s de CPU por pista', file=sys.stderr)
+    print(json.dumps(resultados))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage no hay RSS máximo ni CPU de los hijos
+    resource = None
+
+RUTA_PLUGINS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugins')
+
+# ============ UN ESCENARIO DE BENCHMARK ============
+#
+# Ejecuta una descarga de playlist contra el servidor local y escribe sus métricas como
+# una línea JSON en stdout. El runner (python -m benchmarks) lanza cada repetición en un
+# proceso nuevo para que el RSS máximo y la CPU de los hijos (ffmpeg) sean solo suyos.
+
+# nombre -> (medio que sirve el extractor falso, perfil de descarga)
+ESCENARIOS = {
+    'mp3': ('audio', 'MP3'),
+    'hls-mp3': ('hls', 'MP3'),
+    'opus-audio': ('opus', 'AUDIO'),   # copia del flujo Opus a .opus, sin recodificar
+    'm4a': ('audio', 'M4A'),           # el AAC ya llega en .m4a: ffmpeg solo lo reescribe con las etiquetas
+    'mp4': ('video', 'MP4'),
+    'mp4-720': ('video', 'MP4-720'),
+}
+
+def _cpu(uso):
+    return uso.ru_utime + uso.ru_stime
+
+def _rss_max_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB y macOS en bytes
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+class _PrimeraPista:
+    """Hilo que anota cuándo aparece el índice de la carpeta, es decir, la primera pista terminada."""
+
+    def __init__(self, destino, inicio):
+        self.patron = os.path.join(glob.escape(destino), '*', '.ytmusicdown-indice.json')
+        self.inicio = inicio
+        self.segundos = None
+        self._fin = threading.Event()
+        self._hilo = threading.Thread(target=self._vigilar, daemon=True)
+        self._hilo.start()
+
+    def _vigilar(self):
+        while not self._fin.wait(0.01):
+            if glob.glob(self.patron):
+                self.segundos = time.perf_counter() - self.inicio
+                return
+
+    def parar(self):
+        self._fin.set()
+        self._hilo.join()
+
+def medir(nombre, destino, pistas, hilos, ffmpeg=None):
+    sys.path.insert(0, RUTA_PLUGINS)
+    import ytmusicdown
+
+    medio, perfil = ESCENARIOS[nombre]
+    url = f'ytmdbench:playlist:{pistas}:{medio}'
+    hijos_antes = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+    propio_antes = resource.getrusage(resource.RUSAGE_SELF) if resource else None
+    inicio = time.perf_counter()
+    primera = _PrimeraPista(destino, inicio)
+    # Cachés nuevas en la carpeta de cada repetición: ni la carátula ni las medidas de la
+    # anterior abaratan esta, y no se escribe nada en ~/.ytmusicdown
+    caratulas = ytmusicdown.CacheCaratulas(os.path.join(destino, '.caratulas'))
+    sonoridad = ytmusicdown.CacheSonoridad(os.path.join(destino, '.sonoridad.sqlite3'))
+    try:
+        resultado = ytmusicdown.descargar_playlist(
+            url, destino, perfil, opciones={'quiet': True, 'noprogress': True},
+            ajustes=ytmusicdown.AjustesDescarga(hilos=hilos, ffmpeg=ffmpeg, caratulas=caratulas, sonoridad=sonoridad))
+    finally:
+        duracion = time.perf_counter() - inicio
+        primera.parar()
+
+    cpu_hijos = _cpu(resource.getrusage(resource.RUSAGE_CHILDREN)) - _cpu(hijos_antes) if resource else None
+    tamano = sum(os.path.getsize(os.path.join(resultado.carpeta, archivo))
+                 for archivo in os.listdir(resultado.carpeta) if not archivo.startswith('.'))
+    return {
+        'escenario': nombre,
+        'pistas': pistas,
+        'hilos': hilos,
+        'descargadas': resultado.descargadas,
+        'duracion': duracion,
+        'primera_pista': primera.segundos,
+        'pistas_por_segundo': resultado.descargadas / duracion,
+        'mb_por_segundo': tamano / (1024 * 1024) / duracion,
+        'rss_max_mb': _rss_max_mb(),
+        'cpu_proceso': _cpu(resource.getrusage(resource.RUSAGE_SELF)) - _cpu(propio_antes) if resource else None,
+        'cpu_transcodificacion': cpu_hijos,
+        'cpu_por_pista': cpu_hijos / resultado.descargadas if cpu_hijos is not None and resultado.descargadas else None,
+        'limitado_por': resultado.diagnostico.limitado_por if resultado.diagnostico else None,
+        'errores_transcodificacion': resultado.diagnostico.errores if resultado.diagnostico else 0,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks.escenario')
+    parser.add_argument('escenario', choices=sorted(ESCENARIOS))
+    parser.add_argument('destino')
+    parser.add_argument('--pistas', type=int, required=True)
+    parser.add_argument('--hilos', type=int, required=True)
+    parser.add_argument('--ffmpeg')
+    args = parser.parse_args(argv)
+    metricas = medir(args.escenario, args.destino, args.pistas, args.hilos, args.ffmpeg)
+    print(json.dumps(metricas))
+
+if __name__ == '__main__':
+    main()
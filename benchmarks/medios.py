@@ -0,0 +1,42 @@
+import os
+import subprocess
+
+# ============ MEDIOS SINTÉTICOS ============
+#
+# Archivos generados con ffmpeg (lavfi) que el servidor local sirve como si fueran
+# los formatos de YouTube: audio AAC, audio Opus en webm, vídeo H.264 solo imagen, un
+# MP4 con ambos, la versión HLS del audio en fragmentos .ts y una miniatura JPEG que
+# hace de carátula. Se generan una vez por duración y ffmpeg.
+
+DURACION_AUDIO = 30
+DURACION_VIDEO = 10
+
+def _ffmpeg(ffmpeg, *argumentos):
+    subprocess.run([ffmpeg, '-y', '-loglevel', 'error', *argumentos], check=True)
+
+def generar_medios(carpeta, ffmpeg='ffmpeg', duracion_audio=DURACION_AUDIO, duracion_video=DURACION_VIDEO):
+    """Genera (si faltan) los medios en carpeta y devuelve la carpeta."""
+    os.makedirs(os.path.join(carpeta, 'hls'), exist_ok=True)
+    audio = os.path.join(carpeta, 'audio.m4a')
+    opus = os.path.join(carpeta, 'audio.webm')
+    video = os.path.join(carpeta, 'video.mp4')
+    muxed = os.path.join(carpeta, 'muxed.mp4')
+    hls = os.path.join(carpeta, 'hls', 'audio.m3u8')
+    caratula = os.path.join(carpeta, 'caratula.jpg')
+    if not os.path.exists(audio):
+        _ffmpeg(ffmpeg, '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duracion_audio}',
+                '-c:a', 'aac', '-b:a', '128k', audio)
+    if not os.path.exists(opus):
+        _ffmpeg(ffmpeg, '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duracion_audio}',
+                '-c:a', 'libopus', '-b:a', '160k', opus)
+    if not os.path.exists(video):
+        _ffmpeg(ffmpeg, '-f', 'lavfi', '-i', f'testsrc=size=1280x720:rate=30:duration={duracion_video}',
+                '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', video)
+    if not os.path.exists(muxed):
+        _ffmpeg(ffmpeg, '-i', video, '-i', audio, '-t', str(duracion_video), '-c', 'copy', muxed)
+    if not os.path.exists(hls):
+        _ffmpeg(ffmpeg, '-i', audio, '-c', 'copy', '-f', 'hls', '-hls_time', '2', '-hls_playlist_type', 'vod',
+                '-hls_segment_filename', os.path.join(carpeta, 'hls', 'audio%03d.ts'), hls)
+    if not os.path.exists(caratula):
+        _ffmpeg(ffmpeg, '-f', 'lavfi', '-i', 'testsrc=size=480x360', '-frames:v', '1', caratula)
+    return carpeta
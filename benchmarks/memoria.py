@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage no hay RSS máximo
+    resource = None
+
+from .medios import generar_medios
+from .servidor import ServidorMedios
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_PLUGINS = os.path.join(RAIZ, 'benchmarks', 'plugins')
+CARPETA_MEDIOS = os.path.join(tempfile.gettempdir(), 'ytmusicdown-benchmarks', 'medios')
+
+# ============ RSS MÁXIMO FRENTE AL TAMAÑO DE LA PLAYLIST ============
+#
+# python -m benchmarks.memoria [--tamanos 100,300,1000] [--idiomas 150] [--ffmpeg ruta]
+#
+# Descarga playlists de varios tamaños con y sin memoria_acotada, cada una en un proceso
+# nuevo, y escribe el RSS máximo de cada ejecución. Los vídeos del extractor falso traen
+# subtítulos automáticos en --idiomas idiomas para que su info_dict pese como los de
+# YouTube. Con memoria_acotada, el RSS debe quedarse plano al crecer la playlist.
+#
+# El perfil es M4A sin etiquetas: el AAC servido se conserva tal cual y ffmpeg no se
+# ejecuta, así que lo medido es solo el motor de descargas.
+
+TAMANOS = (100, 300, 1000)
+IDIOMAS = 150
+MODOS = ('normal', 'acotada')
+
+def _rss_max_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB y macOS en bytes
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def medir_proceso(pistas, modo, destino, hilos):
+    """Descarga una playlist de pistas entradas en este proceso y devuelve sus métricas."""
+    sys.path.insert(0, RUTA_PLUGINS)
+    import ytmusicdown
+
+    inicio = time.perf_counter()
+    resultado = ytmusicdown.descargar_playlist(
+        f'ytmdbench:playlist:{pistas}:audio', destino, 'M4A', opciones={'quiet': True, 'noprogress': True},
+        ajustes=ytmusicdown.AjustesDescarga(hilos=hilos, deduplicar=False, etiquetar=False,
+                                            memoria_acotada=modo == 'acotada'))
+    return {
+        'pistas': pistas,
+        'modo': modo,
+        'descargadas': resultado.descargadas,
+        'duracion': time.perf_counter() - inicio,
+        'rss_max_mb': _rss_max_mb(),
+    }
+
+def _ejecutar(pistas, modo, hilos, url_servidor, idiomas):
+    with tempfile.TemporaryDirectory(prefix='ytmusicdown-memoria-') as destino:
+        comando = [sys.executable, '-m', 'benchmarks.memoria', '--proceso', str(pistas), modo, destino,
+                   '--hilos', str(hilos)]
+        entorno = {**os.environ, 'YTMD_BENCH_URL': url_servidor, 'YTMD_BENCH_IDIOMAS': str(idiomas),
+                   'YTMD_BENCH_PAGINA': '0'}
+        proceso = subprocess.run(comando, cwd=RAIZ, env=entorno, capture_output=True, text=True)
+        if proceso.returncode != 0:
+            raise RuntimeError(f'La playlist de {pistas} pistas ({modo}) falló:\n{proceso.stderr}')
+        return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+def medir(tamanos=TAMANOS, idiomas=IDIOMAS, hilos=4, ffmpeg='ffmpeg'):
+    """[{pistas, modo, descargadas, duracion, rss_max_mb}] de cada tamaño en cada modo."""
+    generar_medios(CARPETA_MEDIOS, ffmpeg)
+    resultados = []
+    with ServidorMedios(CARPETA_MEDIOS, 0.0, None) as servidor:
+        for pistas in tamanos:
+            for modo in MODOS:
+                print(f'[{pistas} pistas, {modo}]', file=sys.stderr)
+                resultados.append(_ejecutar(pistas, modo, hilos, servidor.url, idiomas))
+    return resultados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='benchmarks.memoria',
+        description='RSS máximo frente al tamaño de la playlist, con y sin memoria_acotada.')
+    parser.add_argument('--tamanos', default=','.join(map(str, TAMANOS)), help='pistas de cada playlist, por comas')
+    parser.add_argument('--idiomas', type=int, default=IDIOMAS, help='idiomas de subtítulos de cada vídeo')
+    parser.add_argument('-j', '--hilos', type=int, default=4, help='pistas descargadas a la vez')
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='ruta al ejecutable de ffmpeg (para generar los medios)')
+    parser.add_argument('--proceso', nargs=3, metavar=('PISTAS', 'MODO', 'DESTINO'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if resource is None:
+        parser.error('Este benchmark necesita el módulo resource (Linux o macOS)')
+
+    if args.proceso:
+        pistas, modo, destino = args.proceso
+        print(json.dumps(medir_proceso(int(pistas), modo, destino, args.hilos)))
+        return
+
+    tamanos = [int(tamano) for tamano in args.tamanos.split(',') if tamano.strip()]
+    resultados = medir(tamanos, args.idiomas, args.hilos, args.ffmpeg)
+    for pistas in tamanos:
+        fila = {r['modo']: r for r in resultados if r['pistas'] == pistas}
+        print(f'{pistas:6d} pistas: ' + ', '.join(f'{modo} {fila[modo]["rss_max_mb"]:.0f} MB '
+                                                  f'({fila[modo]["duracion"]:.1f} s)' for modo in MODOS),
+              file=sys.stderr)
+    print(json.dumps(resultados))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import functools
+import os
+import time
+
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import OnDemandPagedList
+
+# ============ EXTRACTOR FALSO PARA LOS BENCHMARKS ============
+#
+# yt-dlp carga este módulo como plugin cuando benchmarks/plugins está en sys.path.
+# Resuelve URL del tipo 'ytmdbench:playlist:<pistas>:<medio>' y
+# 'ytmdbench:video:<n>:<medio>' con formatos servidos por benchmarks.servidor, cuya
+# dirección llega por la variable de entorno YTMD_BENCH_URL.
+#
+# Como en YouTube, la playlist se pagina: cada página de TAMANO_PAGINA entradas tarda
+# YTMD_BENCH_PAGINA segundos (0.2 por defecto) y solo se pide cuando se necesita.
+#
+# Con YTMD_BENCH_IDIOMAS=N, cada vídeo trae además subtítulos automáticos en N idiomas,
+# que no se descargan pero engordan su info_dict como en YouTube (unos 150 idiomas).
+
+MEDIOS = ('audio', 'opus', 'video', 'hls')
+TAMANO_PAGINA = 100
+FORMATOS_SUBTITULOS = ('json3', 'srv1', 'srv2', 'srv3', 'ttml', 'vtt')
+
+def _base():
+    return os.environ['YTMD_BENCH_URL'].rstrip('/')
+
+def _miniaturas():
+    return [{'url': f'{_base()}/caratula.jpg', 'width': 480, 'height': 360}]
+
+def _subtitulos(n):
+    idiomas = int(os.environ.get('YTMD_BENCH_IDIOMAS', '0'))
+    # URL firmadas largas, como las de YouTube: cada una es una cadena distinta
+    return {
+        f'l{idioma:03d}': [{'ext': ext, 'name': f'Idioma {idioma}',
+                            'url': f'{_base()}/subtitulos?v={n}&tlang=l{idioma:03d}&fmt={ext}&sig={"0" * 200}'}
+                           for ext in FORMATOS_SUBTITULOS]
+        for idioma in range(idiomas)
+    }
+
+def _formatos(medio):
+    base = _base()
+    if medio == 'hls':
+        return [{
+            'format_id': 'hls-audio', 'url': f'{base}/hls/audio.m3u8', 'protocol': 'm3u8_native',
+            'ext': 'mp4', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 128,
+        }]
+    if medio == 'opus':
+        return [{
+            'format_id': 'opus', 'url': f'{base}/audio.webm', 'ext': 'webm',
+            'vcodec': 'none', 'acodec': 'opus', 'abr': 160,
+        }]
+    formatos = [{
+        'format_id': 'audio', 'url': f'{base}/audio.m4a', 'ext': 'm4a',
+        'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 128,
+    }]
+    if medio == 'video':
+        formatos += [
+            {'format_id': 'video-720', 'url': f'{base}/video.mp4', 'ext': 'mp4', 'height': 720, 'width': 1280,
+             'vcodec': 'avc1.64001f', 'acodec': 'none'},
+            {'format_id': 'muxed-720', 'url': f'{base}/muxed.mp4', 'ext': 'mp4', 'height': 720, 'width': 1280,
+             'vcodec': 'avc1.64001f', 'acodec': 'mp4a.40.2'},
+        ]
+    return formatos
+
+class YtmdBenchPlaylistIE(InfoExtractor):
+    IE_NAME = 'ytmdbench:playlist'
+    _VALID_URL = r'ytmdbench:playlist:(?P<id>(?P<pistas>\d+):(?P<medio>audio|opus|video|hls))'
+
+    def _pagina(self, pistas, medio, numero):
+        time.sleep(float(os.environ.get('YTMD_BENCH_PAGINA', '0.2')))
+        for n in range(numero * TAMANO_PAGINA, min(pistas, (numero + 1) * TAMANO_PAGINA)):
+            yield self.url_result(f'ytmdbench:video:{n}:{medio}', YtmdBenchVideoIE, f'{medio}{n}', f'Pista {n}',
+                                  uploader='Artista de prueba')
+
+    def _real_extract(self, url):
+        pistas, medio = self._match_valid_url(url).group('pistas', 'medio')
+        entradas = OnDemandPagedList(functools.partial(self._pagina, int(pistas), medio), TAMANO_PAGINA)
+        return self.playlist_result(entradas, f'{medio}-{pistas}', f'Benchmark {medio} {pistas}',
+                                    thumbnails=_miniaturas())
+
+class YtmdBenchVideoIE(InfoExtractor):
+    IE_NAME = 'ytmdbench:video'
+    _VALID_URL = r'ytmdbench:video:(?P<n>\d+):(?P<medio>audio|opus|video|hls)'
+
+    def _real_extract(self, url):
+        n, medio = self._match_valid_url(url).group('n', 'medio')
+        return {
+            'id': f'{medio}{n}',
+            'title': f'Pista {n}',
+            'uploader': 'Artista de prueba',
+            'artist': 'Artista de prueba',
+            'album': f'Benchmark {medio}',
+            'track_number': int(n) + 1,
+            'thumbnails': _miniaturas(),
+            'formats': _formatos(medio),
+            'automatic_captions': _subtitulos(n),
+        }
@@ -0,0 +1,100 @@
+import http.server
+import os
+import re
+import threading
+import time
+
+# ============ SERVIDOR DE MEDIOS LOCAL ============
+#
+# Sirve la carpeta de medios sintéticos por HTTP en 127.0.0.1, con soporte de Range
+# (la reanudación de yt-dlp lo usa) y, opcionalmente, una latencia por petición y un
+# límite de ancho de banda por conexión para imitar una red real. Cuenta las conexiones
+# TCP aceptadas y las peticiones servidas, para ver cuántas conexiones se reutilizan.
+
+TAMANO_BLOQUE = 64 * 1024
+
+class _Manejador(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        servidor = self.server
+        with servidor.lock:
+            servidor.peticiones += 1
+        ruta = os.path.normpath(os.path.join(servidor.carpeta, self.path.split('?')[0].lstrip('/')))
+        if not ruta.startswith(servidor.carpeta) or not os.path.isfile(ruta):
+            self.send_error(404)
+            return
+        if servidor.latencia:
+            time.sleep(servidor.latencia)
+        tamano = os.path.getsize(ruta)
+        inicio, fin = 0, tamano - 1
+        rango = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if rango and (rango.group(1) or rango.group(2)):
+            if rango.group(1):
+                inicio = int(rango.group(1))
+                fin = min(int(rango.group(2)), fin) if rango.group(2) else fin
+            else:
+                inicio = max(0, tamano - int(rango.group(2)))
+            if inicio > fin:
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {inicio}-{fin}/{tamano}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(fin - inicio + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        with open(ruta, 'rb') as f:
+            f.seek(inicio)
+            self._enviar(f, fin - inicio + 1)
+
+    def _enviar(self, f, restantes):
+        limite = self.server.ancho_banda
+        comienzo = time.monotonic()
+        enviados = 0
+        while restantes > 0:
+            bloque = f.read(min(TAMANO_BLOQUE, restantes))
+            if not bloque:
+                break
+            self.wfile.write(bloque)
+            restantes -= len(bloque)
+            enviados += len(bloque)
+            if limite:
+                adelanto = enviados / limite - (time.monotonic() - comienzo)
+                if adelanto > 0:
+                    time.sleep(adelanto)
+
+    def log_message(self, *args):
+        pass
+
+class ServidorMedios(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, carpeta, latencia=0.0, ancho_banda=None, puerto=0):
+        """latencia en segundos por petición; ancho_banda en bytes/s por conexión (None = sin límite)."""
+        super().__init__(('127.0.0.1', puerto), _Manejador)
+        self.carpeta = os.path.abspath(carpeta)
+        self.latencia = latencia
+        self.ancho_banda = ancho_banda
+        self.lock = threading.Lock()
+        self.conexiones = 0
+        self.peticiones = 0
+
+    def process_request(self, request, client_address):
+        # Se llama una vez por conexión aceptada, en el hilo del servidor
+        with self.lock:
+            self.conexiones += 1
+        super().process_request(request, client_address)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,20 @@
+import pytest
+
+from ytmusicdown.ancho_banda import horario_desde_texto
+
+def test_horario_en_minutos_y_bytes():
+    assert horario_desde_texto('08:00-18:00=1M, 18:00-23:30=500K') == [
+        (8 * 60, 18 * 60, 1024 ** 2),
+        (18 * 60, 23 * 60 + 30, 500 * 1024),
+    ]
+
+def test_horario_que_cruza_medianoche():
+    assert horario_desde_texto('22:00-06:00=2M') == [(22 * 60, 6 * 60, 2 * 1024 ** 2)]
+
+def test_horario_vacio():
+    assert horario_desde_texto('') == []
+
+@pytest.mark.parametrize('texto', ['08:00-18:00', '08:00=1M', '25:00-26:00=1M', '08:00-18:00=rapido'])
+def test_horario_no_valido(texto):
+    with pytest.raises(ValueError):
+        horario_desde_texto(texto)
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+from ytmusicdown import cache as modulo_cache
+from ytmusicdown.cache import CacheMetadatos
+
+@pytest.fixture
+def reloj(monkeypatch):
+    ahora = [time.time()]
+    monkeypatch.setattr(modulo_cache.time, 'time', lambda: ahora[0])
+    return ahora
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CacheMetadatos(str(tmp_path / 'metadatos.sqlite3'), ttl=100, ttl_formatos=10, ttl_listados=5)
+    yield cache
+    cache.cerrar()
+
+VIDEO = {'id': 'abc', 'title': 'Pista', 'formats': [{'format_id': '251', 'url': 'https://ejemplo/251'}]}
+LISTA = {'_type': 'playlist', 'id': 'PL1', 'title': 'Album', 'entries': [{'id': 'abc', 'title': 'Pista'}]}
+
+def test_formatos_caducan_antes_que_los_metadatos(cache, reloj):
+    cache.guardar('Youtube:abc', VIDEO)
+    assert cache.obtener('Youtube:abc')['formats'] == VIDEO['formats']
+    reloj[0] += 11
+    assert cache.obtener('Youtube:abc') is None
+    assert cache.obtener('Youtube:abc', con_formatos=False)['title'] == 'Pista'
+    reloj[0] += 100
+    assert cache.obtener('Youtube:abc', con_formatos=False) is None
+
+def test_listado_de_playlist_caduca_en_minutos(cache, reloj):
+    cache.guardar('YoutubeTab:PL1', LISTA)
+    assert cache.obtener('YoutubeTab:PL1', con_formatos=False)['entries'] == LISTA['entries']
+    reloj[0] += 6
+    assert cache.obtener('YoutubeTab:PL1', con_formatos=False) is None
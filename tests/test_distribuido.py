@@ -0,0 +1,62 @@
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+from ytmusicdown import distribuido
+from ytmusicdown.distribuido import HECHA, AlmacenTareas, Trabajador
+from ytmusicdown.indice import IndiceDescargas
+
+PISTAS = 12
+
+class TrabajadorFalso(Trabajador):
+    """Trabajador que no descarga nada: anota qué tareas ejecuta y deja un archivo vacío por pista."""
+
+    def __init__(self, tareas, nombre, ejecutadas):
+        super().__init__(tareas, nombre, hilos=2, arriendo=5, deduplicar=False)
+        self.ejecutadas = ejecutadas
+
+    def _descargar(self, tarea, control):
+        self.ejecutadas.append((tarea.id, self.nombre))
+        time.sleep(0.01)
+        archivo = os.path.join(tarea.carpeta, f'{tarea.posicion:02d}.mp3')
+        open(archivo, 'wb').close()
+        indice = distribuido._IndiceTarea('mp3-192', None)
+        indice.registrar(tarea.entrada, archivo)
+        return indice, None
+
+def test_trabajadores_comparten_almacen(tmp_path, monkeypatch):
+    monkeypatch.setattr(distribuido, 'ESPERA_TAREAS', 0.05)
+    ruta = str(tmp_path / 'tareas.sqlite3')
+    carpeta = tmp_path / 'Artista - Album'
+    carpeta.mkdir()
+    coordinador = AlmacenTareas(ruta)
+    entradas = [(posicion, {'id': f'v{posicion}', 'ie_key': 'Youtube', 'title': f'Pista {posicion}'})
+                for posicion in range(1, PISTAS + 1)]
+    assert coordinador.agregar_playlist('https://ejemplo/lista', str(carpeta), 'mp3-192', {'title': 'Album'},
+                                        entradas) == PISTAS
+    # Un trabajador muerto deja una tarea asignada con el arriendo ya vencido
+    muerto = AlmacenTareas(ruta)
+    abandonada = muerto.tomar('muerto', arriendo=-1)
+
+    # Cada trabajador con su propia conexión, como si fueran procesos distintos
+    ejecutadas = []
+    trabajadores = [TrabajadorFalso(AlmacenTareas(ruta), f'nodo{n}', ejecutadas) for n in range(3)]
+    hilos = [threading.Thread(target=trabajador.trabajar) for trabajador in trabajadores]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(timeout=30)
+    assert not any(hilo.is_alive() for hilo in hilos)
+
+    ids = {fila[0] for fila in sqlite3.connect(ruta).execute('SELECT id FROM tareas')}
+    veces = collections.Counter(id_tarea for id_tarea, _ in ejecutadas)
+    assert set(veces) == ids
+    assert set(veces.values()) == {1}
+    assert abandonada.id in veces
+    assert not muerto.completar(abandonada.id, 'muerto')
+    assert coordinador.resumen()[HECHA] == PISTAS
+    assert sum(coordinador.resumen().values()) == PISTAS
+    indice = IndiceDescargas(str(carpeta), 'mp3-192')
+    assert not any(indice.pendiente(entrada) for _, entrada in entradas)
@@ -0,0 +1,18 @@
+from ytmusicdown.etiquetas import Etiquetador, comando_reetiquetar
+
+def test_etiquetas_playlist_borra_las_que_no_tiene():
+    etiquetador = Etiquetador({'_type': 'playlist', 'id': 'PLmezcla', 'title': 'Mezcla'}, caratulas=None)
+    assert etiquetador.etiquetas_playlist({'title': 'Pista', 'playlist_index': 3}) == {
+        'album': 'Mezcla', 'album_artist': '', 'track': '3'}
+
+def test_reetiquetar_copia_sin_la_caratula_anterior():
+    orden = comando_reetiquetar('guardado.mp3', 'copia.mp3', {'album': 'Álbum', 'track': '1/9'}, 'portada.jpg')
+    assert orden[orden.index('-i') + 1:].count('-i') == 1
+    assert orden[orden.index('-map'):orden.index('-map') + 6] == ['-map', '0:V?', '-map', '0:a', '-c', 'copy']
+    assert ['-metadata', 'album=Álbum'] == orden[orden.index('-metadata'):orden.index('-metadata') + 2]
+    assert 'attached_pic' in orden and orden[-1] == 'copia.mp3'
+
+def test_reetiquetar_sin_caratula_en_formatos_que_no_la_admiten():
+    orden = comando_reetiquetar('guardado.opus', 'copia.opus', {'album': ''}, 'portada.jpg')
+    assert 'portada.jpg' not in orden
+    assert 'album=' in orden
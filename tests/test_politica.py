@@ -0,0 +1,22 @@
+import pytest
+
+from ytmusicdown.politica import decidir
+
+@pytest.mark.parametrize('codec, acodec, origen, esperada', [
+    ('mp3', 'opus', 'pista.webm', ('transcodificar', 'mp3', 'mp3')),
+    ('opus', 'opus', 'pista.webm', ('copiar', 'opus', None)),
+    ('aac', 'mp4a.40.2', 'pista.m4a', ('conservar', 'm4a', None)),
+    ('original', 'opus', 'pista.webm', ('copiar', 'opus', None)),
+    ('original', None, 'pista.mka', ('conservar', 'mka', None)),
+])
+def test_decidir(codec, acodec, origen, esperada):
+    decision = decidir(codec, acodec, origen)
+    assert (decision.accion, decision.extension, decision.codec) == esperada
+
+def test_recodificar_en_el_mismo_codec():
+    decision = decidir('aac', 'mp4a.40.2', 'pista.m4a', recodificar=True)
+    assert (decision.accion, decision.extension, decision.codec) == ('transcodificar', 'm4a', 'aac')
+
+def test_recodificar_un_codec_que_no_se_sabe_codificar():
+    decision = decidir('original', 'vorbis', 'pista.ogg', recodificar=True)
+    assert decision.accion == 'conservar'
@@ -0,0 +1,45 @@
+import pytest
+
+from ytmusicdown import sesion as modulo_sesion
+from ytmusicdown.sesion import SesionHTTP, compartible
+
+def test_yt_dlp_conserva_las_piezas_que_comparte_la_sesion():
+    # Si falla, una versión nueva de yt-dlp cambió cookiejar o _request_director: la sesión
+    # ha pasado a dar YoutubeDL independientes y sesion.py debe adaptarse
+    assert compartible()
+
+def test_youtube_dl_de_una_sesion_comparten_cookies_y_conexiones():
+    sesion = SesionHTTP()
+    try:
+        with sesion.youtube_dl({'quiet': True}) as primero:
+            tarro, director = primero.cookiejar, primero._request_director
+        # Cerrar un YoutubeDL no cierra lo que comparte con los demás
+        with sesion.youtube_dl({'quiet': True}) as segundo:
+            assert segundo.cookiejar is tarro
+            assert segundo._request_director is director
+        with sesion.youtube_dl({'quiet': True, 'proxy': 'http://127.0.0.1:9'}) as otro:
+            assert otro._request_director is not director
+    finally:
+        sesion.cerrar()
+
+def test_sin_piezas_compartibles_da_youtube_dl_independientes(monkeypatch):
+    monkeypatch.setattr(modulo_sesion, 'compartible', lambda: False)
+    sesion = SesionHTTP()
+    with sesion.youtube_dl({'quiet': True}) as primero, sesion.youtube_dl({'quiet': True}) as segundo:
+        assert type(primero).__name__ == 'YoutubeDL'
+        assert primero.cookiejar is not segundo.cookiejar
+
+def test_sin_get_instance_del_manejador_requests_no_se_comparte(monkeypatch):
+    from yt_dlp.networking.common import _REQUEST_HANDLERS
+
+    manejador = _REQUEST_HANDLERS.get('Requests')
+    if manejador is None:
+        pytest.skip('sin requests instalado no hay pools que contar')
+    monkeypatch.setattr(manejador, '_create_instance', lambda self, cookiejar: None)
+    compartible.cache_clear()
+    try:
+        assert not compartible()
+    finally:
+        monkeypatch.undo()
+        compartible.cache_clear()
+    assert compartible()
@@ -0,0 +1,35 @@
+import math
+
+import pytest
+
+from ytmusicdown.diario import info_postproceso
+from ytmusicdown.sonoridad import OBJETIVO_LUFS, PICO_MAXIMO, Medida, clave_normalizada, ganancia_album
+
+def medida(lufs, pico=-20.0, duracion=None):
+    return Medida(lufs, pico, 5.0, lufs - 10, duracion)
+
+def test_ganancia_de_una_pista():
+    assert ganancia_album([medida(-20.0)]) == pytest.approx(OBJETIVO_LUFS + 20.0)
+
+def test_ganancia_pondera_por_duracion():
+    # La pista larga y baja pesa más: el álbum queda por debajo de la media simple (-15)
+    ganancia = ganancia_album([medida(-20.0, duracion=300), medida(-10.0, duracion=60)])
+    energia = (300 * 10 ** -2 + 60 * 10 ** -1) / 360
+    assert ganancia == pytest.approx(OBJETIVO_LUFS - 10 * math.log10(energia))
+
+def test_ganancia_limitada_por_el_pico():
+    assert ganancia_album([medida(-30.0, pico=-3.0)]) == pytest.approx(PICO_MAXIMO + 3.0)
+
+def test_ganancia_sin_nada_que_medir():
+    assert ganancia_album([]) is None
+    assert ganancia_album([medida(float('-inf'))]) is None
+
+def test_clave_normalizada():
+    album = {'_type': 'playlist', 'id': 'OLAK5uy_album'}
+    assert clave_normalizada('mp3-192') == 'mp3-192'
+    assert clave_normalizada('mp3-192', 'pista', album) == 'mp3-192+pista'
+    assert clave_normalizada('mp3-192', 'album', album) == 'mp3-192+album-OLAK5uy_album'
+
+def test_la_duracion_llega_al_postproceso():
+    # Sin ella, la ganancia del álbum reanudada del diario pesaría todas las pistas igual
+    assert info_postproceso({'id': 'v', 'duration': 215.0, 'formats': []}) == {'id': 'v', 'duration': 215.0}
@@ -0,0 +1,12 @@
+from ytmusicdown.transcodificacion import PipelineTranscodificacion
+
+class PipelineRoto(PipelineTranscodificacion):
+    def _procesar(self, origen, info):
+        raise OSError('disco lleno')
+
+def test_un_fallo_en_el_postproceso_no_para_la_cola(tmp_path):
+    # Más archivos que la capacidad de la cola: con los hilos muertos, encolar se bloquearía
+    with PipelineRoto(procesos=1, capacidad=1) as pipeline:
+        for numero in range(5):
+            pipeline.encolar(str(tmp_path / f'{numero}.m4a'), {'playlist_index': numero})
+    assert pipeline.diagnostico.errores == 5
@@ -1,111 +1,86 @@
 import os
-import re
+import queue
 import sys
-import yt_dlp
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import threading
+
+import ytmusicdown
 
 # Ruta de ffmpeg para Windows (cuando empaquetes con PyInstaller)
 FFMPEG_LOCATION = os.path.join(os.path.dirname(__file__), 'ffmpeg.exe')
-INVALID_CHARS = r'[<>:"/\\|?*\x00-\x1F]'
 
 cookies_path = None  # ruta al archivo cookies.txt
-
-def sanitize_filename(filename):
-    return re.sub(INVALID_CHARS, '_', filename)
-
-def obtener_info_playlist(url):
-    ydl_opts = {
-        'quiet': True,
-        'skip_download': True,
-        'extract_flat': True,
-        'force_generic_extractor': True,
-    }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info_dict = ydl.extract_info(url, download=False)
-        nombre_playlist = info_dict.get('title', 'Playlist')
-        nombre_artista = 'Artista'
-        if 'entries' in info_dict and len(info_dict['entries']) > 0:
-            first_entry = info_dict['entries'][0]
-            if 'artist' in first_entry:
-                nombre_artista = first_entry['artist']
-            elif 'uploader' in first_entry:
-                nombre_artista = first_entry['uploader']
-            elif 'channel' in first_entry:
-                nombre_artista = first_entry['channel']
-        return nombre_playlist, nombre_artista
-
-def descargar_playlist(url, download_dir, progress_var, status_var):
-    try:
-        nombre_playlist, nombre_artista = obtener_info_playlist(url)
-        nombre_carpeta = f"{nombre_artista} - {nombre_playlist}"
-        nombre_carpeta = sanitize_filename(nombre_carpeta)
-        status_var.set(f"Descargando playlist: {nombre_carpeta}")
-
-        full_download_dir = os.path.join(download_dir, nombre_carpeta)
-        if not os.path.exists(full_download_dir):
-            os.makedirs(full_download_dir)
-
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': os.path.join(full_download_dir, '%(playlist_index)02d - %(title)s.%(ext)s'),
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'progress_hooks': [lambda d: progress_callback(d, progress_var, status_var)],
-            'noplaylist': False,
-            'merge_output_format': 'mp3',
-            'hls_use_mpegts': True,
-            'geo_bypass': True,
-            'ignoreerrors': True,
-            'retries': 10,
-            'verbose': True,
-            'cookiefile': cookies_path if cookies_path else None,
-            'force_generic_extractor': False,
-            'extract_flat': False,
-            'js_executables': ['node'],  # Usar Node.js desde el PATH
-            'remote_components': ['ejs:npm', 'ejs:github'],  # Habilitar componentes remotos
-            'compat_opts': ['no-youtube-unavailable-videos'],  # Evitar videos no disponibles
-            'js_runtimes': {'node': {'executable': 'node'}},  # Use 'node' from PATH            'hls_prefer_native': True,  # Use native HLS downloader
-            'fragment_retries': 20,  # Increase fragment retries
-        }
-
-        # Solo en Windows se añade la ruta empaquetada de ffmpeg
-        if sys.platform.startswith("win"):
-            ydl_opts['ffmpeg_location'] = FFMPEG_LOCATION
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-
-        status_var.set("Descarga completa.")
+cache_metadatos = ytmusicdown.CacheMetadatos()  # metadatos de yt-dlp reutilizados entre ejecuciones
+
+# Opciones propias de este descargador; el motor añade formato, plantilla y cookies
+OPCIONES_YTDLP = {
+    'noplaylist': False,
+    'merge_output_format': 'mp3',
+    'hls_use_mpegts': True,
+    'retries': 10,
+    'verbose': True,
+    'force_generic_extractor': False,
+    'extract_flat': False,
+    'js_executables': ['node'],  # Usar Node.js desde el PATH
+    'remote_components': ['ejs:npm', 'ejs:github'],  # Habilitar componentes remotos
+    'compat_opts': ['no-youtube-unavailable-videos'],  # Evitar videos no disponibles
+    'js_runtimes': {'node': {'executable': 'node'}},  # Use 'node' from PATH            'hls_prefer_native': True,  # Use native HLS downloader
+    'fragment_retries': 20,  # Increase fragment retries
+}
+
+# Trabajos terminados, a la espera de que el hilo de Tk avise al usuario
+terminados = queue.SimpleQueue()
+
+def al_terminar(trabajo):
+    # Lo llama el hilo del trabajo: solo encola eventos; los avisos los muestra refrescar_progreso
+    if trabajo.estado == "Completado":
+        limitado_por = trabajo.resultado.diagnostico.limitado_por
+        fallidas = trabajo.resultado.fallidas
+        if fallidas:
+            trabajo.progreso.completar(f"Descarga terminada con {len(fallidas)} pistas fallidas.")
+        else:
+            trabajo.progreso.completar(f"Descarga completa (limitada por {limitado_por}).")
+    elif trabajo.estado == "Error":
+        trabajo.progreso.mensaje("Error en la descarga.")
+    terminados.put(trabajo)
+
+def avisar_terminado(trabajo):
+    if trabajo.estado == "Completado" and trabajo.resultado.fallidas:
+        fallidas = trabajo.resultado.fallidas
+        messagebox.showwarning("Descarga incompleta", f"No se pudieron descargar {len(fallidas)} pistas:\n"
+                               + "\n".join(ytmusicdown.lineas_fallidas(fallidas, maximo=15)))
+    elif trabajo.estado == "Completado":
         messagebox.showinfo("Éxito", "Descarga completada con éxito!")
-    except yt_dlp.utils.DownloadError as e:
-        status_var.set("Error en la descarga.")
-        messagebox.showerror("Error", f"Error de descarga: {str(e)}")
-    except Exception as e:
-        status_var.set("Error en la descarga.")
-        messagebox.showerror("Error", f"Ocurrió un error inesperado: {str(e)}")
-
-def progress_callback(d, progress_var, status_var):
-    if d['status'] == 'downloading':
-        total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
-        if total_bytes:
-            progress = float(d['downloaded_bytes'] / total_bytes) * 100
-            progress_var.set(progress)
-            status_var.set(f"Descargando: {d.get('filename', 'archivo')}")
-        elif d.get('fragment_count'):
-            # Para streams HLS (m3u8)
-            current = d.get('fragment_index', 0)
-            total = d['fragment_count']
-            progress = (current / total) * 100
-            progress_var.set(progress)
-            status_var.set(f"Descargando fragmento {current}/{total}")
+    elif trabajo.estado == "Error":
+        messagebox.showerror("Error", f"Error de descarga: {trabajo.error}")
+
+# Solo en Windows se usa la ruta empaquetada de ffmpeg
+gestor = ytmusicdown.GestorTrabajos(
+    al_terminar=al_terminar, opciones=OPCIONES_YTDLP,
+    ajustes=ytmusicdown.AjustesDescarga(cache=cache_metadatos,
+                                        ffmpeg=FFMPEG_LOCATION if sys.platform.startswith("win") else None))
+
+def refrescar_progreso():
+    # Se muestra el trabajo más reciente; solo el último estado, a ritmo fijo, desde el hilo de Tk.
+    # Se drenan todos: la cola de un trabajo que no se muestra no debe crecer sin fin
+    trabajos = gestor.trabajos()
+    cambios = [trabajo.progreso.drenar() for trabajo in trabajos]
+    if trabajos and cambios[-1]:
+        progreso = trabajos[-1].progreso
+        progress_var.set(progreso.porcentaje)
+        en_curso = [p for p in progreso.pistas.values() if p.estado == "Descargando"]
+        if en_curso and not progreso.completado:
+            status_var.set(f"Descargando: {en_curso[-1].titulo} ({len(en_curso)} en curso)")
         else:
-            status_var.set("Calculando tamaño del archivo...")
-
+            status_var.set(progreso.estado)
+    try:
+        trabajo = terminados.get_nowait()
+    except queue.Empty:
+        pass
+    else:
+        avisar_terminado(trabajo)
+    root.after(1000 // ytmusicdown.FPS_PROGRESO, refrescar_progreso)
 
 def seleccionar_carpeta():
     folder_selected = filedialog.askdirectory()
@@ -125,7 +100,7 @@ def iniciar_descarga():
     if url and download_dir:
         progress_var.set(0)
         status_var.set("Iniciando descarga...")
-        threading.Thread(target=descargar_playlist, args=(url, download_dir, progress_var, status_var), daemon=True).start()
+        gestor.agregar(url, download_dir, 'MP3', cookiefile=cookies_path)
     else:
         messagebox.showwarning("Advertencia", "Por favor, ingresa una URL válida y selecciona una carpeta de destino.")
 
@@ -171,5 +146,21 @@ status_var.set("Esperando URL...")
 status_label = ttk.Label(root, textvariable=status_var)
 status_label.pack(pady=5)
 
+def cerrar_ventana():
+    # Cancela la descarga en curso (red y ffmpeg); la espera a sus hilos no bloquea la ventana
+    status_var.set("Cancelando la descarga...")
+    root.protocol("WM_DELETE_WINDOW", lambda: None)
+    cierre = threading.Thread(target=gestor.cerrar, name='cierre', daemon=True)
+    cierre.start()
+    esperar_cierre(cierre)
+
+def esperar_cierre(cierre):
+    if cierre.is_alive():
+        root.after(50, esperar_cierre, cierre)
+    else:
+        root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", cerrar_ventana)
+refrescar_progreso()
 root.mainloop()
 
@@ -0,0 +1,79 @@
+"""Motor de descargas de YTMusicDown, independiente de la interfaz gráfica."""
+from .almacen import AlmacenContenidos
+from .ancho_banda import PlanificadorAnchoBanda
+from .cache import CacheMetadatos
+from .control import ControlTrabajo, TrabajoCancelado
+from .diario import DiarioTrabajos
+from .distribuido import AlmacenTareas, Trabajador, coordinar
+from .etiquetas import CACHE_CARATULAS, CacheCaratulas, Etiquetador
+from .fragmentos import ADAPTADOR_FRAGMENTOS, AdaptadorFragmentos
+from .indice import IndiceDescargas
+from .metricas import METRICAS_PROCESO, RUTA_EVENTOS, MetricasTrabajo, ServidorMetricas
+from .motor import (DESCARGAS_SIMULTANEAS, AjustesDescarga, ResultadoDescarga, descargar_entradas, descargar_playlist,
+                    expandir_playlist, expandir_playlist_progresiva, obtener_info_playlist,
+                    obtener_info_playlist_progresiva, sanitize_filename)
+from .perfiles import Perfil, PerfilMultiple, perfil_desde_texto
+from .precarga import Precarga
+from .progreso import FPS_PROGRESO, ColaProgreso
+from .reintentos import CORTACIRCUITOS, ColaFallidas, Cortacircuitos, lineas_fallidas
+from .resolucion import RESOLUCIONES_SIMULTANEAS, resolver_lote, resolver_y_entregar
+from .salidas import PipelineSalidas
+from .sesion import SESION_HTTP, SesionHTTP
+from .sonoridad import CACHE_SONORIDAD, CacheSonoridad, Normalizador
+from .trabajos import TRABAJOS_SIMULTANEOS, GestorTrabajos, Trabajo
+from .transcodificacion import PipelineTranscodificacion
+
+__all__ = [
+    'ADAPTADOR_FRAGMENTOS',
+    'AdaptadorFragmentos',
+    'AjustesDescarga',
+    'AlmacenContenidos',
+    'AlmacenTareas',
+    'CACHE_CARATULAS',
+    'CACHE_SONORIDAD',
+    'CORTACIRCUITOS',
+    'CacheCaratulas',
+    'CacheMetadatos',
+    'CacheSonoridad',
+    'ColaFallidas',
+    'ColaProgreso',
+    'ControlTrabajo',
+    'Cortacircuitos',
+    'DESCARGAS_SIMULTANEAS',
+    'DiarioTrabajos',
+    'Etiquetador',
+    'FPS_PROGRESO',
+    'GestorTrabajos',
+    'IndiceDescargas',
+    'METRICAS_PROCESO',
+    'MetricasTrabajo',
+    'Normalizador',
+    'Perfil',
+    'PerfilMultiple',
+    'PipelineSalidas',
+    'PipelineTranscodificacion',
+    'PlanificadorAnchoBanda',
+    'Precarga',
+    'RESOLUCIONES_SIMULTANEAS',
+    'RUTA_EVENTOS',
+    'ResultadoDescarga',
+    'SESION_HTTP',
+    'ServidorMetricas',
+    'SesionHTTP',
+    'TRABAJOS_SIMULTANEOS',
+    'Trabajador',
+    'Trabajo',
+    'TrabajoCancelado',
+    'coordinar',
+    'descargar_entradas',
+    'descargar_playlist',
+    'expandir_playlist',
+    'expandir_playlist_progresiva',
+    'lineas_fallidas',
+    'obtener_info_playlist',
+    'obtener_info_playlist_progresiva',
+    'perfil_desde_texto',
+    'resolver_lote',
+    'resolver_y_entregar',
+    'sanitize_filename',
+]
@@ -0,0 +1,82 @@
+import os
+import shutil
+
+from .indice import clave_info
+
+# ============ ALMACÉN DE CONTENIDOS ============
+#
+# Un mismo vídeo suele estar en el álbum, en un "grandes éxitos" y en una mezcla. El
+# almacén guarda cada archivo final una sola vez, por ID de vídeo y perfil, y cada
+# carpeta de playlist recibe un enlace duro con su propio nombre ('07 - Título.mp3').
+# Así cada pista se descarga y se transcodifica una vez. Si el sistema de archivos no
+# admite enlaces duros (FAT, exFAT, otra unidad) se copia.
+#
+# El archivo guardado lleva las etiquetas de la playlist que lo bajó (álbum, número de
+# pista, carátula). Un enlace duro compartiría esos bytes con todas las carpetas, así que
+# la descarga de cada playlist le pasa a reutilizar una función copiar que deja una copia
+# con las etiquetas de esa playlist (ver transcodificacion.copiar_reetiquetada).
+
+NOMBRE_ALMACEN = '.ytmusicdown-almacen'
+
+def enlazar(origen, destino):
+    """Enlace duro de origen en destino o, si no se puede, una copia. Escritura atómica."""
+    temporal = destino + '.tmp-enlace'
+    if os.path.exists(temporal):
+        os.remove(temporal)
+    try:
+        os.link(origen, temporal)
+    except OSError:
+        shutil.copy2(origen, temporal)
+    os.replace(temporal, destino)
+
+class AlmacenContenidos:
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    def _carpeta(self, info, perfil):
+        extractor, _, id_video = clave_info(info).partition(':')
+        # Los ID de vídeo no llevan separadores, pero el de otros extractores podría
+        return os.path.join(self.ruta, perfil, extractor, id_video.replace('/', '_').replace('\\', '_'))
+
+    def buscar(self, info, perfil):
+        """Ruta del archivo guardado para este vídeo y perfil, o None."""
+        if not info.get('id'):
+            return None
+        carpeta = self._carpeta(info, perfil)
+        if not os.path.isdir(carpeta):
+            return None
+        for nombre in os.listdir(carpeta):
+            if not nombre.endswith('.tmp-enlace'):
+                return os.path.join(carpeta, nombre)
+        return None
+
+    def guardar(self, info, perfil, archivo):
+        """Añade el archivo final de una pista; si ya estaba, no hace nada."""
+        if not info.get('id') or not archivo or self.buscar(info, perfil):
+            return
+        carpeta = self._carpeta(info, perfil)
+        os.makedirs(carpeta, exist_ok=True)
+        extension = os.path.splitext(archivo)[1]
+        enlazar(archivo, os.path.join(carpeta, 'pista' + extension))
+
+    def reutilizar(self, info, perfil, nombrar, copiar=None):
+        """Enlaza la pista guardada en la ruta nombrar(extension); devuelve esa ruta o None.
+
+        Con copiar(origen, destino) -> bool, la pista se copia con ella en vez de enlazarse.
+        """
+        guardado = self.buscar(info, perfil)
+        if guardado is None:
+            return None
+        extension = os.path.splitext(guardado)[1]
+        destino = nombrar(extension.lstrip('.'))
+        if copiar is None:
+            enlazar(guardado, destino)
+            return destino
+        # Con la extensión al final, ffmpeg elige el contenedor por ella
+        temporal = destino + '.tmp-enlace' + extension
+        if not copiar(guardado, temporal):
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return None
+        os.replace(temporal, destino)
+        return destino
@@ -0,0 +1,156 @@
+import re
+import threading
+import time
+
+# ============ PLANIFICADOR DE ANCHO DE BANDA ============
+#
+# Un cubo de tokens por proceso que comparten todas las descargas. Cada trabajo tiene
+# su propio cubo, que se llena a su parte del límite global: límite * peso / suma de los
+# pesos de los trabajos activos. Así un MP4 enorme no deja sin red a los MP3 pequeños y,
+# cuando un trabajo termina o se para entre pistas, su parte pasa a los demás.
+#
+# El límite global puede variar según la hora (horario de oficina, noche...). Se aplica
+# dentro de la descarga: el progress_hook de yt-dlp se llama tras cada bloque recibido y
+# la CuotaTrabajo retiene ahí al hilo hasta que su cubo tenga tokens, igual que la pausa.
+
+VENTANA_ACTIVIDAD = 1.0   # segundos sin recibir datos tras los que un trabajo cede su parte
+RAFAGA = 0.5              # segundos de su tasa que un cubo puede acumular sin usar
+ESPERA_MAXIMA = 0.25      # la espera se trocea para notar cambios de límite, de reparto y cancelaciones
+
+UNIDADES = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+def bytes_desde_texto(texto):
+    """'500K', '2M', '1.5M' o '1048576' (por segundo) -> bytes. Lanza ValueError si no es válido."""
+    coincidencia = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:I?B)?\s*', texto.upper())
+    if not coincidencia:
+        raise ValueError(f'Límite de ancho de banda no válido: {texto}')
+    return int(float(coincidencia.group(1)) * UNIDADES[coincidencia.group(2)])
+
+def _minutos(hora):
+    horas, _, minutos = hora.partition(':')
+    if not (horas.isdigit() and minutos.isdigit() and int(horas) < 24 and int(minutos) < 60):
+        raise ValueError(f'Hora no válida: {hora} (formato HH:MM)')
+    return int(horas) * 60 + int(minutos)
+
+def horario_desde_texto(texto):
+    """'08:00-18:00=1M,18:00-23:30=4M' -> [(desde, hasta, bytes/s)], con las horas en minutos."""
+    horario = []
+    for tramo in filter(None, (parte.strip() for parte in texto.split(','))):
+        horas, signo, limite = tramo.partition('=')
+        desde, guion, hasta = horas.partition('-')
+        if not signo or not guion:
+            raise ValueError(f'Tramo de horario no válido: {tramo} (formato HH:MM-HH:MM=LÍMITE)')
+        horario.append((_minutos(desde.strip()), _minutos(hasta.strip()), bytes_desde_texto(limite)))
+    return horario
+
+class _Cubo:
+    def __init__(self, peso, ahora):
+        self.peso = peso
+        self.tokens = 0.0
+        self.relleno = ahora
+        self.uso = ahora
+        self.usuarios = 0
+
+class PlanificadorAnchoBanda:
+    def __init__(self, limite=None, horario=()):
+        """limite: bytes/s para todo el proceso (None = sin límite).
+
+        horario: [(desde, hasta, bytes/s)] con las horas en minutos desde medianoche; un
+        tramo puede cruzar la medianoche (22:00-06:00). Fuera de los tramos rige limite.
+        """
+        self.limite = limite
+        self.horario = list(horario)
+        self._lock = threading.Lock()
+        self._cubos = {}
+
+    def limite_actual(self, ahora=None):
+        """Límite en bytes/s que rige ahora mismo, o None."""
+        momento = time.localtime(ahora)
+        minuto = momento.tm_hour * 60 + momento.tm_min
+        for desde, hasta, limite in self.horario:
+            if desde <= minuto < hasta or (hasta < desde and (minuto >= desde or minuto < hasta)):
+                return limite
+        return self.limite
+
+    def cuota(self, trabajo, peso=1, control=None):
+        """CuotaTrabajo con la que las descargas de un trabajo piden ancho de banda."""
+        return CuotaTrabajo(self, trabajo, peso, control)
+
+    def _tasa(self, cubo, ahora):
+        # Con el lock tomado: la parte del límite que le toca a este cubo
+        limite = self.limite_actual()
+        if not limite:
+            return None
+        activos = sum(c.peso for c in self._cubos.values() if c is cubo or ahora - c.uso < VENTANA_ACTIVIDAD)
+        return limite * cubo.peso / activos
+
+    def _registrar(self, trabajo, peso):
+        with self._lock:
+            cubo = self._cubos.get(trabajo)
+            if cubo is None:
+                cubo = self._cubos[trabajo] = _Cubo(peso, time.monotonic())
+            cubo.usuarios += 1
+
+    def _retirar(self, trabajo):
+        with self._lock:
+            cubo = self._cubos.get(trabajo)
+            if cubo:
+                cubo.usuarios -= 1
+                if cubo.usuarios <= 0:
+                    del self._cubos[trabajo]
+
+    def consumir(self, trabajo, n, cancelado=None):
+        """Descuenta n bytes del cubo del trabajo y espera hasta que vuelva a tener saldo.
+
+        cancelado() se consulta durante la espera para no retener una descarga cancelada.
+        """
+        with self._lock:
+            cubo = self._cubos[trabajo]
+            cubo.tokens -= n
+            cubo.uso = time.monotonic()
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                tasa = self._tasa(cubo, ahora)
+                if tasa is None:
+                    cubo.tokens = 0.0
+                    cubo.relleno = ahora
+                    return
+                cubo.tokens = min(cubo.tokens + tasa * (ahora - cubo.relleno), tasa * RAFAGA)
+                cubo.relleno = ahora
+                if cubo.tokens >= 0:
+                    return
+                espera = -cubo.tokens / tasa
+                cubo.uso = ahora  # esperando también cuenta como activo
+            if cancelado and cancelado():
+                return
+            time.sleep(min(espera, ESPERA_MAXIMA))
+
+class CuotaTrabajo:
+    """Parte de un trabajo en el PlanificadorAnchoBanda; su hook va en los progress_hooks."""
+
+    def __init__(self, planificador, trabajo, peso=1, control=None):
+        self.planificador = planificador
+        self.trabajo = trabajo
+        self.control = control
+        self._recibidos = {}
+        planificador._registrar(trabajo, peso)
+
+    def hook(self, d):
+        """progress_hook de yt-dlp: cobra los bytes recibidos desde la llamada anterior."""
+        archivo = d.get('filename')
+        if d['status'] != 'downloading':
+            self._recibidos.pop(archivo, None)
+            return
+        recibidos = d.get('downloaded_bytes') or 0
+        # La primera llamada de cada archivo solo fija la base: un .part que se continúa ya
+        # trae en downloaded_bytes lo bajado en el intento anterior
+        anteriores = self._recibidos.get(archivo, recibidos)
+        nuevos = max(0, recibidos - anteriores)
+        self._recibidos[archivo] = recibidos
+        if nuevos:
+            cancelado = self.control and (lambda: self.control.cancelado)
+            self.planificador.consumir(self.trabajo, nuevos, cancelado)
+
+    def cerrar(self):
+        self.planificador._retirar(self.trabajo)
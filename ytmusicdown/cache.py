@@ -0,0 +1,136 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# ============ CACHÉ DE METADATOS EN DISCO ============
+#
+# Guarda los resultados de extract_info por ID de vídeo o playlist en SQLite (JSON
+# comprimido con zlib). Los campos estáticos (título, artista, duración...) duran
+# días; las URL de los formatos caducan en pocas horas, así que se guardan aparte
+# con un TTL propio y, si han caducado, la entrada cuenta como fallo para descargar.
+# El listado de una playlist cambia en cuanto se le añaden pistas: dura solo
+# TTL_LISTADOS, para que una sincronización vea las nuevas en minutos, no en días.
+
+RUTA_CACHE = os.path.join(os.path.expanduser('~'), '.ytmusicdown', 'metadatos.sqlite3')
+TTL_METADATOS = 7 * 24 * 3600
+TTL_FORMATOS = 3600
+TTL_LISTADOS = 10 * 60
+TIPOS_LISTADO = ('playlist', 'multi_video')
+TAMANO_MAXIMO = 256 * 1024 * 1024
+
+CAMPOS_FORMATOS = frozenset({
+    'formats', 'requested_formats', 'url', 'manifest_url', 'fragments', 'fragment_base_url',
+    'http_headers', 'downloader_options', 'format_id', 'protocol',
+})
+
+def _comprimir(datos):
+    return zlib.compress(json.dumps(datos, ensure_ascii=False).encode('utf-8'))
+
+def _descomprimir(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+def _serializable(info):
+    import yt_dlp
+
+    # Las claves '__x' de yt-dlp son internas (funciones, IPs de geo_bypass) y no se guardan
+    limpio = {k: v for k, v in info.items() if not k.startswith('__')}
+    return yt_dlp.YoutubeDL.sanitize_info(limpio)
+
+def extractor_url(url):
+    """Clase del extractor de yt-dlp que reconoce url, o None si solo la aceptaría Generic."""
+    import yt_dlp.extractor
+
+    for ie in yt_dlp.extractor.gen_extractor_classes():
+        if ie.ie_key() != 'Generic' and ie.suitable(url):
+            return ie
+    return None
+
+def clave_url(url):
+    """Clave 'Extractor:id' de una URL, o la propia URL si ningún extractor le saca un ID."""
+    ie = extractor_url(url)
+    id_temporal = ie and ie.get_temp_id(url)
+    return f'{ie.ie_key()}:{id_temporal}' if id_temporal else url
+
+def clave_entrada(entrada):
+    if entrada.get('ie_key') and entrada.get('id'):
+        return f"{entrada['ie_key']}:{entrada['id']}"
+    return clave_url(entrada['url'])
+
+class CacheMetadatos:
+    def __init__(self, ruta=RUTA_CACHE, ttl=TTL_METADATOS, ttl_formatos=TTL_FORMATOS,
+                 tamano_maximo=TAMANO_MAXIMO, ttl_listados=TTL_LISTADOS):
+        if ruta != ':memory:':
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self.ttl = ttl
+        self.ttl_formatos = ttl_formatos
+        self.ttl_listados = ttl_listados
+        self.tamano_maximo = tamano_maximo
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS metadatos (
+            clave TEXT PRIMARY KEY,
+            datos BLOB NOT NULL,
+            formatos BLOB,
+            creado REAL NOT NULL,
+            usado REAL NOT NULL,
+            tamano INTEGER NOT NULL)''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS metadatos_usado ON metadatos (usado)')
+
+    def obtener(self, clave, con_formatos=True):
+        """Devuelve el info_dict guardado o None si falta o ha caducado.
+
+        Con con_formatos=False basta con que sigan vigentes los metadatos estáticos. Una
+        playlist caduca a los ttl_listados en cualquier caso.
+        """
+        ahora = time.time()
+        with self._lock:
+            fila = self._db.execute(
+                'SELECT datos, formatos, creado FROM metadatos WHERE clave = ?', (clave,)).fetchone()
+            if fila is None:
+                return None
+            datos, formatos, creado = fila
+            if ahora - creado > self.ttl:
+                self._db.execute('DELETE FROM metadatos WHERE clave = ?', (clave,))
+                return None
+            if con_formatos and formatos is not None and ahora - creado > self.ttl_formatos:
+                return None
+            info = _descomprimir(datos)
+            if info.get('_type') in TIPOS_LISTADO and ahora - creado > self.ttl_listados:
+                return None
+            self._db.execute('UPDATE metadatos SET usado = ? WHERE clave = ?', (ahora, clave))
+        if con_formatos and formatos is not None:
+            info.update(_descomprimir(formatos))
+        return info
+
+    def guardar(self, clave, info):
+        info = _serializable(info)
+        volatiles = {k: info.pop(k) for k in CAMPOS_FORMATOS if k in info}
+        datos = _comprimir(info)
+        formatos = _comprimir(volatiles) if volatiles else None
+        ahora = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO metadatos VALUES (?, ?, ?, ?, ?, ?)',
+                (clave, datos, formatos, ahora, ahora, len(datos) + len(formatos or b'')))
+            self._desalojar(ahora)
+
+    def _desalojar(self, ahora):
+        self._db.execute('DELETE FROM metadatos WHERE creado < ?', (ahora - self.ttl,))
+        total, = self._db.execute('SELECT COALESCE(SUM(tamano), 0) FROM metadatos').fetchone()
+        if total <= self.tamano_maximo:
+            return
+        # Se eliminan las entradas usadas hace más tiempo hasta volver por debajo del límite
+        for clave, tamano in self._db.execute(
+                'SELECT clave, tamano FROM metadatos ORDER BY usado').fetchall():
+            self._db.execute('DELETE FROM metadatos WHERE clave = ?', (clave,))
+            total -= tamano
+            if total <= self.tamano_maximo:
+                break
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
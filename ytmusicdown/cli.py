@@ -0,0 +1,159 @@
+import argparse
+import sys
+import threading
+
+from .ancho_banda import PlanificadorAnchoBanda, bytes_desde_texto, horario_desde_texto
+from .cache import CacheMetadatos
+from .metricas import ServidorMetricas
+from .motor import DESCARGAS_SIMULTANEAS, AjustesDescarga
+from .perfiles import perfil_desde_texto
+from .reintentos import NOMBRE_FALLIDAS, lineas_fallidas
+from .resolucion import RESOLUCIONES_SIMULTANEAS, resolver_y_entregar
+from .sesion import SESION_HTTP, linea_estadisticas
+from .sonoridad import MODOS_NORMALIZACION
+from .trabajos import COMPLETADO, TRABAJOS_SIMULTANEOS, GestorTrabajos
+
+# ============ CLI POR LOTES ============
+#
+# python -m ytmusicdown lote.txt -d ~/Musica
+#
+# Cada línea del lote es "URL [PERFIL [PRIORIDAD]]"; las líneas vacías y las que empiezan
+# por '#' se ignoran. Las URL se encolan en un GestorTrabajos que comparte caché de
+# metadatos y opciones; las de mayor prioridad se descargan antes.
+#
+# Antes, todas las URL del lote se extraen a la vez (ver resolucion.py) y cada trabajo
+# se encola en cuanto su enlace está resuelto, sin esperar a los demás.
+
+def leer_lote(lineas, perfil_por_defecto):
+    """Devuelve [(url, Perfil, prioridad)] o lanza ValueError indicando la línea incorrecta."""
+    trabajos = []
+    for numero, linea in enumerate(lineas, start=1):
+        linea = linea.strip()
+        if not linea or linea.startswith('#'):
+            continue
+        partes = linea.split()
+        if len(partes) > 3:
+            raise ValueError(f'Línea {numero}: se esperaba "URL [PERFIL [PRIORIDAD]]"')
+        try:
+            perfil = perfil_desde_texto(partes[1]) if len(partes) >= 2 else perfil_por_defecto
+            prioridad = int(partes[2]) if len(partes) == 3 else 0
+        except ValueError as e:
+            raise ValueError(f'Línea {numero}: {e}') from None
+        trabajos.append((partes[0], perfil, prioridad))
+    return trabajos
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog='ytmusicdown', description='Descarga por lotes de playlists de YouTube, sin interfaz gráfica.')
+    parser.add_argument(
+        'lote', help='archivo con una URL por línea, opcionalmente seguida de perfil y prioridad ("-" para stdin)')
+    parser.add_argument('-d', '--destino', default='.', help='directorio de descarga (por defecto, el actual)')
+    parser.add_argument(
+        '-p', '--perfil', default='MP3',
+        help='perfil por defecto: MP3, MP3-320, AUDIO, M4A, OPUS-128, MP4, MP4-720... o varios a la vez '
+             'con una sola descarga, como MP3+MP4-720 (por defecto MP3)')
+    parser.add_argument('-j', '--hilos', type=int, default=DESCARGAS_SIMULTANEAS, help='pistas descargadas a la vez')
+    parser.add_argument(
+        '-t', '--trabajos', type=int, default=TRABAJOS_SIMULTANEOS, help='playlists descargadas a la vez')
+    parser.add_argument('-r', '--resoluciones', type=int, default=RESOLUCIONES_SIMULTANEAS,
+                        help='enlaces del lote cuyos metadatos se extraen a la vez')
+    parser.add_argument('--cookies', help='archivo cookies.txt para contenido con acceso premium')
+    parser.add_argument('--ffmpeg', help='ruta al ejecutable de ffmpeg')
+    parser.add_argument('--sin-cache', action='store_true', help='no usar la caché de metadatos en disco')
+    parser.add_argument('--limite', metavar='VELOCIDAD',
+                        help='ancho de banda total del lote, repartido entre los trabajos en curso (p. ej. 2M)')
+    parser.add_argument('--horario', metavar='TRAMOS',
+                        help='límites por hora, p. ej. "08:00-18:00=1M,22:00-06:00=10M" (fuera de ellos, --limite)')
+    parser.add_argument('--memoria-acotada', action='store_true',
+                        help='para playlists de miles de pistas: la memoria no crece con su tamaño')
+    parser.add_argument('--normalizar', choices=MODOS_NORMALIZACION,
+                        help='ajusta la sonoridad (EBU R128) de cada pista o, con "album", la de la playlist entera')
+    parser.add_argument('--eventos', metavar='CARPETA',
+                        help='escribe un log JSON lines por trabajo con la duración de cada etapa de cada pista')
+    parser.add_argument('--metricas-puerto', type=int, metavar='PUERTO',
+                        help='expone métricas de Prometheus en http://127.0.0.1:PUERTO/metrics mientras dura el lote')
+    return parser
+
+def main(argv=None):
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    try:
+        perfil = perfil_desde_texto(args.perfil)
+        limite = bytes_desde_texto(args.limite) if args.limite else None
+        horario = horario_desde_texto(args.horario) if args.horario else ()
+        if args.lote == '-':
+            trabajos = leer_lote(sys.stdin, perfil)
+        else:
+            with open(args.lote, encoding='utf-8') as f:
+                trabajos = leer_lote(f, perfil)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    cache = None if args.sin_cache else CacheMetadatos()
+
+    # Los trabajos se encolan según se resuelven; el prefijo es su número de línea en el lote
+    numeros = {}
+    bloqueo_numeros = threading.Lock()
+
+    def al_terminar(trabajo):
+        with bloqueo_numeros:
+            prefijo = f'[{numeros[trabajo.id]}/{len(trabajos)}]'
+        if trabajo.estado == COMPLETADO:
+            resultado = trabajo.resultado
+            print(f'{prefijo} {resultado.descargadas} pistas nuevas en {resultado.carpeta}', file=sys.stderr)
+            if resultado.fallidas:
+                print(f'{prefijo} {len(resultado.fallidas)} pistas no se pudieron descargar:', file=sys.stderr)
+                for linea in lineas_fallidas(resultado.fallidas):
+                    print(f'  {linea}', file=sys.stderr)
+        else:
+            print(f'{prefijo} {trabajo.estado} en {trabajo.url}: {trabajo.error or ""}', file=sys.stderr)
+
+    servidor_metricas = ServidorMetricas(args.metricas_puerto) if args.metricas_puerto else None
+    planificador = PlanificadorAnchoBanda(limite, horario) if limite or horario else None
+    gestor = GestorTrabajos(
+        args.trabajos, al_terminar, metricas=bool(servidor_metricas), carpeta_eventos=args.eventos,
+        planificador=planificador, cookiefile=args.cookies, opciones={'quiet': True, 'noprogress': True},
+        ajustes=AjustesDescarga(hilos=args.hilos, ffmpeg=args.ffmpeg, cache=cache, memoria_acotada=args.memoria_acotada,
+                                normalizar=args.normalizar))
+    por_url = {}
+    for numero, (url, perfil, prioridad) in enumerate(trabajos, start=1):
+        por_url.setdefault(url, []).append((numero, perfil, prioridad))
+
+    def al_resolver(url, resolucion, error):
+        # Si la extracción falló, el trabajo la repite y su error sale como el de cualquier otro.
+        # Las entradas se paginan al descargar y solo una vez: los demás perfiles extraen la URL de nuevo
+        for orden, (numero, perfil, prioridad) in enumerate(por_url[url]):
+            prefijo = f'[{numero}/{len(trabajos)}]'
+            with bloqueo_numeros:
+                trabajo = gestor.agregar(
+                    url, args.destino, perfil, prioridad, resolucion if orden == 0 else None,
+                    al_estado=lambda texto, prefijo=prefijo: print(f'{prefijo} {texto}', file=sys.stderr))
+                numeros[trabajo.id] = numero
+
+    try:
+        resolver_y_entregar(list(por_url), al_resolver, args.cookies, cache, args.resoluciones)
+        gestor.esperar()
+    except KeyboardInterrupt:
+        print('Cancelando descargas...', file=sys.stderr)
+    gestor.cerrar()
+    if servidor_metricas:
+        servidor_metricas.cerrar()
+    conexiones = linea_estadisticas(SESION_HTTP)
+    SESION_HTTP.cerrar()
+    if conexiones:
+        print(conexiones, file=sys.stderr)
+
+    fallos = [t.url for t in gestor.trabajos() if t.estado != COMPLETADO]
+    # Con una interrupción durante la resolución, algunas líneas no llegaron a encolarse
+    encolados = set(numeros.values())
+    fallos += [url for numero, (url, _, _) in enumerate(trabajos, start=1) if numero not in encolados]
+    if fallos:
+        print(f'{len(fallos)} de {len(trabajos)} enlaces fallaron o se cancelaron:', file=sys.stderr)
+        for url in fallos:
+            print(f'  {url}', file=sys.stderr)
+    incompletos = [t for t in gestor.trabajos() if t.estado == COMPLETADO and t.resultado.fallidas]
+    if incompletos:
+        # Ya se listaron al terminar cada trabajo; aquí, el recuento y dónde quedan anotadas
+        print(f'{sum(len(t.resultado.fallidas) for t in incompletos)} pistas de {len(incompletos)} enlaces '
+              f'siguen sin descargar (anotadas en {NOMBRE_FALLIDAS} de cada carpeta)', file=sys.stderr)
+    return 1 if fallos or incompletos else 0
@@ -0,0 +1,50 @@
+import threading
+
+# ============ PAUSA Y CANCELACIÓN ============
+#
+# Cada trabajo tiene un ControlTrabajo que el motor consulta antes de cada pista, en
+# cada fragmento recibido (progress hook) y mientras espera a ffmpeg. Pausar bloquea
+# a quien lo consulta; cancelar lo despierta y corta la red y ffmpeg en el acto.
+
+class TrabajoCancelado(Exception):
+    pass
+
+class ControlTrabajo:
+    def __init__(self):
+        self._cancelado = threading.Event()
+        self._activo = threading.Event()
+        self._activo.set()
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+    @property
+    def pausado(self):
+        return not self._activo.is_set()
+
+    def pausar(self):
+        if not self.cancelado:
+            self._activo.clear()
+
+    def reanudar(self):
+        self._activo.set()
+
+    def cancelar(self):
+        self._cancelado.set()
+        self._activo.set()  # despierta a los hilos que estaban en pausa
+
+    def comprobar(self):
+        """Bloquea mientras el trabajo esté en pausa; lanza TrabajoCancelado si se canceló."""
+        self._activo.wait()
+        if self._cancelado.is_set():
+            raise TrabajoCancelado('Trabajo cancelado')
+
+    def hook(self, d):
+        """progress_hook de yt-dlp."""
+        try:
+            self.comprobar()
+        except TrabajoCancelado:
+            # Dentro de yt-dlp solo DownloadCancelled atraviesa ignoreerrors y corta la descarga
+            from yt_dlp.utils import DownloadCancelled
+            raise DownloadCancelled('Trabajo cancelado') from None
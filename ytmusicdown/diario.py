@@ -0,0 +1,165 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# ============ DIARIO DE TRABAJOS ============
+#
+# Guarda en SQLite cada trabajo de la cola hasta que termina: su URL y opciones, la
+# playlist ya resuelta, los .part que tiene a medias y los archivos que esperan a
+# ffmpeg. Si la app se cierra o se cae, al volver a abrirla GestorTrabajos reanuda
+# esos trabajos: yt-dlp continúa cada .part con peticiones Range, lo ya descargado
+# pasa directamente a ffmpeg y lo ya transcodificado solo se registra en el índice.
+
+RUTA_DIARIO = os.path.join(os.path.expanduser('~'), '.ytmusicdown', 'trabajos.sqlite3')
+
+# Claves del info_dict que hacen falta al reanudar el postproceso de una pista: para
+# registrarla en el índice, elegir qué hace ffmpeg con su audio (también la frecuencia a la
+# que vuelve tras el loudnorm de sonoridad.py, y la duración con la que pesa en la ganancia
+# del álbum) y escribir sus etiquetas
+CAMPOS_POSTPROCESO = ('id', 'extractor_key', 'ie_key', 'title', 'acodec', 'height', 'playlist_index', 'n_entries',
+                      'playlist_count', 'track', 'artist', 'creator', 'uploader', 'channel', 'album', 'release_year',
+                      'upload_date', 'thumbnail', 'audio_aparte', 'asr', 'duration')
+
+def info_postproceso(info):
+    """Copia de info con solo las claves de CAMPOS_POSTPROCESO que tienen valor."""
+    return {clave: info[clave] for clave in CAMPOS_POSTPROCESO if info.get(clave) is not None}
+
+def _comprimir(datos):
+    return zlib.compress(json.dumps(datos, ensure_ascii=False).encode('utf-8'))
+
+def _descomprimir(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+def _persistibles(opciones):
+    # Los callbacks (al_estado...) no sobreviven a un reinicio; el resto se guarda tal cual
+    return {clave: valor for clave, valor in opciones.items() if not callable(valor)}
+
+class DiarioTrabajos:
+    def __init__(self, ruta=RUTA_DIARIO):
+        if ruta != ':memory:':
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA foreign_keys=ON')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                destino TEXT NOT NULL,
+                perfil TEXT NOT NULL,
+                prioridad INTEGER NOT NULL,
+                opciones TEXT NOT NULL,
+                pausado INTEGER NOT NULL DEFAULT 0,
+                resolucion BLOB,
+                creado REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS parciales (
+                trabajo INTEGER NOT NULL REFERENCES trabajos (id) ON DELETE CASCADE,
+                archivo TEXT NOT NULL,
+                PRIMARY KEY (trabajo, archivo));
+            CREATE TABLE IF NOT EXISTS postproceso (
+                trabajo INTEGER NOT NULL REFERENCES trabajos (id) ON DELETE CASCADE,
+                origen TEXT NOT NULL,
+                info TEXT NOT NULL,
+                PRIMARY KEY (trabajo, origen));''')
+
+    # --- Trabajos de la cola ---
+
+    def crear(self, url, destino, perfil, prioridad, opciones):
+        """Anota un trabajo nuevo y devuelve su id, que GestorTrabajos usa como id del trabajo."""
+        with self._lock:
+            cursor = self._db.execute(
+                'INSERT INTO trabajos (url, destino, perfil, prioridad, opciones, creado) VALUES (?, ?, ?, ?, ?, ?)',
+                (url, destino, perfil, prioridad, json.dumps(_persistibles(opciones)), time.time()))
+            return cursor.lastrowid
+
+    def pendientes(self):
+        """Trabajos sin terminar: [(id, url, destino, perfil, prioridad, opciones, pausado)]."""
+        with self._lock:
+            filas = self._db.execute(
+                'SELECT id, url, destino, perfil, prioridad, opciones, pausado FROM trabajos ORDER BY id').fetchall()
+        return [(id_trabajo, url, destino, perfil, prioridad, json.loads(opciones), bool(pausado))
+                for id_trabajo, url, destino, perfil, prioridad, opciones, pausado in filas]
+
+    def actualizar(self, id_trabajo, prioridad=None, pausado=None):
+        with self._lock:
+            if prioridad is not None:
+                self._db.execute('UPDATE trabajos SET prioridad = ? WHERE id = ?', (prioridad, id_trabajo))
+            if pausado is not None:
+                self._db.execute('UPDATE trabajos SET pausado = ? WHERE id = ?', (int(pausado), id_trabajo))
+
+    def terminar(self, id_trabajo):
+        """Olvida un trabajo terminado y borra lo que dejó a medias (.part y originales sin transcodificar)."""
+        with self._lock:
+            sobrantes = [archivo for archivo, in self._db.execute(
+                'SELECT archivo FROM parciales WHERE trabajo = ? '
+                'UNION SELECT origen FROM postproceso WHERE trabajo = ?', (id_trabajo, id_trabajo))]
+            self._db.execute('DELETE FROM trabajos WHERE id = ?', (id_trabajo,))
+        for archivo in sobrantes:
+            if os.path.exists(archivo):
+                os.remove(archivo)
+
+    def trabajo(self, id_trabajo):
+        return DiarioTrabajo(self, id_trabajo)
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
+
+class DiarioTrabajo:
+    """Vista del diario para un solo trabajo; es lo que recibe descargar_playlist."""
+
+    def __init__(self, diario, id_trabajo):
+        self._diario = diario
+        self.id = id_trabajo
+        self._parciales = set()
+
+    def _ejecutar(self, sql, parametros):
+        with self._diario._lock:
+            return self._diario._db.execute(sql, parametros).fetchall()
+
+    def resolucion(self):
+        """(info_playlist, entradas) guardados en un intento anterior, o None."""
+        filas = self._ejecutar('SELECT resolucion FROM trabajos WHERE id = ?', (self.id,))
+        if not filas or filas[0][0] is None:
+            return None
+        info_playlist, entradas = _descomprimir(filas[0][0])
+        info_playlist['entries'] = entradas
+        return info_playlist, entradas
+
+    def guardar_resolucion(self, info_playlist, entradas):
+        from .cache import _serializable
+
+        info = _serializable({k: v for k, v in info_playlist.items() if k != 'entries'})
+        datos = _comprimir([info, [entrada and _serializable(entrada) for entrada in entradas]])
+        self._ejecutar('UPDATE trabajos SET resolucion = ? WHERE id = ?', (datos, self.id))
+
+    def hook(self, d):
+        """progress_hook de yt-dlp: anota cada .part la primera vez que recibe datos."""
+        if d['status'] == 'downloading' and d.get('tmpfilename'):
+            archivo = os.path.abspath(d['tmpfilename'])
+            if archivo not in self._parciales:
+                self._parciales.add(archivo)
+                self._ejecutar('INSERT OR IGNORE INTO parciales VALUES (?, ?)', (self.id, archivo))
+        elif d['status'] == 'finished' and d.get('filename'):
+            # Al terminar, yt-dlp ya renombró el .part al nombre final
+            archivo = os.path.abspath(d['filename']) + '.part'
+            self._parciales.discard(archivo)
+            self._ejecutar('DELETE FROM parciales WHERE trabajo = ? AND archivo = ?', (self.id, archivo))
+
+    def postproceso_pendiente(self):
+        """[(origen, info)] de los archivos descargados que aún no pasaron por ffmpeg."""
+        filas = self._ejecutar('SELECT origen, info FROM postproceso WHERE trabajo = ?', (self.id,))
+        return [(origen, json.loads(info)) for origen, info in filas]
+
+    def anotar_postproceso(self, origen, info):
+        info = info_postproceso(info)
+        self._ejecutar('INSERT OR REPLACE INTO postproceso VALUES (?, ?, ?)',
+                       (self.id, os.path.abspath(origen), json.dumps(info, ensure_ascii=False)))
+
+    def postproceso_hecho(self, origen):
+        self._ejecutar('DELETE FROM postproceso WHERE trabajo = ? AND origen = ?',
+                       (self.id, os.path.abspath(origen)))
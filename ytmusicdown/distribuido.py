@@ -0,0 +1,466 @@
+import argparse
+import contextlib
+import itertools
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from .almacen import NOMBRE_ALMACEN, AlmacenContenidos
+from .cache import CacheMetadatos, _serializable
+from .cli import leer_lote
+from .control import ControlTrabajo, TrabajoCancelado
+from .diario import _comprimir, _descomprimir
+from .etiquetas import Etiquetador
+from .fragmentos import ADAPTADOR_FRAGMENTOS
+from .indice import IndiceDescargas, clave_info
+from .motor import (DESCARGAS_SIMULTANEAS, descargar_entradas, obtener_info_playlist, opciones_descarga,
+                    sanitize_filename)
+from .perfiles import PerfilMultiple, perfil_desde_texto
+from .reintentos import CORTACIRCUITOS
+from .resolucion import resolver_y_entregar
+from .sesion import SESION_HTTP, linea_estadisticas
+from .transcodificacion import PipelineTranscodificacion
+
+# ============ MODO DISTRIBUIDO: COORDINADOR Y TRABAJADORES ============
+#
+# Para lotes que no caben en una máquina. El coordinador expande cada playlist y guarda
+# una tarea por pista pendiente en un AlmacenTareas, un SQLite en un volumen compartido.
+# Cualquier número de trabajadores, en esta o en otras máquinas, toman tareas con un
+# arriendo: mientras trabajan lo renuevan y, si un trabajador muere, el arriendo vence
+# y otro retoma la tarea. Cada tarea pasa por el mismo motor que una descarga normal
+# (resolución, descarga, cola de ffmpeg y almacén de contenidos).
+#
+#   python -m ytmusicdown.distribuido coordinar tareas.sqlite3 lote.txt -d /mnt/musica
+#   python -m ytmusicdown.distribuido trabajar tareas.sqlite3    (en cada nodo, las veces que se quiera)
+#   python -m ytmusicdown.distribuido estado tareas.sqlite3
+#
+# Las rutas se guardan absolutas: el volumen compartido debe montarse en la misma ruta
+# en todos los nodos, y sus relojes deben estar sincronizados (los arriendos vencen por hora).
+# El índice de cada carpeta lo escribe quien completa cada pista con la base de datos
+# bloqueada, así que dos trabajadores nunca se pisan el archivo.
+
+ARRIENDO = 300.0          # segundos que una tarea es de un trabajador sin renovarla
+INTENTOS_MAXIMOS = 3      # veces que se asigna una tarea antes de darla por fallida
+ESPERA_TAREAS = 2.0       # segundos entre consultas cuando no hay tareas libres
+
+PENDIENTE = 'pendiente'
+ASIGNADA = 'asignada'
+HECHA = 'hecha'
+FALLIDA = 'fallida'
+
+@dataclass
+class Tarea:
+    id: int
+    posicion: int
+    entrada: dict
+    info_playlist: dict
+    carpeta: str
+    perfil: str
+
+class AlmacenTareas:
+    def __init__(self, ruta):
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None, timeout=60)
+        # Sin WAL: su memoria compartida no funciona entre máquinas que comparten el archivo por red
+        self._db.execute('PRAGMA journal_mode=DELETE')
+        self._db.execute('PRAGMA foreign_keys=ON')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS playlists (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                carpeta TEXT NOT NULL,
+                perfil TEXT NOT NULL,
+                info BLOB NOT NULL,
+                creado REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS tareas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                playlist INTEGER NOT NULL REFERENCES playlists (id) ON DELETE CASCADE,
+                posicion INTEGER NOT NULL,
+                clave TEXT,
+                entrada BLOB NOT NULL,
+                prioridad INTEGER NOT NULL,
+                estado TEXT NOT NULL DEFAULT 'pendiente',
+                trabajador TEXT,
+                vence REAL,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                error TEXT);
+            CREATE INDEX IF NOT EXISTS tareas_estado ON tareas (estado, prioridad DESC, id);''')
+
+    @contextlib.contextmanager
+    def _transaccion(self):
+        # BEGIN IMMEDIATE toma el bloqueo de escritura del archivo: es el cerrojo entre procesos y nodos
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def agregar_playlist(self, url, carpeta, perfil, info_playlist, entradas, prioridad=0):
+        """Guarda una tarea por cada (posicion, entrada) y devuelve cuántas son nuevas.
+
+        Las pistas que ya tienen una tarea abierta para la misma carpeta y perfil no se repiten.
+        """
+        info = _comprimir(_serializable({k: v for k, v in info_playlist.items() if k != 'entries'}))
+        with self._transaccion() as db:
+            id_playlist = db.execute(
+                'INSERT INTO playlists (url, carpeta, perfil, info, creado) VALUES (?, ?, ?, ?, ?)',
+                (url, os.path.abspath(carpeta), perfil, info, time.time())).lastrowid
+            nuevas = 0
+            for posicion, entrada in entradas:
+                clave = clave_info(entrada) if entrada.get('id') else None
+                if clave and db.execute(
+                        'SELECT 1 FROM tareas JOIN playlists ON playlists.id = tareas.playlist '
+                        'WHERE clave = ? AND carpeta = ? AND perfil = ? AND estado IN (?, ?)',
+                        (clave, os.path.abspath(carpeta), perfil, PENDIENTE, ASIGNADA)).fetchone():
+                    continue
+                db.execute('INSERT INTO tareas (playlist, posicion, clave, entrada, prioridad) VALUES (?, ?, ?, ?, ?)',
+                           (id_playlist, posicion, clave, _comprimir(_serializable(entrada)), prioridad))
+                nuevas += 1
+        return nuevas
+
+    def tomar(self, trabajador, arriendo=ARRIENDO):
+        """Asigna a trabajador la tarea libre más prioritaria (o una de arriendo vencido); None si no hay."""
+        ahora = time.time()
+        with self._transaccion() as db:
+            db.execute('UPDATE tareas SET estado = ?, error = ? WHERE estado = ? AND vence < ? AND intentos >= ?',
+                       (FALLIDA, 'arriendo vencido en el último intento', ASIGNADA, ahora, INTENTOS_MAXIMOS))
+            fila = db.execute(
+                'SELECT tareas.id, posicion, entrada, info, carpeta, perfil FROM tareas '
+                'JOIN playlists ON playlists.id = tareas.playlist '
+                'WHERE estado = ? OR (estado = ? AND vence < ?) ORDER BY prioridad DESC, tareas.id LIMIT 1',
+                (PENDIENTE, ASIGNADA, ahora)).fetchone()
+            if fila is None:
+                return None
+            db.execute('UPDATE tareas SET estado = ?, trabajador = ?, vence = ?, intentos = intentos + 1 WHERE id = ?',
+                       (ASIGNADA, trabajador, ahora + arriendo, fila[0]))
+        id_tarea, posicion, entrada, info, carpeta, perfil = fila
+        return Tarea(id_tarea, posicion, _descomprimir(entrada), _descomprimir(info), carpeta, perfil)
+
+    def renovar(self, id_tarea, trabajador, arriendo=ARRIENDO):
+        """Alarga el arriendo; False si la tarea ya no es de este trabajador."""
+        with self._transaccion() as db:
+            cursor = db.execute('UPDATE tareas SET vence = ? WHERE id = ? AND trabajador = ? AND estado = ?',
+                                (time.time() + arriendo, id_tarea, trabajador, ASIGNADA))
+        return cursor.rowcount > 0
+
+    def completar(self, id_tarea, trabajador, error=None, al_completar=None):
+        """Da la tarea por hecha (o, con error, la devuelve a la cola si le quedan intentos).
+
+        al_completar() se llama con la base de datos bloqueada y solo si la tarea seguía
+        siendo de este trabajador. Devuelve False si no lo era.
+        """
+        with self._transaccion() as db:
+            fila = db.execute('SELECT intentos FROM tareas WHERE id = ? AND trabajador = ? AND estado = ?',
+                              (id_tarea, trabajador, ASIGNADA)).fetchone()
+            if fila is None:
+                return False
+            if error is None:
+                estado = HECHA
+            else:
+                estado = FALLIDA if fila[0] >= INTENTOS_MAXIMOS else PENDIENTE
+            db.execute('UPDATE tareas SET estado = ?, error = ?, vence = NULL WHERE id = ?', (estado, error, id_tarea))
+            if al_completar and error is None:
+                al_completar()
+        return True
+
+    def liberar(self, id_tarea, trabajador):
+        """Devuelve a la cola una tarea que el trabajador deja a medias, sin gastar su intento."""
+        with self._transaccion() as db:
+            db.execute('UPDATE tareas SET estado = ?, vence = NULL, intentos = intentos - 1 '
+                       'WHERE id = ? AND trabajador = ? AND estado = ?', (PENDIENTE, id_tarea, trabajador, ASIGNADA))
+
+    def resumen(self):
+        """{estado: número de tareas}."""
+        with self._lock:
+            filas = self._db.execute('SELECT estado, COUNT(*) FROM tareas GROUP BY estado').fetchall()
+        return {PENDIENTE: 0, ASIGNADA: 0, HECHA: 0, FALLIDA: 0, **dict(filas)}
+
+    def fallidas(self):
+        """[(url de la playlist, posición, error)] de las tareas fallidas."""
+        with self._lock:
+            return self._db.execute(
+                'SELECT url, posicion, error FROM tareas JOIN playlists ON playlists.id = tareas.playlist '
+                'WHERE estado = ? ORDER BY tareas.id', (FALLIDA,)).fetchall()
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
+
+# ============ COORDINADOR ============
+
+def coordinar(tareas, url, destino, perfil='MP3', prioridad=0, cookiefile=None, cache=None, resolucion=None):
+    """Expande una playlist y guarda sus pistas pendientes como tareas; devuelve (carpeta, nuevas).
+
+    resolucion es un (info_playlist, entradas) ya extraído de url, p. ej. por resolver_lote.
+    """
+    if isinstance(perfil, str):
+        perfil = perfil_desde_texto(perfil)
+    if isinstance(perfil, PerfilMultiple):
+        # Cada tarea es una pista con un solo índice; las salidas múltiples van con descargar_playlist
+        raise ValueError(f'Los perfiles múltiples no se reparten entre trabajadores: {perfil.clave}')
+    resuelto = obtener_info_playlist(url, cookiefile, cache, resolucion=resolucion, sesion=SESION_HTTP)
+    nombre_playlist, nombre_artista, info_playlist, entradas = resuelto
+    carpeta = os.path.join(destino, sanitize_filename(f"{nombre_artista} - {nombre_playlist}"))
+    if info_playlist.get('_type') not in ('playlist', 'multi_video'):
+        # Vídeo suelto: la tarea guarda su URL, no el vídeo resuelto, cuyos formatos caducan
+        entradas = [{'_type': 'url', 'url': info_playlist.get('webpage_url') or url,
+                     'ie_key': info_playlist.get('extractor_key'), 'id': info_playlist.get('id'),
+                     'title': info_playlist.get('title')}]
+    else:
+        # Los trabajadores no reciben la lista: el total de la playlist viaja en su info
+        info_playlist = {**info_playlist, 'playlist_count': info_playlist.get('playlist_count') or len(entradas)}
+    indice = IndiceDescargas(carpeta, perfil.clave)
+    pendientes = [(posicion, entrada) for posicion, entrada in enumerate(entradas, start=1)
+                  if entrada and indice.pendiente(entrada)]
+    return carpeta, tareas.agregar_playlist(url, carpeta, perfil.clave, info_playlist, pendientes, prioridad)
+
+# ============ TRABAJADOR ============
+
+class _IndiceTarea:
+    """Lo que el motor y el pipeline usan de un IndiceDescargas, para una sola tarea.
+
+    La pista se guarda en el almacén de contenidos al terminar, pero el índice de la
+    carpeta se escribe al completar la tarea, con el AlmacenTareas bloqueado.
+    """
+
+    def __init__(self, perfil, almacen):
+        self.perfil = perfil
+        self.almacen = almacen
+        self.registrada = None
+
+    def pendiente(self, entrada):
+        return True  # el coordinador ya descartó las pistas que estaban en la carpeta
+
+    def registrar(self, info, archivo):
+        if not archivo:
+            return
+        self.registrada = (info, archivo)
+        if self.almacen:
+            self.almacen.guardar(info, self.perfil, archivo)
+
+class Trabajador:
+    def __init__(self, tareas, nombre=None, hilos=DESCARGAS_SIMULTANEAS, arriendo=ARRIENDO, cookiefile=None,
+                 cache=None, opciones=None, ffmpeg=None, deduplicar=True, al_terminar=None):
+        """al_terminar(tarea, error) se llama al acabar cada tarea (error es None si fue bien)."""
+        self.tareas = tareas
+        self.nombre = nombre or f'{socket.gethostname()}:{os.getpid()}'
+        self.hilos = max(1, hilos)
+        self.arriendo = arriendo
+        self.cookiefile = cookiefile
+        self.cache = cache
+        self.opciones = opciones
+        self.ffmpeg = ffmpeg
+        self.deduplicar = deduplicar
+        self.al_terminar = al_terminar
+        self._parar = threading.Event()
+        self._controles = set()
+        self._hilos = []
+        self._lock = threading.Lock()
+
+    def trabajar(self, esperar=False):
+        """Ejecuta tareas en self.hilos hilos hasta que no quede ninguna abierta.
+
+        Con esperar=True sigue esperando tareas nuevas hasta que se llame a cerrar().
+        Devuelve el número de tareas hechas.
+        """
+        hechas = itertools.count()
+        self._hilos = [threading.Thread(target=self._bucle, args=(esperar, hechas), daemon=True)
+                       for _ in range(self.hilos)]
+        for hilo in self._hilos:
+            hilo.start()
+        for hilo in self._hilos:
+            hilo.join()
+        return next(hechas)
+
+    def cerrar(self):
+        """Deja de tomar tareas y cancela las que están en curso, que vuelven a la cola."""
+        self._parar.set()
+        with self._lock:
+            for control in self._controles:
+                control.cancelar()
+        for hilo in self._hilos:
+            hilo.join()
+
+    def _bucle(self, esperar, hechas):
+        while not self._parar.is_set():
+            tarea = self.tareas.tomar(self.nombre, self.arriendo)
+            if tarea is None:
+                resumen = self.tareas.resumen()
+                # Con arriendos de otros aún abiertos se espera: si su trabajador murió, vencerán
+                if not esperar and not resumen[PENDIENTE] and not resumen[ASIGNADA]:
+                    return
+                self._parar.wait(ESPERA_TAREAS)
+                continue
+            if self.ejecutar(tarea):
+                next(hechas)
+
+    def ejecutar(self, tarea):
+        """Descarga y procesa una tarea ya asignada; True si quedó hecha."""
+        control = ControlTrabajo()
+        with self._lock:
+            self._controles.add(control)
+        renovacion = threading.Event()
+        hilo = threading.Thread(target=self._renovar, args=(tarea, control, renovacion), daemon=True)
+        hilo.start()
+        try:
+            indice, error = self._descargar(tarea, control)
+        except TrabajoCancelado:
+            self.tareas.liberar(tarea.id, self.nombre)
+            return False
+        except Exception as e:
+            indice, error = None, str(e) or type(e).__name__
+        finally:
+            renovacion.set()
+            hilo.join()
+            with self._lock:
+                self._controles.discard(control)
+
+        def registrar():
+            IndiceDescargas(tarea.carpeta, indice.perfil).registrar(*indice.registrada)
+
+        hecha = self.tareas.completar(tarea.id, self.nombre, error, registrar) and error is None
+        if self.al_terminar:
+            self.al_terminar(tarea, error)
+        return hecha
+
+    def _renovar(self, tarea, control, fin):
+        while not fin.wait(self.arriendo / 3):
+            if not self.tareas.renovar(tarea.id, self.nombre, self.arriendo):
+                # Otro trabajador la retomó (este estuvo parado más que el arriendo): se abandona
+                control.cancelar()
+                return
+
+    def _descargar(self, tarea, control):
+        perfil = perfil_desde_texto(tarea.perfil)
+        os.makedirs(tarea.carpeta, exist_ok=True)
+        almacen = None
+        if self.deduplicar:
+            almacen = AlmacenContenidos(os.path.join(os.path.dirname(tarea.carpeta), NOMBRE_ALMACEN))
+        indice = _IndiceTarea(perfil.clave, almacen)
+        ydl_opts = opciones_descarga(tarea.carpeta, perfil, self.cookiefile, [control.hook], self.opciones,
+                                     self.ffmpeg)
+        # La posición de la tarea en la playlist da el mismo número de pista que una descarga normal
+        entradas = itertools.chain(itertools.repeat(None, tarea.posicion - 1), [tarea.entrada])
+        if perfil.codec:
+            with PipelineTranscodificacion(perfil.codec, perfil.calidad, procesos=1, ffmpeg=self.ffmpeg,
+                                           indice=indice, control=control,
+                                           etiquetador=Etiquetador(tarea.info_playlist)) as pipeline:
+                descargar_entradas(tarea.info_playlist, entradas, ydl_opts, 1, cache=self.cache, indice=indice,
+                                   al_descargar=pipeline.encolar_descarga, control=control,
+                                   fragmentos=ADAPTADOR_FRAGMENTOS, cortacircuitos=CORTACIRCUITOS, sesion=SESION_HTTP)
+        else:
+            descargar_entradas(tarea.info_playlist, entradas, ydl_opts, 1, cache=self.cache, indice=indice,
+                               control=control, fragmentos=ADAPTADOR_FRAGMENTOS, cortacircuitos=CORTACIRCUITOS,
+                               sesion=SESION_HTTP)
+        control.comprobar()
+        if indice.registrada is None:
+            return indice, 'la pista no se pudo descargar o transcodificar'
+        return indice, None
+
+# ============ LÍNEA DE COMANDOS ============
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog='ytmusicdown.distribuido', description='Descarga por lotes repartida entre varios trabajadores.')
+    ordenes = parser.add_subparsers(dest='orden', required=True)
+
+    coordinador = ordenes.add_parser('coordinar', help='expande las playlists de un lote en tareas por pista')
+    coordinador.add_argument('tareas', help='base de datos de tareas compartida')
+    coordinador.add_argument(
+        'lote', help='archivo con una URL por línea, opcionalmente seguida de perfil y prioridad ("-" para stdin)')
+    coordinador.add_argument('-d', '--destino', default='.', help='directorio de descarga (por defecto, el actual)')
+    coordinador.add_argument('-p', '--perfil', default='MP3', help='perfil por defecto (por defecto MP3)')
+
+    trabajador = ordenes.add_parser('trabajar', help='toma y ejecuta tareas hasta que no quede ninguna')
+    trabajador.add_argument('tareas', help='base de datos de tareas compartida')
+    trabajador.add_argument('-j', '--hilos', type=int, default=DESCARGAS_SIMULTANEAS, help='tareas a la vez')
+    trabajador.add_argument('--nombre', help='nombre del trabajador (por defecto, máquina:pid)')
+    trabajador.add_argument('--arriendo', type=float, default=ARRIENDO,
+                            help=f'segundos sin renovar tras los que otro trabajador retoma la tarea '
+                                 f'(por defecto {ARRIENDO:g})')
+    trabajador.add_argument('--esperar', action='store_true',
+                            help='no terminar al vaciarse la cola: seguir esperando tareas nuevas')
+    trabajador.add_argument('--ffmpeg', help='ruta al ejecutable de ffmpeg')
+
+    estado = ordenes.add_parser('estado', help='muestra cuántas tareas hay en cada estado')
+    estado.add_argument('tareas', help='base de datos de tareas compartida')
+
+    for orden in (coordinador, trabajador):
+        orden.add_argument('--cookies', help='archivo cookies.txt para contenido con acceso premium')
+        orden.add_argument('--sin-cache', action='store_true', help='no usar la caché de metadatos en disco')
+    return parser
+
+def main(argv=None):
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    tareas = AlmacenTareas(args.tareas)
+    cache = None if getattr(args, 'sin_cache', True) else CacheMetadatos()
+    sin_resolver = []   # URL del lote cuya extracción falló: no llegan a repartirse
+    try:
+        if args.orden == 'coordinar':
+            try:
+                perfil = perfil_desde_texto(args.perfil)
+                if args.lote == '-':
+                    lote = leer_lote(sys.stdin, perfil)
+                else:
+                    with open(args.lote, encoding='utf-8') as f:
+                        lote = leer_lote(f, perfil)
+            except (OSError, ValueError) as e:
+                parser.error(str(e))
+            if any(isinstance(perfil, PerfilMultiple) for _, perfil, _ in lote):
+                parser.error('Los perfiles múltiples (MP3+MP4...) no se reparten entre trabajadores')
+            por_url = {}
+            for url, perfil, prioridad in lote:
+                por_url.setdefault(url, []).append((perfil, prioridad))
+
+            def al_resolver(url, resolucion, error):
+                # Las playlists se extraen a la vez y cada una se reparte en cuanto llega
+                if error:
+                    # Sin tareas que la lleven, el error se cuenta aquí y hace fallar al coordinador
+                    sin_resolver.append(url)
+                    print(f'No se pudo extraer {url}: {error}', file=sys.stderr)
+                    return
+                for perfil, prioridad in por_url[url]:
+                    carpeta, nuevas = coordinar(tareas, url, args.destino, perfil, prioridad, args.cookies, cache,
+                                                resolucion)
+                    print(f'{nuevas} tareas nuevas para {carpeta}', file=sys.stderr)
+
+            # El coordinador reparte la playlist entera: se pagina completa al resolverla
+            resolver_y_entregar(list(por_url), al_resolver, args.cookies, cache, progresiva=False)
+        elif args.orden == 'trabajar':
+            def al_terminar(tarea, error):
+                estado = 'error: ' + error if error else 'hecha'
+                print(f'[{os.path.basename(tarea.carpeta)} #{tarea.posicion}] {estado}', file=sys.stderr)
+
+            trabajador = Trabajador(tareas, args.nombre, args.hilos, args.arriendo, args.cookies, cache,
+                                    {'quiet': True, 'noprogress': True}, args.ffmpeg, al_terminar=al_terminar)
+            try:
+                hechas = trabajador.trabajar(args.esperar)
+            except KeyboardInterrupt:
+                print('Devolviendo las tareas en curso a la cola...', file=sys.stderr)
+                trabajador.cerrar()
+                return 1
+            print(f'{trabajador.nombre}: {hechas} tareas hechas', file=sys.stderr)
+            conexiones = linea_estadisticas(SESION_HTTP)
+            if conexiones:
+                print(f'{trabajador.nombre}: {conexiones}', file=sys.stderr)
+        resumen = tareas.resumen()
+        print(', '.join(f'{n} {estado}' for estado, n in resumen.items()), file=sys.stderr)
+        for url, posicion, error in tareas.fallidas():
+            print(f'  fallida: {url} #{posicion}: {error}', file=sys.stderr)
+        for url in sin_resolver:
+            print(f'  sin extraer: {url}', file=sys.stderr)
+        return 1 if resumen[FALLIDA] or sin_resolver else 0
+    finally:
+        tareas.cerrar()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import threading
+from urllib.parse import urlparse
+
+from .indice import clave_info
+from .sesion import SESION_HTTP, youtube_dl
+
+# ============ ETIQUETAS Y CARÁTULA ============
+#
+# Las etiquetas (título, artista, álbum, número de pista) se escriben en la misma orden
+# de ffmpeg que transcodifica o copia el audio, así que no hay una segunda pasada por los
+# archivos. Salen del info que ya resolvió la descarga: el álbum es la playlist y el
+# número de pista, su playlist_index.
+#
+# La carátula es la miniatura de la playlist (o, si no tiene, la de su primera pista). Se
+# baja una vez por álbum y se guarda en CacheCaratulas, en disco, de modo que todas las
+# pistas, y las siguientes sincronizaciones, usan el mismo archivo. Solo MP3 (ID3) y M4A
+# admiten carátula incrustada; el resto lleva solo las etiquetas.
+#
+# El álbum, su artista, el número de pista y la carátula son de la playlist, no del vídeo.
+# Una pista que otra playlist toma del AlmacenContenidos los lleva de la primera, así que
+# se copia con comando_reetiquetar, que cambia solo esos sin recodificar.
+
+RUTA_CARATULAS = os.path.join(os.path.expanduser('~'), '.ytmusicdown', 'caratulas')
+CANDIDATOS_CARATULA = 3           # miniaturas que se prueban antes de rendirse (maxres a veces no existe)
+EXTENSIONES_CON_CARATULA = ('mp3', 'm4a')
+TIPOS_IMAGEN = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp'}
+# Las que dependen de la playlist: cambian cuando otra playlist reutiliza la pista
+ETIQUETAS_PLAYLIST = ('album', 'album_artist', 'track')
+
+def etiquetas_pista(info, info_playlist=None, artista_album=None):
+    """{clave de metadatos de ffmpeg: valor} de una pista descargada."""
+    es_playlist = bool(info_playlist) and info_playlist.get('_type') in ('playlist', 'multi_video')
+    artista = (info.get('artist') or info.get('creator') or info.get('uploader') or info.get('channel')
+               or artista_album)
+    anio = info.get('release_year') or (info.get('upload_date') or '')[:4]
+    etiquetas = {
+        'title': info.get('track') or info.get('title'),
+        'artist': artista,
+        'album': (info_playlist.get('title') if es_playlist else None) or info.get('album'),
+        'album_artist': artista_album,
+        'date': str(anio) if anio else None,
+    }
+    if es_playlist and info.get('playlist_index'):
+        total = info.get('n_entries') or info.get('playlist_count')
+        etiquetas['track'] = f"{info['playlist_index']}/{total}" if total else str(info['playlist_index'])
+    return {clave: valor for clave, valor in etiquetas.items() if valor}
+
+def argumentos_etiquetas(etiquetas, extension):
+    """Opciones de ffmpeg que escriben las etiquetas en una salida con esa extensión."""
+    argumentos = []
+    for clave, valor in etiquetas.items():
+        argumentos += ['-metadata', f'{clave}={valor}']
+    if extension == 'mp3' and etiquetas:
+        argumentos += ['-id3v2_version', '3']   # ID3v2.4 no lo lee el Explorador de Windows
+    return argumentos
+
+def argumentos_caratula(entrada, caratula):
+    """Opciones de ffmpeg que incrustan la imagen de la entrada número entrada como carátula."""
+    # JPEG y PNG se copian tal cual; una miniatura WebP se pasa a JPEG, que es lo que admiten ID3 y MP4
+    codec = 'copy' if os.path.splitext(caratula)[1] in ('.jpg', '.png') else 'mjpeg'
+    return ['-map', f'{entrada}:0', '-c:v', codec, '-disposition:v:0', 'attached_pic']
+
+def comando_reetiquetar(origen, destino, etiquetas, caratula=None, ffmpeg='ffmpeg'):
+    """Orden de ffmpeg que copia origen sin recodificar, con estas etiquetas y esta carátula en vez de las suyas.
+
+    Una etiqueta con valor '' se borra; las que no están en etiquetas se conservan.
+    """
+    extension = os.path.splitext(destino)[1].lstrip('.').lower()
+    con_caratula = caratula and extension in EXTENSIONES_CON_CARATULA
+    orden = [ffmpeg, '-y', '-loglevel', 'error', '-i', origen]
+    if con_caratula:
+        orden += ['-i', caratula]
+    # 'V' deja fuera la carátula incrustada: la de la otra playlist no pasa a la copia
+    orden += ['-map', '0:V?', '-map', '0:a', '-c', 'copy']
+    if con_caratula:
+        orden += argumentos_caratula(1, caratula)
+    return orden + argumentos_etiquetas(etiquetas, extension) + [destino]
+
+def _candidatos(info):
+    # yt-dlp ordena las miniaturas de peor a mejor; se prueban de la mejor hacia abajo
+    urls = [t['url'] for t in reversed(info.get('thumbnails') or ()) if t.get('url')]
+    if info.get('thumbnail') and info['thumbnail'] not in urls:
+        urls.insert(0, info['thumbnail'])
+    return urls[:CANDIDATOS_CARATULA]
+
+def _bajar_imagen(url, sesion=None):
+    with youtube_dl({'quiet': True}, sesion) as ydl, ydl.urlopen(url) as respuesta:
+        datos = respuesta.read()
+        tipo = (respuesta.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+    extension = TIPOS_IMAGEN.get(tipo) or os.path.splitext(urlparse(url).path)[1].lstrip('.').lower()
+    return datos, 'jpg' if extension == 'jpeg' else extension
+
+class CacheCaratulas:
+    def __init__(self, ruta=RUTA_CARATULAS, sesion=SESION_HTTP):
+        self.ruta = ruta
+        self.sesion = sesion
+        self._lock = threading.Lock()
+        self._bloqueos = {}    # clave -> Lock: cada álbum se baja una vez aunque lo pidan varios hilos
+        self._sin_caratula = set()
+
+    def _nombre(self, clave):
+        return hashlib.sha1(clave.encode('utf-8')).hexdigest()
+
+    def buscar(self, clave):
+        """Ruta de la carátula guardada para clave, o None."""
+        nombre = self._nombre(clave)
+        for extension in ('jpg', 'png', 'webp'):
+            ruta = os.path.join(self.ruta, f'{nombre}.{extension}')
+            if os.path.exists(ruta):
+                return ruta
+        return None
+
+    def obtener(self, clave, urls):
+        """Carátula del álbum clave; si no está guardada, se baja de la primera de urls que responda."""
+        with self._lock:
+            bloqueo = self._bloqueos.setdefault(clave, threading.Lock())
+        with bloqueo:
+            ruta = self.buscar(clave)
+            if ruta or clave in self._sin_caratula:
+                return ruta
+            for url in urls:
+                try:
+                    datos, extension = _bajar_imagen(url, self.sesion)
+                except Exception:
+                    continue  # miniatura inexistente o error de red: se prueba la siguiente
+                if extension not in ('jpg', 'png', 'webp') or not datos:
+                    continue
+                os.makedirs(self.ruta, exist_ok=True)
+                ruta = os.path.join(self.ruta, f'{self._nombre(clave)}.{extension}')
+                temporal = ruta + '.tmp'
+                with open(temporal, 'wb') as f:
+                    f.write(datos)
+                os.replace(temporal, ruta)
+                return ruta
+            # Sin carátula en esta ejecución: las demás pistas del álbum no vuelven a intentarlo
+            self._sin_caratula.add(clave)
+            return None
+
+# Compartida por todos los trabajos del proceso
+CACHE_CARATULAS = CacheCaratulas()
+
+class Etiquetador:
+    """Etiquetas y carátula de las pistas de una playlist, para las órdenes de ffmpeg."""
+
+    def __init__(self, info_playlist, artista_album=None, caratulas=CACHE_CARATULAS):
+        self.info_playlist = info_playlist or {}
+        self.artista_album = artista_album
+        self.caratulas = caratulas
+
+    def etiquetas(self, info):
+        return etiquetas_pista(info or {}, self.info_playlist, self.artista_album)
+
+    def etiquetas_playlist(self, info):
+        """Las ETIQUETAS_PLAYLIST de la pista en esta playlist, con '' en las que no tiene."""
+        etiquetas = self.etiquetas(info)
+        return {clave: etiquetas.get(clave, '') for clave in ETIQUETAS_PLAYLIST}
+
+    def caratula(self, info):
+        """Ruta de la carátula del álbum (o None). La primera pista que la pide la baja."""
+        if not self.caratulas:
+            return None
+        # Sin miniatura propia de la playlist, vale la de la pista (en un álbum, todas comparten portada)
+        urls = _candidatos(self.info_playlist) or _candidatos(info or {})
+        if not urls:
+            return None
+        clave = clave_info(self.info_playlist) if self.info_playlist.get('id') else urls[0]
+        return self.caratulas.obtener(clave, urls)
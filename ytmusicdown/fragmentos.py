@@ -0,0 +1,91 @@
+import threading
+
+# ============ DESCARGA PARALELA DE FRAGMENTOS ============
+#
+# Los streams HLS/DASH llegan en cientos de fragmentos pequeños y, de uno en uno, la
+# latencia de cada petición domina el tiempo total. yt-dlp puede pedir varios a la vez
+# (concurrent_fragment_downloads): cada fragmento va a su propio archivo temporal y se
+# añade al final en orden, así que la memoria no crece con la duración del vídeo.
+#
+# AdaptadorFragmentos elige ese paralelismo para cada pista a partir de las anteriores.
+# De cada descarga fragmentada mide el rendimiento (bytes/s) y la latencia por fragmento
+# (segundos que cada hilo pasa en cada uno) y sube por la escalera 1, 2, 4, 8... mientras
+# doblar los hilos mejore el rendimiento al menos un MEJORA_MINIMA. Si la latencia crece
+# tanto que el rendimiento ya no mejora, el servidor o el enlace van llenos y se baja.
+# Cada REPROBAR pistas se olvidan las medidas vecinas para volver a explorar.
+
+PARALELO_INICIAL = 4
+PARALELO_MAXIMO = 16
+MEJORA_MINIMA = 0.10
+MIN_FRAGMENTOS = 8        # con menos fragmentos, la medida dice poco del paralelismo
+REPROBAR = 20
+SUAVIZADO = 0.5           # peso de la medida nueva en la media móvil
+
+def _media(anterior, nueva):
+    return nueva if anterior is None else anterior + SUAVIZADO * (nueva - anterior)
+
+class AdaptadorFragmentos:
+    def __init__(self, inicial=PARALELO_INICIAL, maximo=PARALELO_MAXIMO):
+        self.maximo = maximo
+        self.actual = min(inicial, maximo)
+        self._lock = threading.Lock()
+        self._rendimiento = {}   # hilos -> bytes/s
+        self._latencia = {}      # hilos -> segundos por fragmento y hilo
+        self._medidas = 0
+
+    def opciones_pista(self, ydl_opts):
+        """Copia de ydl_opts con el paralelismo actual y un hook que mide la descarga de la pista."""
+        hilos = self.actual
+        return {
+            **ydl_opts,
+            'concurrent_fragment_downloads': hilos,
+            'progress_hooks': [*ydl_opts.get('progress_hooks', ()), _MedidorPista(self, hilos).hook],
+        }
+
+    def estado(self):
+        """{hilos: (bytes/s, segundos por fragmento)} de lo medido hasta ahora."""
+        with self._lock:
+            return {hilos: (self._rendimiento[hilos], self._latencia.get(hilos)) for hilos in self._rendimiento}
+
+    def registrar(self, hilos, bytes_, segundos, fragmentos):
+        """Anota una descarga de fragmentos hecha con tantos hilos y ajusta el paralelismo."""
+        if segundos <= 0 or fragmentos < MIN_FRAGMENTOS:
+            return
+        with self._lock:
+            self._rendimiento[hilos] = _media(self._rendimiento.get(hilos), bytes_ / segundos)
+            self._latencia[hilos] = _media(self._latencia.get(hilos), segundos * min(hilos, fragmentos) / fragmentos)
+            if hilos != self.actual:
+                return  # medida de un paralelismo que ya se dejó
+            self._medidas += 1
+            arriba, abajo = min(self.maximo, hilos * 2), max(1, hilos // 2)
+            if self._medidas % REPROBAR == 0:
+                self._rendimiento.pop(arriba, None)
+                self._rendimiento.pop(abajo, None)
+            rendimiento = self._rendimiento
+            if (abajo != hilos and abajo in rendimiento
+                    and rendimiento[hilos] < rendimiento[abajo] * (1 + MEJORA_MINIMA)):
+                # Con el doble de hilos cada fragmento tarda casi el doble: no compensa
+                self.actual = abajo
+            elif arriba != hilos and (arriba not in rendimiento
+                                      or rendimiento[arriba] >= rendimiento[hilos] * (1 + MEJORA_MINIMA)):
+                self.actual = arriba
+
+class _MedidorPista:
+    """progress_hook de una pista: mide sus descargas fragmentadas y se las pasa al adaptador."""
+
+    def __init__(self, adaptador, hilos):
+        self.adaptador = adaptador
+        self.hilos = hilos
+        self._fragmentos = {}
+
+    def hook(self, d):
+        archivo = d.get('filename')
+        if d['status'] == 'downloading':
+            if d.get('fragment_count'):
+                self._fragmentos[archivo] = d['fragment_count']
+        elif d['status'] == 'finished' and archivo in self._fragmentos and d.get('elapsed'):
+            self.adaptador.registrar(self.hilos, d.get('downloaded_bytes') or d.get('total_bytes') or 0,
+                                     d['elapsed'], self._fragmentos.pop(archivo))
+
+# Compartido por todas las descargas del proceso: cada pista aprende de las anteriores
+ADAPTADOR_FRAGMENTOS = AdaptadorFragmentos()
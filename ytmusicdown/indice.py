@@ -0,0 +1,55 @@
+import json
+import os
+import threading
+import time
+
+# ============ ÍNDICE DE DESCARGAS POR CARPETA ============
+#
+# Cada carpeta de destino guarda qué vídeos ya tiene y con qué perfil (formato y
+# calidad) se generaron. Al volver a sincronizar la misma playlist, las entradas que
+# ya están en disco con el mismo perfil se saltan antes de hacer ninguna petición.
+# Con un AlmacenContenidos, cada pista registrada se guarda también en el almacén para
+# que otras playlists la enlacen en vez de volver a descargarla.
+
+NOMBRE_INDICE = '.ytmusicdown-indice.json'
+
+def clave_info(info):
+    return f"{info.get('extractor_key') or info.get('ie_key')}:{info['id']}"
+
+class IndiceDescargas:
+    def __init__(self, carpeta, perfil, almacen=None):
+        self.carpeta = carpeta
+        self.perfil = perfil
+        self.almacen = almacen
+        self.ruta = os.path.join(carpeta, NOMBRE_INDICE)
+        self._lock = threading.Lock()
+        self._pistas = {}
+        if os.path.exists(self.ruta):
+            with open(self.ruta, encoding='utf-8') as f:
+                self._pistas = json.load(f)
+
+    def pendiente(self, entrada):
+        """True si la entrada es nueva, cambió de perfil o su archivo ya no existe."""
+        if not entrada.get('id'):
+            return True
+        pista = self._pistas.get(clave_info(entrada))
+        return not (pista and pista['perfil'] == self.perfil
+                    and os.path.exists(os.path.join(self.carpeta, pista['archivo'])))
+
+    def registrar(self, info, archivo):
+        if not archivo:
+            return
+        with self._lock:
+            self._pistas[clave_info(info)] = {
+                'perfil': self.perfil,
+                'archivo': os.path.relpath(archivo, self.carpeta),
+                'titulo': info.get('title'),
+                'fecha': int(time.time()),
+            }
+            # Escritura atómica: un cierre a mitad no deja el índice corrupto
+            temporal = self.ruta + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(self._pistas, f, ensure_ascii=False, indent=1)
+            os.replace(temporal, self.ruta)
+        if self.almacen:
+            self.almacen.guardar(info, self.perfil, archivo)
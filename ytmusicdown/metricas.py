@@ -0,0 +1,214 @@
+import contextlib
+import http.server
+import json
+import os
+import threading
+import time
+
+# ============ MÉTRICAS POR ETAPA ============
+#
+# Cada trabajo puede llevar un MetricasTrabajo que mide cuánto tarda cada etapa de cada
+# pista (extracción de la playlist, resolución del vídeo con sus firmas, transferencia,
+# postproceso de yt-dlp, transcodificación y escritura, que deja los archivos finales con
+# su nombre y los registra en el índice), con bytes y reintentos. Los eventos se escriben
+# como JSON lines y se suman a unos contadores del proceso que ServidorMetricas expone en
+# formato de texto de Prometheus.
+
+RUTA_EVENTOS = os.path.join(os.path.expanduser('~'), '.ytmusicdown', 'eventos')
+PUERTO_METRICAS = 9464
+
+ETAPAS = ('extraccion', 'resolucion', 'transferencia', 'postproceso', 'transcodificacion', 'escritura')
+
+class MetricasProceso:
+    """Contadores acumulados de todos los trabajos del proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.segundos = dict.fromkeys(ETAPAS, 0.0)
+        self.veces = dict.fromkeys(ETAPAS, 0)
+        self.bytes = 0
+        self.reintentos = 0
+        self.pistas = {'ok': 0, 'error': 0}
+
+    def sumar_etapa(self, etapa, segundos):
+        with self._lock:
+            self.segundos[etapa] += segundos
+            self.veces[etapa] += 1
+
+    def sumar(self, bytes_=0, reintentos=0):
+        with self._lock:
+            self.bytes += bytes_
+            self.reintentos += reintentos
+
+    def sumar_pista(self, ok):
+        with self._lock:
+            self.pistas['ok' if ok else 'error'] += 1
+
+    def texto_prometheus(self):
+        with self._lock:
+            lineas = [
+                '# HELP ytmusicdown_etapa_segundos Tiempo pasado en cada etapa de la descarga.',
+                '# TYPE ytmusicdown_etapa_segundos summary',
+            ]
+            for etapa in ETAPAS:
+                lineas.append(f'ytmusicdown_etapa_segundos_sum{{etapa="{etapa}"}} {self.segundos[etapa]:.6f}')
+                lineas.append(f'ytmusicdown_etapa_segundos_count{{etapa="{etapa}"}} {self.veces[etapa]}')
+            lineas += [
+                '# HELP ytmusicdown_bytes_total Bytes recibidos de la red.',
+                '# TYPE ytmusicdown_bytes_total counter',
+                f'ytmusicdown_bytes_total {self.bytes}',
+                '# HELP ytmusicdown_reintentos_total Reintentos de red o de extracción de yt-dlp.',
+                '# TYPE ytmusicdown_reintentos_total counter',
+                f'ytmusicdown_reintentos_total {self.reintentos}',
+                '# HELP ytmusicdown_pistas_total Pistas terminadas, por resultado.',
+                '# TYPE ytmusicdown_pistas_total counter',
+                *(f'ytmusicdown_pistas_total{{resultado="{resultado}"}} {n}' for resultado, n in self.pistas.items()),
+            ]
+        return '\n'.join(lineas) + '\n'
+
+METRICAS_PROCESO = MetricasProceso()
+
+class MetricasTrabajo:
+    def __init__(self, ruta_eventos=None, trabajo=None, proceso=METRICAS_PROCESO):
+        """ruta_eventos: archivo JSON lines donde se añaden los eventos (None = solo contadores)."""
+        self.trabajo = trabajo
+        self.proceso = proceso
+        self._lock = threading.Lock()
+        self._pistas = {}
+        self._transferencias = {}
+        self._postprocesos = {}
+        self._archivo = None
+        if ruta_eventos:
+            os.makedirs(os.path.dirname(os.path.abspath(ruta_eventos)), exist_ok=True)
+            self._archivo = open(ruta_eventos, 'a', encoding='utf-8')
+
+    def evento(self, tipo, **datos):
+        if self._archivo is None:
+            return
+        linea = json.dumps({'t': round(time.time(), 3), 'trabajo': self.trabajo, 'evento': tipo, **datos},
+                           ensure_ascii=False)
+        with self._lock:
+            if not self._archivo.closed:
+                self._archivo.write(linea + '\n')
+                self._archivo.flush()
+
+    def _pista(self, pista):
+        # Con el lock tomado
+        return self._pistas.setdefault(pista, {'etapas': dict.fromkeys(ETAPAS, 0.0), 'bytes': 0, 'reintentos': 0})
+
+    def registrar_etapa(self, etapa, segundos, pista=None, **datos):
+        with self._lock:
+            self._pista(pista)['etapas'][etapa] += segundos
+        self.proceso.sumar_etapa(etapa, segundos)
+        self.evento('etapa', etapa=etapa, pista=pista, segundos=round(segundos, 4), **datos)
+
+    @contextlib.contextmanager
+    def etapa(self, etapa, pista=None, **datos):
+        inicio = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.registrar_etapa(etapa, time.perf_counter() - inicio, pista, ok=ok, **datos)
+
+    def sumar_bytes(self, pista, bytes_):
+        with self._lock:
+            self._pista(pista)['bytes'] += bytes_
+        self.proceso.sumar(bytes_=bytes_)
+
+    def reintento(self, pista, mensaje):
+        with self._lock:
+            self._pista(pista)['reintentos'] += 1
+        self.proceso.sumar(reintentos=1)
+        self.evento('reintento', pista=pista, mensaje=mensaje)
+
+    def pista_terminada(self, pista, titulo, ok):
+        with self._lock:
+            datos = self._pista(pista)
+            resumen = {'etapas': {e: round(s, 4) for e, s in datos['etapas'].items() if s},
+                       'bytes': datos['bytes'], 'reintentos': datos['reintentos']}
+        self.proceso.sumar_pista(ok)
+        self.evento('pista', pista=pista, titulo=titulo, ok=ok, **resumen)
+
+    def resumen(self):
+        """Totales del trabajo: segundos por etapa, bytes y reintentos."""
+        with self._lock:
+            pistas = list(self._pistas.values())
+        return {
+            'etapas': {e: round(sum(p['etapas'][e] for p in pistas), 4) for e in ETAPAS},
+            'bytes': sum(p['bytes'] for p in pistas),
+            'reintentos': sum(p['reintentos'] for p in pistas),
+        }
+
+    # --- Hooks de yt-dlp ---
+
+    def hook(self, d):
+        """progress_hook: mide la transferencia de cada archivo y cuenta sus bytes."""
+        info = d.get('info_dict') or {}
+        pista = info.get('playlist_index')
+        archivo = d.get('filename')
+        if d['status'] == 'downloading':
+            self._transferencias.setdefault(archivo, time.perf_counter())
+        elif d['status'] in ('finished', 'error'):
+            inicio = self._transferencias.pop(archivo, None)
+            if d['status'] == 'finished':
+                self.sumar_bytes(pista, d.get('total_bytes') or d.get('downloaded_bytes') or 0)
+            if inicio is not None:
+                self.registrar_etapa('transferencia', time.perf_counter() - inicio, pista,
+                                     ok=d['status'] == 'finished', archivo=os.path.basename(archivo or ''))
+
+    def hook_postproceso(self, d):
+        """postprocessor_hook: mide cada postprocesador de yt-dlp (unir vídeo y audio, arreglos...)."""
+        info = d.get('info_dict') or {}
+        clave = (info.get('playlist_index'), info.get('id'), d.get('postprocessor'))
+        if d['status'] == 'started':
+            self._postprocesos[clave] = time.perf_counter()
+        elif d['status'] == 'finished' and clave in self._postprocesos:
+            self.registrar_etapa('postproceso', time.perf_counter() - self._postprocesos.pop(clave), clave[0],
+                                 postprocesador=d.get('postprocessor'))
+
+    def observador(self, pista):
+        """Observador de LoggerPista que cuenta los reintentos de la pista."""
+        def observar(nivel, mensaje):
+            # Los de extracción llegan como warning; los de descarga, como debug
+            if nivel != 'error' and 'Retrying' in mensaje:
+                self.reintento(pista, mensaje)
+        return observar
+
+    def cerrar(self):
+        with self._lock:
+            if self._archivo:
+                self._archivo.close()
+
+def medir(metricas, etapa, pista=None, **datos):
+    """metricas.etapa(...) o, sin métricas, un contexto que no hace nada."""
+    return metricas.etapa(etapa, pista, **datos) if metricas else contextlib.nullcontext()
+
+class _ManejadorMetricas(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        cuerpo = self.server.proceso.texto_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+class ServidorMetricas(http.server.ThreadingHTTPServer):
+    """Endpoint /metrics local (solo 127.0.0.1 por defecto) en un hilo propio."""
+    daemon_threads = True
+
+    def __init__(self, puerto=PUERTO_METRICAS, direccion='127.0.0.1', proceso=METRICAS_PROCESO):
+        super().__init__((direccion, puerto), _ManejadorMetricas)
+        self.proceso = proceso
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,617 @@
+import contextlib
+import copy
+import functools
+import itertools
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from .almacen import NOMBRE_ALMACEN, AlmacenContenidos
+from .cache import clave_entrada, clave_url
+from .control import TrabajoCancelado
+from .diario import info_postproceso
+from .etiquetas import CACHE_CARATULAS, Etiquetador
+from .fragmentos import ADAPTADOR_FRAGMENTOS
+from .indice import IndiceDescargas, clave_info
+from .metricas import medir
+from .perfiles import PerfilMultiple, perfil_desde_texto
+from .reintentos import (CORTACIRCUITOS, REINTENTOS, TIPOS_REINTENTO, TROCEO, ColaFallidas, LoggerPista,
+                         clave_host, espera_reintento)
+from .salidas import IndicesPerfiles, PipelineSalidas
+from .sesion import SESION_HTTP, youtube_dl
+from .sonoridad import CACHE_SONORIDAD, Normalizador, clave_normalizada
+from .transcodificacion import (Diagnostico, PipelineTranscodificacion, archivo_descargado, copiar_reetiquetada,
+                                separar_flujos)
+
+# yt_dlp se importa dentro de las funciones que lo usan: cargar todos sus extractores
+# tarda, y así la CLI (ayuda, validación del lote) arranca sin pagar ese coste.
+
+# Número de pistas que se descargan a la vez. El tiempo total está dominado por la
+# latencia de cada pista (extracción, firmas, arranque de la transferencia), no por
+# el ancho de banda, así que varias descargas simultáneas aprovechan mejor la conexión.
+DESCARGAS_SIMULTANEAS = 4
+
+# Con memoria_acotada, pistas encoladas o descargándose por cada hilo de descarga
+EN_VUELO_POR_HILO = 2
+
+INVALID_CHARS = r'[<>:"/\\|?*\x00-\x1F]'
+PLANTILLA_SALIDA = '%(playlist_index)02d - %(title)s.%(ext)s'
+
+def sanitize_filename(filename):
+    return re.sub(INVALID_CHARS, '_', filename)
+
+# ============ EXPANSIÓN DE LA PLAYLIST ============
+
+def opciones_expansion(cookiefile=None):
+    """Opciones de yt-dlp de la extracción plana de expandir_playlist."""
+    return {
+        'quiet': True,
+        'skip_download': True,
+        'extract_flat': 'in_playlist',
+        'cookiefile': cookiefile,
+    }
+
+def expandir_playlist(url, cookiefile=None, cache=None, ydl=None, sesion=None):
+    """Devuelve (info_playlist, entradas) sin resolver cada vídeo.
+
+    Es la única extracción de la playlist: el nombre de la carpeta y la descarga de
+    cada entrada salen de este mismo resultado, sin volver a paginar la playlist.
+    Con una CacheMetadatos, un resultado vigente evita incluso esa extracción.
+    ydl es un YoutubeDL ya creado con opciones_expansion, para reutilizarlo entre URL; si
+    no, se crea uno con las conexiones de la SesionHTTP sesion.
+    """
+    clave = clave_url(url) if cache else None
+    info_dict = cache.obtener(clave) if cache else None
+    if info_dict is None:
+        if ydl is not None:
+            info_dict = ydl.extract_info(url, download=False)
+        else:
+            with youtube_dl(opciones_expansion(cookiefile), sesion) as ydl:
+                info_dict = ydl.extract_info(url, download=False)
+        if cache:
+            cache.guardar(clave, info_dict)
+    if info_dict.get('_type') not in ('playlist', 'multi_video'):
+        # Enlace a un único vídeo: ya está resuelto y se descarga tal cual, sin índice de playlist
+        return info_dict, [info_dict]
+    return info_dict, list(info_dict.get('entries') or [])
+
+# Entradas pedidas en cada getslice() a una PagedList; las páginas ya pedidas quedan en su caché
+VENTANA_PAGINACION = 50
+
+def _iterar_entradas(entradas):
+    from yt_dlp.utils import PagedList
+
+    if isinstance(entradas, PagedList):
+        # getslice() sin final pediría todas las páginas antes de devolver nada
+        return _por_ventanas(entradas)
+    return iter(entradas or ())
+
+def _por_ventanas(paginada):
+    inicio = 0
+    while True:
+        ventana = paginada.getslice(inicio, inicio + VENTANA_PAGINACION)
+        yield from ventana
+        if len(ventana) < VENTANA_PAGINACION:
+            return
+        inicio += VENTANA_PAGINACION
+
+def _soltar(entradas):
+    # Entrega las entradas de una lista ajena dejando None en su lugar: ninguna sigue en
+    # memoria por esa lista (ni por la resolución que la contiene) una vez encolada
+    for posicion in range(len(entradas)):
+        entrada, entradas[posicion] = entradas[posicion], None
+        yield entrada
+
+def _paginar(ydl, entradas):
+    # El YoutubeDL sigue abierto mientras queden páginas por pedir
+    with ydl:
+        yield from _iterar_entradas(entradas)
+
+def expandir_playlist_progresiva(url, cookiefile=None, sesion=None):
+    """Como expandir_playlist, pero entradas es un iterador que pagina la playlist al consumirse.
+
+    Solo se pide la primera página antes de volver; las siguientes se van pidiendo mientras
+    se descargan las primeras pistas, así que el tiempo hasta la primera no depende del tamaño.
+    """
+    ydl = youtube_dl({'quiet': True, 'skip_download': True, 'cookiefile': cookiefile}, sesion)
+    try:
+        # process=False deja 'entries' como generador o PagedList, sin recorrerlo
+        info_dict = ydl.extract_info(url, download=False, process=False)
+        while info_dict.get('_type') in ('url', 'url_transparent'):
+            info_dict = ydl.extract_info(info_dict['url'], download=False, ie_key=info_dict.get('ie_key'),
+                                         process=False)
+    except BaseException:
+        ydl.close()
+        raise
+    if info_dict.get('_type') not in ('playlist', 'multi_video'):
+        ydl.close()
+        return info_dict, iter([info_dict])
+    return info_dict, _paginar(ydl, info_dict.get('entries'))
+
+def _nombre_artista(primera_entrada):
+    if not primera_entrada:
+        return 'Artista'
+    return (primera_entrada.get('uploader') or primera_entrada.get('artist')
+            or primera_entrada.get('channel') or 'Varios')
+
+def _medir_paginacion(entradas, metricas, segundos):
+    # 'extraccion' suma todas las páginas, no solo la primera; el tiempo que el consumidor
+    # pasa con cada entrada (su descarga) no cuenta
+    ok = False
+    try:
+        while True:
+            inicio = time.perf_counter()
+            try:
+                entrada = next(entradas)
+            except StopIteration:
+                ok = True
+                return
+            finally:
+                segundos += time.perf_counter() - inicio
+            yield entrada
+    finally:
+        metricas.registrar_etapa('extraccion', segundos, ok=ok)
+
+def _al_agotar(entradas, al_terminar):
+    # Deja pasar las entradas y, cuando se acaba la paginación, entrega la lista completa
+    vistas = []
+    for entrada in entradas:
+        vistas.append(entrada)
+        yield entrada
+    al_terminar(vistas)
+
+def obtener_info_playlist(url, cookiefile=None, cache=None, diario=None, metricas=None, resolucion=None,
+                          sesion=None):
+    """Devuelve (nombre_playlist, nombre_artista, info_playlist, entradas).
+
+    Con un DiarioTrabajo, una playlist ya resuelta en un intento anterior no se vuelve a
+    extraer: se reanuda exactamente con las mismas entradas y la misma numeración.
+    resolucion es un (info_playlist, entradas) ya extraído, p. ej. por resolver_lote.
+    """
+    resuelto = diario.resolucion() if diario else None
+    if resuelto:
+        info_dict, entradas = resuelto
+    else:
+        if resolucion:
+            info_dict, entradas = resolucion
+            if not isinstance(entradas, list):
+                # Una resolución progresiva (solo su primera página): aquí hace falta la lista entera
+                with medir(metricas, 'extraccion'):
+                    entradas = list(entradas)
+        else:
+            # La misma extracción plana sirve para el nombre de la carpeta y para la descarga
+            with medir(metricas, 'extraccion'):
+                info_dict, entradas = expandir_playlist(url, cookiefile, cache, sesion=sesion)
+        if diario and info_dict.get('_type') in ('playlist', 'multi_video'):
+            # Un vídeo suelto no se guarda: sus URL de formato caducan y volver a extraerlo es barato
+            diario.guardar_resolucion(info_dict, entradas)
+    nombre_playlist = info_dict.get('title', 'Playlist')
+    nombre_artista = _nombre_artista(entradas[0] if entradas else None)
+    return nombre_playlist, nombre_artista, info_dict, entradas
+
+def obtener_info_playlist_progresiva(url, cookiefile=None, cache=None, diario=None, metricas=None,
+                                     resolucion=None, sesion=None):
+    """Como obtener_info_playlist, pero entradas es un iterador que se pagina sobre la marcha.
+
+    Si ya hay una resolucion con la lista completa, o el diario o la caché la tienen, se usa
+    esa lista. Si no, al terminar la paginación la lista se guarda en ambos para la próxima
+    vez. Una resolucion de expandir_playlist_progresiva sigue paginándose desde donde quedó.
+    """
+    progresiva = bool(resolucion) and not isinstance(resolucion[1], list)
+    if ((resolucion and not progresiva) or (diario and diario.resolucion())
+            or (not progresiva and cache and cache.obtener(clave_url(url)))):
+        return obtener_info_playlist(url, cookiefile, cache, diario, metricas, resolucion, sesion)
+    inicio = time.perf_counter()
+    try:
+        info_dict, entradas = resolucion if progresiva else expandir_playlist_progresiva(url, cookiefile, sesion)
+    except BaseException:
+        if metricas:
+            metricas.registrar_etapa('extraccion', time.perf_counter() - inicio, ok=False)
+        raise
+    if metricas:
+        entradas = _medir_paginacion(entradas, metricas, time.perf_counter() - inicio)
+    # Para el nombre de la carpeta basta la primera entrada disponible, es decir, la primera
+    # página. Las None (vídeos no disponibles) se conservan: mantienen la numeración
+    cabeza = []
+    for entrada in entradas:
+        cabeza.append(entrada)
+        if entrada is not None:
+            break
+    primera = cabeza[-1] if cabeza else None
+    entradas = itertools.chain(cabeza, entradas)
+    if (cache or diario) and info_dict.get('_type') in ('playlist', 'multi_video'):
+        def guardar(lista):
+            completo = {**info_dict, 'entries': lista}
+            if cache:
+                cache.guardar(clave_url(url), completo)
+            if diario:
+                diario.guardar_resolucion(completo, lista)
+        entradas = _al_agotar(entradas, guardar)
+    return info_dict.get('title', 'Playlist'), _nombre_artista(primera), info_dict, entradas
+
+# ============ DESCARGA CONCURRENTE POR PISTA ============
+
+def _info_extra(info_playlist, indice):
+    if info_playlist is None or info_playlist.get('_type') not in ('playlist', 'multi_video'):
+        return None
+    return {
+        'playlist_index': indice,
+        'playlist': info_playlist.get('title') or info_playlist.get('id'),
+        'playlist_id': info_playlist.get('id'),
+        'playlist_title': info_playlist.get('title'),
+        'playlist_count': info_playlist.get('playlist_count'),
+        # Con la expansión progresiva 'entries' aún se está paginando y no tiene longitud
+        'n_entries': (len(info_playlist['entries']) if isinstance(info_playlist.get('entries'), list)
+                      else info_playlist.get('playlist_count')),
+    }
+
+def _resolver_entrada(ydl, entrada, cache):
+    # Solo las referencias planas ('url') se extraen aquí; lo demás ya está resuelto.
+    # Extraerlas aparte de process_ie_result permite cachearlas y medir su tiempo.
+    if entrada.get('_type') != 'url':
+        return copy.deepcopy(entrada)
+    clave = clave_entrada(entrada) if cache else None
+    info = cache.obtener(clave) if cache else None
+    if info is None:
+        info = ydl.extract_info(entrada['url'], download=False, ie_key=entrada.get('ie_key'), process=False)
+        if info and cache:
+            cache.guardar(clave, info)
+    return info
+
+def info_reducida(info):
+    """Lo que queda de una pista descargada con memoria_acotada: lo que usan el índice, ffmpeg y las etiquetas."""
+    return {**info_postproceso(info), 'filepath': archivo_descargado(info)}
+
+def _descargar_pista(ydl_opts, entrada, extra, al_descargar, cache, progreso, control, metricas, fragmentos,
+                     cortacircuitos=None, fallidas=None, posicion=None, reducir=False, sesion=None, al_estado=None):
+    import yt_dlp
+
+    if control:
+        control.comprobar()
+    pista = extra and extra['playlist_index']
+    host = clave_host(entrada)
+    observadores = []
+    if cortacircuitos:
+        # Si el host está limitando, la pista ni empieza hasta que se cierre el circuito
+        cortacircuitos.esperar(host, control)
+        if control:
+            control.comprobar()
+        ydl_opts = cortacircuitos.opciones_pista(ydl_opts, host, control)
+        observadores.append(cortacircuitos.observador(host, al_estado))
+    if fragmentos and 'concurrent_fragment_downloads' not in ydl_opts:
+        # Un valor fijo en las opciones manda; si no, el paralelismo se ajusta con cada pista
+        ydl_opts = fragmentos.opciones_pista(ydl_opts)
+    if metricas:
+        observadores.append(metricas.observador(pista))
+    # Un logger por pista: así cada aviso y cada error de yt-dlp se atribuyen a su pista
+    logger = LoggerPista(ydl_opts, observadores)
+    ydl_opts = {**ydl_opts, 'logger': logger}
+
+    # Cada pista usa su propia instancia de YoutubeDL: no comparten estado mutable, salvo las
+    # cookies y las conexiones de la SesionHTTP, que están hechas para usarse desde varios hilos.
+    # process_ie_result parte de la entrada ya extraída: una referencia plana se resuelve
+    # con su propio extractor (ie_key) y un vídeo ya resuelto no se vuelve a extraer.
+    try:
+        with youtube_dl(ydl_opts, sesion) as ydl:
+            # La resolución incluye las firmas y el reto 'n' de YouTube, que se calculan al extraer
+            with medir(metricas, 'resolucion', pista):
+                info = _resolver_entrada(ydl, entrada, cache)
+            if info:
+                info = separar_flujos(ydl.process_ie_result(info, download=True, extra_info=extra))
+    except yt_dlp.utils.DownloadCancelled:
+        if control and control.cancelado:
+            raise TrabajoCancelado('Trabajo cancelado') from None
+        raise
+    if logger.ultimo_error:
+        # Con ignoreerrors, yt-dlp devuelve el info aunque la descarga o el postproceso fallen
+        info = None
+    if info and reducir:
+        # Formatos, miniaturas y subtítulos de cada vídeo pesan cientos de KB: se sueltan ya
+        info = info_reducida(info)
+    if fallidas and info:
+        fallidas.quitar(entrada)
+    elif fallidas:
+        fallidas.anotar(entrada, posicion, logger.ultimo_error)
+    if progreso and info and al_descargar:
+        # Antes de entregarla: quien la recibe (ffmpeg o el índice) es quien la da por terminada
+        progreso.pista_convirtiendo(pista, entrada.get('title'))
+    elif progreso:
+        progreso.pista_terminada(pista, entrada.get('title'), bool(info))
+    if info and al_descargar:
+        al_descargar(info)
+    if metricas:
+        metricas.pista_terminada(pista, entrada.get('title'), bool(info))
+    return info
+
+def _reutilizar(indice, entrada, extra, nombrador, progreso, metricas, copiar=None):
+    # Pista ya descargada (y transcodificada) para otra playlist: se enlaza o se copia con el nombre de esta
+    pista = extra and extra['playlist_index']
+
+    def nombrar(extension):
+        return nombrador.prepare_filename({**entrada, **(extra or {}), 'ext': extension})
+
+    if copiar:
+        copiar = functools.partial(copiar, info={**entrada, **(extra or {})})
+    with medir(metricas, 'escritura', pista):
+        archivo = indice.almacen.reutilizar(entrada, indice.perfil, nombrar, copiar)
+        if archivo:
+            indice.registrar(entrada, archivo)
+    if not archivo:
+        return None
+    if progreso:
+        progreso.agregar_pistas(1)
+        progreso.pista_terminada(pista, entrada.get('title'), True)
+    if metricas:
+        metricas.evento('reutilizada', pista=pista, archivo=os.path.basename(archivo))
+    return {**entrada, **(extra or {}), 'filepath': archivo}
+
+def _tomar_plaza(plazas, control):
+    # Espera a que termine alguna pista sin dejar de atender a una cancelación
+    while not plazas.acquire(timeout=TROCEO):
+        if control:
+            control.comprobar()
+
+def descargar_entradas(info_playlist, entradas, ydl_opts, hilos=DESCARGAS_SIMULTANEAS, al_descargar=None,
+                       cache=None, indice=None, progreso=None, control=None, metricas=None, fragmentos=None,
+                       cortacircuitos=None, fallidas=None, memoria_acotada=False, sesion=None, al_estado=None,
+                       copiar=None):
+    """Descarga las entradas en paralelo y devuelve sus resultados en el orden de la playlist.
+
+    El índice de cada pista es su posición en la playlist, por lo que la plantilla
+    '%(playlist_index)02d' produce los mismos nombres que una descarga secuencial.
+    Si se indica, al_descargar(info) se llama desde el hilo de descarga al terminar cada pista.
+    La pista queda entonces 'Convirtiendo' en el progreso hasta que al_descargar o quien
+    la convierta (el pipeline, con el mismo progreso) la dé por terminada.
+    Con una CacheMetadatos, la extracción de cada pista se reutiliza entre ejecuciones.
+
+    Con un IndiceDescargas solo se descargan las entradas nuevas o cambiadas. Registra
+    cada pista quien deja su archivo final: el motor si no hay al_descargar, o el
+    pipeline de transcodificación al terminar el MP3. Si el índice tiene un almacén con
+    la pista en el mismo perfil, se enlaza desde ahí sin descargar ni transcodificar o,
+    con copiar(origen, destino, info) -> bool, se copia con ella (ver copiar_reetiquetada).
+
+    entradas puede ser un iterador que se pagina sobre la marcha: cada entrada se encola
+    en cuanto llega, sin esperar a las siguientes.
+
+    Con una ColaProgreso se notifica cada pista pendiente y el final de cada una; el
+    progreso de bytes llega por sus propios progress_hooks.
+
+    Con un ControlTrabajo, cada pista espera mientras el trabajo esté en pausa y, si se
+    cancela, las pendientes no empiezan y se lanza TrabajoCancelado.
+
+    Con un MetricasTrabajo se mide cada etapa de cada pista, con sus bytes y reintentos.
+
+    Con un AdaptadorFragmentos, los streams HLS/DASH se bajan con varios fragmentos a la
+    vez, con tantos como den mejor rendimiento en las pistas anteriores.
+
+    Con un Cortacircuitos, las pistas de un host que responde 429 o 403 esperan a que se
+    cierre su circuito. Con una ColaFallidas, las pistas que fallan se anotan en ella y se
+    reintentan una vez al final; las que siguen fallando quedan como None en el resultado.
+
+    Con memoria_acotada, el info de cada pista se reduce a info_reducida en cuanto termina
+    (también el que recibe al_descargar) y solo se toman de entradas las pistas que los
+    hilos van a empezar enseguida, así que la memoria no crece con el tamaño de la playlist.
+
+    Con una SesionHTTP, todas las pistas comparten sus cookies y sus conexiones keep-alive.
+
+    al_estado(texto) recibe los avisos del trabajo, como la pausa de un host que limita
+    (None: los de progreso.mensaje, si hay progreso).
+    """
+    al_estado = al_estado or (progreso.mensaje if progreso else None)
+    if indice and al_descargar is None:
+        def al_descargar(info):
+            with medir(metricas, 'escritura', info.get('playlist_index')):
+                indice.registrar(info, archivo_descargado(info))
+            if progreso:
+                progreso.pista_terminada(info.get('playlist_index'), info.get('title'), True)
+    if progreso:
+        progreso.iniciar(0)
+    nombrador = None
+    if indice and indice.almacen:
+        import yt_dlp
+
+        # Solo para poner a las pistas reutilizadas el mismo nombre que les daría la descarga
+        nombrador = yt_dlp.YoutubeDL({'quiet': True, 'outtmpl': ydl_opts.get('outtmpl', PLANTILLA_SALIDA)})
+    futuros = []
+    posiciones = {}   # posición en la playlist -> índice en futuros
+    plazas = threading.BoundedSemaphore(max(1, hilos) * EN_VUELO_POR_HILO) if memoria_acotada else None
+    with contextlib.ExitStack() as pila, ThreadPoolExecutor(max_workers=max(1, hilos)) as pool:
+        if nombrador:
+            pila.enter_context(nombrador)
+        for posicion, entrada in enumerate(entradas, start=1):
+            if control:
+                control.comprobar()  # también deja de paginar si el trabajo se pausa o cancela
+            if not entrada or (indice and not indice.pendiente(entrada)):
+                continue
+            extra = _info_extra(info_playlist, posicion)
+            reutilizada = nombrador and _reutilizar(indice, entrada, extra, nombrador, progreso, metricas, copiar)
+            if reutilizada:
+                futuro = Future()
+                futuro.set_result(reutilizada)
+                futuros.append(futuro)
+                continue
+            if progreso:
+                progreso.agregar_pistas(1)
+            posiciones[posicion] = len(futuros)
+            if plazas:
+                # No se pagina ni se encola más de lo que los hilos van a tomar enseguida
+                _tomar_plaza(plazas, control)
+            futuro = pool.submit(_descargar_pista, ydl_opts, entrada, extra, al_descargar, cache, progreso,
+                                 control, metricas, fragmentos, cortacircuitos, fallidas, posicion, memoria_acotada,
+                                 sesion, al_estado)
+            if plazas:
+                futuro.add_done_callback(lambda _: plazas.release())
+            futuros.append(futuro)
+        resultados = [futuro.result() for futuro in futuros]
+        if fallidas:
+            # Segunda vuelta para lo que falló en esta: para entonces un corte pasajero o la
+            # limitación de un host (con su circuito ya cerrado) suelen haberse resuelto
+            reintentos = []
+            for posicion, entrada in fallidas.de_esta_ejecucion():
+                if posicion not in posiciones:
+                    continue
+                extra = _info_extra(info_playlist, posicion)
+                if progreso:
+                    progreso.reabrir(extra and extra['playlist_index'])
+                reintentos.append((posicion, pool.submit(
+                    _descargar_pista, ydl_opts, entrada, extra, al_descargar, cache, progreso, control, metricas,
+                    fragmentos, cortacircuitos, fallidas, posicion, memoria_acotada, sesion, al_estado)))
+            for posicion, futuro in reintentos:
+                resultados[posiciones[posicion]] = futuro.result()
+        return resultados
+
+# ============ DESCARGA DE UNA PLAYLIST COMPLETA ============
+
+def opciones_descarga(carpeta, perfil, cookiefile=None, progress_hooks=(), opciones=None, ffmpeg=None,
+                      metricas=None):
+    """Opciones de yt-dlp para bajar pistas de una playlist a carpeta con un Perfil."""
+    ydl_opts = {
+        'outtmpl': os.path.join(carpeta, PLANTILLA_SALIDA),
+        'progress_hooks': list(progress_hooks),
+        'ignoreerrors': True,
+        'geo_bypass': True,
+        'cookiefile': cookiefile,
+        'continuedl': True,  # un .part de un intento anterior se continúa con Range, no desde cero
+        # Entre reintentos, espera exponencial con jitter en vez de volver a pedir en el acto
+        'retries': REINTENTOS,
+        'fragment_retries': REINTENTOS,
+        'retry_sleep_functions': dict.fromkeys(TIPOS_REINTENTO, espera_reintento),
+        **perfil.opciones_ydl(),
+        **(opciones or {}),
+    }
+    if ffmpeg:
+        ydl_opts['ffmpeg_location'] = ffmpeg
+    if metricas:
+        ydl_opts['postprocessor_hooks'] = [*ydl_opts.get('postprocessor_hooks', ()), metricas.hook_postproceso]
+    return ydl_opts
+
+@dataclass
+class ResultadoDescarga:
+    carpeta: str
+    descargadas: int
+    diagnostico: Diagnostico = None
+    fallidas: list = field(default_factory=list)   # [{posicion, titulo, error, intentos}] sin descargar
+
+@dataclass
+class AjustesDescarga:
+    """Cómo descarga descargar_playlist; los recursos compartidos son por defecto los del proceso."""
+    hilos: int = DESCARGAS_SIMULTANEAS
+    ffmpeg: str = None
+    cache: object = None                        # CacheMetadatos de yt-dlp
+    progresiva: bool = True                     # empezar con la primera página de la playlist
+    memoria_acotada: bool = False               # de cada pista terminada, solo lo imprescindible
+    deduplicar: bool = True                     # reutilizar lo que ya bajó otra playlist
+    almacen: AlmacenContenidos = None           # None: el de download_dir
+    etiquetar: bool = True
+    caratulas: object = CACHE_CARATULAS         # CacheCaratulas; None: sin carátula
+    normalizar: str = None                      # 'pista' o 'album' (EBU R128)
+    sonoridad: object = CACHE_SONORIDAD         # CacheSonoridad de las medidas
+    fragmentos: object = ADAPTADOR_FRAGMENTOS   # AdaptadorFragmentos; None: uno cada vez
+    cortacircuitos: object = CORTACIRCUITOS     # Cortacircuitos; None: sin pausas por host
+    sesion: object = SESION_HTTP                # SesionHTTP; None: conexiones propias por YoutubeDL
+
+def descargar_playlist(url, download_dir, perfil='MP3', ajustes=None, cookiefile=None, opciones=None,
+                       progress_hooks=(), al_estado=None, progreso=None, control=None, diario=None, metricas=None,
+                       ancho_banda=None, resolucion=None):
+    """Descarga una playlist (o un vídeo) en '{artista} - {playlist}' dentro de download_dir.
+
+    resolucion es un (info_playlist, entradas) ya extraído (ver resolucion.py) y se consume al descargar.
+    """
+    ajustes = ajustes or AjustesDescarga()
+    al_estado = al_estado or (progreso.mensaje if progreso else (lambda texto: None))
+    if progreso:
+        progress_hooks = [*progress_hooks, progreso.hook]
+    if diario:
+        # Antes que el de control: un .part recién abierto queda anotado aunque se cancele ya
+        progress_hooks = [*progress_hooks, diario.hook]
+    if metricas:
+        progress_hooks = [*progress_hooks, metricas.hook]
+    if ancho_banda:
+        # Antes que el de control: si se cancela durante la espera, el de control corta la descarga
+        progress_hooks = [*progress_hooks, ancho_banda.hook]
+    if control:
+        progress_hooks = [*progress_hooks, control.hook]
+        control.comprobar()
+    if isinstance(perfil, str):
+        perfil = perfil_desde_texto(perfil)
+
+    al_estado("Analizando enlace...")
+    inicio = time.monotonic()
+    if metricas:
+        metricas.evento('inicio', url=url, perfil=perfil.clave)
+    obtener = obtener_info_playlist_progresiva if ajustes.progresiva else obtener_info_playlist
+    resuelto = obtener(url, cookiefile, ajustes.cache, diario, metricas, resolucion, ajustes.sesion)
+    nombre_playlist, nombre_artista, info_playlist, entradas = resuelto
+    if isinstance(entradas, list):
+        # La lista sigue viva en quien llamó (p. ej. la resolución del lote) mientras dura la descarga
+        entradas = _soltar(entradas)
+    if control:
+        control.comprobar()
+    nombre_carpeta = sanitize_filename(f"{nombre_artista} - {nombre_playlist}")
+    full_download_dir = os.path.join(download_dir, nombre_carpeta)
+    os.makedirs(full_download_dir, exist_ok=True)
+    al_estado(f"Descargando playlist: {nombre_carpeta}")
+
+    ydl_opts = opciones_descarga(full_download_dir, perfil, cookiefile, progress_hooks, opciones, ajustes.ffmpeg,
+                                 metricas)
+
+    # Sincronización incremental: solo se bajan las pistas que faltan en la carpeta
+    almacen = ajustes.almacen
+    if ajustes.deduplicar and almacen is None:
+        almacen = AlmacenContenidos(os.path.join(download_dir, NOMBRE_ALMACEN))
+    fallidas = ColaFallidas(full_download_dir)
+    etiquetador = Etiquetador(info_playlist, nombre_artista, ajustes.caratulas) if ajustes.etiquetar else None
+    perfiles = perfil.perfiles if isinstance(perfil, PerfilMultiple) else (perfil,)
+    normalizador = None
+    if ajustes.normalizar and any(p.codec for p in perfiles):
+        normalizador = Normalizador(ajustes.normalizar, ajustes.sonoridad, ajustes.ffmpeg, control=control,
+                                    metricas=metricas)
+        # La ganancia del álbum cuenta todas sus pistas, también las que ya estaban en la carpeta
+        entradas = normalizador.recorrer(entradas)
+    if isinstance(perfil, PerfilMultiple):
+        # Una descarga por pista y una orden de ffmpeg que escribe la subcarpeta de cada perfil
+        indice = IndicesPerfiles(full_download_dir, perfil, almacen if ajustes.deduplicar else None,
+                                 normalizador and ajustes.normalizar, info_playlist)
+        pipeline = PipelineSalidas(indice, ffmpeg=ajustes.ffmpeg, control=control, diario=diario, metricas=metricas,
+                                   etiquetador=etiquetador, normalizador=normalizador, progreso=progreso)
+    else:
+        # Una pista ya en la carpeta sin normalizar (o con otro modo) se vuelve a bajar
+        clave = clave_normalizada(perfil.clave, normalizador and ajustes.normalizar, info_playlist)
+        indice = IndiceDescargas(full_download_dir, clave, almacen if ajustes.deduplicar else None)
+        pipeline = perfil.codec and PipelineTranscodificacion(perfil.codec, perfil.calidad, ffmpeg=ajustes.ffmpeg,
+                                                              indice=indice, control=control, diario=diario,
+                                                              metricas=metricas, etiquetador=etiquetador,
+                                                              normalizador=normalizador, progreso=progreso)
+
+    # Cada pista se descarga en su propio hilo; el audio se codifica aparte, en paralelo
+    descargar = functools.partial(descargar_entradas, info_playlist, ydl_opts=ydl_opts, hilos=ajustes.hilos,
+                                  cache=ajustes.cache, indice=indice, progreso=progreso, control=control,
+                                  metricas=metricas, fragmentos=ajustes.fragmentos,
+                                  cortacircuitos=ajustes.cortacircuitos, fallidas=fallidas,
+                                  memoria_acotada=ajustes.memoria_acotada, sesion=ajustes.sesion,
+                                  al_estado=al_estado)
+    if pipeline:
+        with pipeline:
+            retomadas = pipeline.reanudar_pendientes()
+            if retomadas:
+                # Ya están en manos de ffmpeg; se quitan sin mover la numeración de las demás
+                entradas = (None if entrada and entrada.get('id') and clave_info(entrada) in retomadas else entrada
+                            for entrada in entradas)
+            # Lo guardado en el almacén lleva las etiquetas de otra playlist: se copia con las de esta
+            copiar = functools.partial(copiar_reetiquetada, etiquetador=etiquetador, ffmpeg=ajustes.ffmpeg)
+            resultados = descargar(entradas, al_descargar=pipeline.encolar_descarga, copiar=copiar)
+        diagnostico = pipeline.diagnostico
+    else:
+        resultados = descargar(entradas)
+        diagnostico = None
+
+    resultado = ResultadoDescarga(full_download_dir, sum(1 for r in resultados if r), diagnostico,
+                                  fallidas.resumen())
+    if metricas:
+        metricas.evento('fin', carpeta=full_download_dir, descargadas=resultado.descargadas,
+                        fallidas=len(resultado.fallidas),
+                        segundos=round(time.monotonic() - inicio, 3), **metricas.resumen())
+    return resultado
@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+
+# ============ PERFILES DE SALIDA ============
+#
+# Un perfil es el formato final y su calidad: 'MP3' o 'MP3-320' (kbps) y 'MP4' o
+# 'MP4-720' (altura máxima, la escalera 144…1080 de YTMP4CBx). Su clave ('mp3-192',
+# 'mp4-720') es la que se guarda en el índice de cada carpeta.
+#
+# Los perfiles de audio sin pérdida añadida no recodifican si no hace falta: 'AUDIO'
+# guarda el flujo original en su contenedor natural (.opus, .m4a) y 'M4A' y 'OPUS'
+# piden ese códec a YouTube y solo lo transcodifican si el vídeo no lo ofrece (ver
+# politica.py).
+#
+# Varios perfiles unidos con '+' ('MP3+MP4-720') forman un PerfilMultiple: cada pista se
+# baja una vez y ffmpeg escribe todas las salidas en una sola pasada (ver salidas.py).
+
+CALIDAD_MP3 = '192'
+# kbps al transcodificar, cuando el audio original no tiene el códec del perfil
+CALIDADES_AUDIO = {'MP3': CALIDAD_MP3, 'M4A': '192', 'OPUS': '160'}
+# Códec final de cada perfil de audio; 'original' = el que venga, sin recodificar
+CODECS_AUDIO = {'MP3': 'mp3', 'M4A': 'aac', 'OPUS': 'opus', 'AUDIO': 'original'}
+ALTURAS_MP4 = ('144', '240', '360', '480', '720', '1080')
+SEPARADOR_PERFILES = '+'
+
+def selector_mp4(altura=None, separados=False):
+    """Selector de yt-dlp del MP4 de hasta altura px: vídeo MP4 y audio AAC o, si no hay, el mejor ya unido.
+
+    Con separados=True, vídeo y audio se bajan como dos archivos sin unir (ver salidas.py).
+    """
+    filtro = f'[height<={altura}]' if altura else ''
+    if separados:
+        return f'bestvideo{filtro}[ext=mp4]/best{filtro}[ext=mp4]/best,bestaudio[ext=m4a]/bestaudio'
+    return f'bestvideo{filtro}[ext=mp4]+bestaudio[ext=m4a]/best{filtro}[ext=mp4]/best'
+
+@dataclass(frozen=True)
+class Perfil:
+    formato: str
+    calidad: str = None
+
+    @property
+    def clave(self):
+        return f'{self.formato.lower()}-{self.calidad}' if self.calidad else self.formato.lower()
+
+    @property
+    def codec(self):
+        """Códec final del audio, que pasa por la cola de ffmpeg, o None si no hay que tocarlo."""
+        return CODECS_AUDIO.get(self.formato)
+
+    def opciones_ydl(self):
+        if self.formato == 'M4A':
+            return {'format': 'bestaudio[acodec^=mp4a]/bestaudio/best'}
+        if self.formato == 'OPUS':
+            return {'format': 'bestaudio[acodec=opus]/bestaudio/best'}
+        if self.codec:
+            # El audio no se codifica dentro de yt-dlp: la descarga entrega el original a la
+            # cola de transcodificación y sigue con la siguiente pista
+            return {'format': 'bestaudio/best'}
+        # El mismo selector que la salida MP4 de un PerfilMultiple, pero unido por yt-dlp
+        return {'format': selector_mp4(self.calidad), 'merge_output_format': 'mp4'}
+
+@dataclass(frozen=True)
+class PerfilMultiple:
+    perfiles: tuple   # de Perfil, sin repetidos
+
+    @property
+    def clave(self):
+        return SEPARADOR_PERFILES.join(perfil.clave for perfil in self.perfiles)
+
+    def opciones_ydl(self):
+        alturas = [perfil.calidad for perfil in self.perfiles if perfil.formato == 'MP4']
+        if not alturas:
+            return {'format': 'bestaudio/best'}
+        # El vídeo se baja a la mayor altura pedida: las menores salen de él al reescalar.
+        # El audio AAC sirve tal cual para el MP4 y se recodifica para los perfiles de audio.
+        # yt-dlp no los une: la orden de ffmpeg de las salidas los lee como dos entradas
+        altura = None if None in alturas else max(alturas, key=int)
+        return {'format': selector_mp4(altura, separados=True)}
+
+def perfil_desde_texto(texto):
+    """'MP3', 'mp3-320', 'OPUS-128', 'AUDIO', 'MP4' o 'MP4-720' -> Perfil. ValueError si no es válido.
+
+    Varios unidos con '+' ('MP3+MP4-720') -> PerfilMultiple.
+    """
+    if SEPARADOR_PERFILES in texto:
+        perfiles = tuple(dict.fromkeys(perfil_desde_texto(parte) for parte in texto.split(SEPARADOR_PERFILES)))
+        return PerfilMultiple(perfiles) if len(perfiles) > 1 else perfiles[0]
+    formato, _, calidad = texto.strip().upper().partition('-')
+    if formato in CALIDADES_AUDIO:
+        if calidad and not calidad.isdigit():
+            raise ValueError(f'Calidad de {formato} no válida: {texto}')
+        return Perfil(formato, calidad or CALIDADES_AUDIO[formato])
+    if formato == 'AUDIO':
+        if calidad:
+            raise ValueError(f'El perfil AUDIO conserva el original y no admite calidad: {texto}')
+        return Perfil('AUDIO')
+    if formato == 'MP4':
+        if calidad and calidad not in ALTURAS_MP4:
+            raise ValueError(f'Altura de MP4 no válida: {texto} (opciones: {", ".join(ALTURAS_MP4)})')
+        return Perfil('MP4', calidad or None)
+    raise ValueError(f'Perfil desconocido: {texto}')
@@ -0,0 +1,59 @@
+import os
+from dataclasses import dataclass
+
+# ============ POLÍTICA DE TRANSCODIFICACIÓN ============
+#
+# Decide qué hace ffmpeg con cada audio descargado según su códec y el del perfil:
+#   'conservar'       el archivo ya está en el contenedor final: no se lanza ffmpeg
+#   'copiar'          el códec ya es el del perfil, solo cambia el contenedor
+#                     (webm -> .opus): ffmpeg -c:a copy, sin pérdida y casi sin CPU
+#   'transcodificar'  el códec no coincide: se recodifica a la calidad del perfil
+# YouTube sirve Opus (en webm) y AAC (en m4a), así que 'AUDIO', 'OPUS' y 'M4A'
+# casi nunca recodifican y 'MP3' siempre lo hace. Con recodificar=True (para aplicar un
+# filtro, como la normalización de sonoridad) no hay copia posible: el audio se recodifica
+# en su propio códec, salvo que la cola de ffmpeg no sepa codificarlo.
+
+# Códec -> extensión de su contenedor natural
+CONTENEDORES = {
+    'aac': 'm4a',
+    'alac': 'm4a',
+    'flac': 'flac',
+    'mp3': 'mp3',
+    'opus': 'opus',
+    'vorbis': 'ogg',
+}
+# Códecs que la cola de ffmpeg sabe codificar (ver transcodificacion.CODECS)
+CODIFICABLES = ('aac', 'mp3', 'opus')
+
+@dataclass(frozen=True)
+class Decision:
+    accion: str           # 'conservar', 'copiar' o 'transcodificar'
+    extension: str        # extensión del archivo final
+    codec: str = None     # códec de destino, solo al transcodificar
+
+def codec_audio(acodec):
+    """'mp4a.40.2' -> 'aac', 'opus' -> 'opus'; None si no hay audio o no se conoce."""
+    if not acodec or acodec == 'none':
+        return None
+    base = acodec.split('.')[0].lower()
+    return 'aac' if base == 'mp4a' else base
+
+def decidir(codec_destino, acodec, origen, recodificar=False):
+    """Decision para el archivo origen, descargado con el códec acodec de yt-dlp.
+
+    codec_destino es Perfil.codec: 'mp3', 'aac', 'opus' u 'original'.
+    """
+    extension_origen = os.path.splitext(origen)[1].lstrip('.').lower()
+    codec = codec_audio(acodec)
+    if codec_destino == 'original':
+        if codec not in CONTENEDORES:
+            # Sin saber el códec no se puede elegir contenedor: se deja como llegó
+            return Decision('conservar', extension_origen)
+        extension = CONTENEDORES[codec]
+    elif codec == codec_destino:
+        extension = CONTENEDORES[codec]
+    else:
+        return Decision('transcodificar', CONTENEDORES[codec_destino], codec_destino)
+    if recodificar and codec in CODIFICABLES:
+        return Decision('transcodificar', extension, codec)
+    return Decision('conservar' if extension == extension_origen else 'copiar', extension)
@@ -0,0 +1,69 @@
+import importlib
+import threading
+import time
+
+from .cache import extractor_url
+from .sesion import SESION_HTTP
+
+# ============ PRECARGA DE YT-DLP EN SEGUNDO PLANO ============
+#
+# El paquete no importa yt_dlp al cargarse (ver motor.py), pero su primer uso lo paga
+# entero: importar yt_dlp, registrar sus extractores, crear el primer YoutubeDL y, la
+# primera vez que se busca el extractor de una URL, compilar la expresión regular de
+# cada uno de ellos. En total, cerca de un segundo, y más en un ejecutable de PyInstaller
+# --onefile, que primero descomprime sus módulos en una carpeta temporal.
+#
+# Una interfaz gráfica muestra su ventana sin esperar a nada de eso e inicia después
+# una Precarga: el trabajo pasa a un hilo en segundo plano mientras el usuario pega el
+# enlace, y Precarga.lista dice cuándo se puede validar la URL sin bloquear la ventana.
+# Lo que deja hecho (módulos, expresiones compiladas, la sesión HTTP) lo reutilizan los
+# trabajos, así que el primero tampoco lo paga.
+
+# Ningún extractor la reconoce: buscarla recorre y compila todos
+URL_PRECARGA = 'ytmusicdown:precarga'
+
+class Precarga:
+    def __init__(self, sesion=SESION_HTTP):
+        self.sesion = sesion
+        self.error = None
+        self.duraciones = {}   # etapa -> segundos
+        self._lista = threading.Event()
+        self._hilo = None
+
+    @property
+    def lista(self):
+        return self._lista.is_set()
+
+    def iniciar(self):
+        """Lanza la precarga en un hilo daemon (una sola vez) y devuelve la propia Precarga."""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._cargar, name='precarga', daemon=True)
+            self._hilo.start()
+        return self
+
+    def esperar(self, timeout=None):
+        """True cuando la precarga ha terminado; False si antes se agota timeout."""
+        return self._lista.wait(timeout)
+
+    def extractor(self, url):
+        """Nombre del extractor de yt-dlp que reconoce url ('YoutubeTab'), o None. Espera a la precarga."""
+        self.esperar()
+        ie = extractor_url(url)
+        return ie.ie_key() if ie else None
+
+    def _cargar(self):
+        try:
+            self._etapa('importacion', lambda: importlib.import_module('yt_dlp.extractor'))
+            self._etapa('extractores', lambda: extractor_url(URL_PRECARGA))
+            if self.sesion:
+                self._etapa('sesion', self.sesion.preparar)
+        except Exception as e:
+            # Sin yt-dlp utilizable: los trabajos darán el mismo error, con su contexto
+            self.error = e
+        finally:
+            self._lista.set()
+
+    def _etapa(self, nombre, funcion):
+        inicio = time.perf_counter()
+        funcion()
+        self.duraciones[nombre] = time.perf_counter() - inicio
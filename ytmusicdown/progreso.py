@@ -0,0 +1,117 @@
+import queue
+from dataclasses import dataclass
+
+# ============ PROGRESO AGREGADO ============
+#
+# Los hooks de yt-dlp se ejecutan en los hilos de descarga en cada fragmento recibido.
+# En vez de tocar la interfaz desde ahí, cada llamada deja un evento en una cola y el
+# hilo de la GUI la drena a ritmo fijo (root.after), quedándose solo con el último
+# estado de cada pista. El porcentaje de la playlist es la media de sus pistas.
+
+FPS_PROGRESO = 10
+
+@dataclass
+class Pista:
+    titulo: str
+    descargado: float = 0
+    total: float = 0
+    estado: str = 'En cola'
+
+    @property
+    def porcentaje(self):
+        if self.estado in ('Terminada', 'Error'):
+            return 100.0
+        return 100.0 * self.descargado / self.total if self.total else 0.0
+
+class ColaProgreso:
+    def __init__(self):
+        self._cola = queue.SimpleQueue()
+        self.pistas = {}
+        self.total_pistas = 0
+        self.estado = ''
+        self.completado = False
+
+    # --- Productores: cualquier hilo ---
+
+    def hook(self, d):
+        """progress_hook de yt-dlp."""
+        info = d.get('info_dict') or {}
+        clave = info.get('playlist_index')
+        if d['status'] == 'downloading':
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if total:
+                self._cola.put(('pista', clave, info.get('title'), d.get('downloaded_bytes') or 0, total,
+                                'Descargando'))
+            elif d.get('fragment_count'):
+                # Para streams HLS (m3u8) solo se conoce el número de fragmentos
+                self._cola.put(('pista', clave, info.get('title'), d.get('fragment_index') or 0,
+                                d['fragment_count'], 'Descargando'))
+        elif d['status'] == 'finished':
+            self._cola.put(('pista', clave, info.get('title'), 1, 1, 'Finalizando archivo'))
+
+    def iniciar(self, total_pistas):
+        self._cola.put(('iniciar', total_pistas))
+
+    def agregar_pistas(self, n):
+        """Suma pistas al total, p. ej. a medida que se pagina una playlist larga."""
+        self._cola.put(('agregar', n))
+
+    def pista_convirtiendo(self, clave, titulo):
+        """La pista ya está descargada y espera a ffmpeg; la termina quien la convierte."""
+        self._cola.put(('pista', clave, titulo, 1, 1, 'Convirtiendo'))
+
+    def pista_terminada(self, clave, titulo, ok):
+        self._cola.put(('pista', clave, titulo, 1, 1, 'Terminada' if ok else 'Error'))
+
+    def reabrir(self, clave):
+        """Vuelve a poner en marcha una pista terminada con error, p. ej. al reintentarla."""
+        self._cola.put(('reabrir', clave))
+
+    def mensaje(self, texto):
+        self._cola.put(('estado', texto))
+
+    def completar(self, texto):
+        self._cola.put(('completar', texto))
+
+    # --- Consumidor: hilo de la GUI ---
+
+    def drenar(self):
+        """Aplica los eventos pendientes; devuelve True si algo cambió."""
+        cambios = False
+        while True:
+            try:
+                evento = self._cola.get_nowait()
+            except queue.Empty:
+                return cambios
+            cambios = True
+            tipo = evento[0]
+            if tipo == 'iniciar':
+                self.pistas = {}
+                self.total_pistas = evento[1]
+                self.completado = False
+            elif tipo == 'agregar':
+                self.total_pistas += evento[1]
+            elif tipo == 'estado':
+                self.estado = evento[1]
+            elif tipo == 'completar':
+                self.estado = evento[1]
+                self.completado = True
+            elif tipo == 'reabrir':
+                pista = self.pistas.get(evento[1])
+                if pista and pista.estado == 'Error':
+                    pista.descargado, pista.estado = 0, 'Reintentando'
+            else:
+                _, clave, titulo, descargado, total, estado = evento
+                pista = self.pistas.setdefault(clave, Pista(titulo or 'Pista'))
+                if pista.estado in ('Terminada', 'Error'):
+                    continue
+                pista.titulo = titulo or pista.titulo
+                pista.descargado, pista.total, pista.estado = descargado, total, estado
+
+    @property
+    def porcentaje(self):
+        if self.completado:
+            return 100.0
+        if not self.total_pistas:
+            return 0.0
+        return sum(p.porcentaje for p in self.pistas.values()) / self.total_pistas
@@ -0,0 +1,237 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+from .cache import _serializable
+from .indice import clave_info
+
+# ============ REINTENTOS, CORTACIRCUITOS Y PISTAS FALLIDAS ============
+#
+# yt-dlp reintenta cada petición por su cuenta; aquí se decide cuánto espera entre
+# intentos (exponencial con jitter, para no martillear a un servidor que limita) y se
+# vigila lo que cuenta su logger:
+#   - Un 429 o 403 abre el cortacircuitos de ese host: todas las pistas del proceso
+#     que van a él esperan (antes de empezar, entre reintentos y en mitad de la
+#     transferencia) hasta que se cierra. Cada disparo seguido dobla la pausa.
+#   - Un error que deja una pista sin descargar la anota en la ColaFallidas de la
+#     carpeta. Al final de la ejecución se reintentan y las que siguen fallando
+#     aparecen en el resumen en vez de perderse.
+
+REINTENTOS = 10           # por petición; por API yt-dlp no reintenta nada si no se le pide
+ESPERA_BASE = 1.0          # segundos antes del primer reintento
+ESPERA_MAXIMA = 60.0
+PAUSA_INICIAL = 30.0       # segundos que el cortacircuitos queda abierto en el primer disparo
+PAUSA_MAXIMA = 600.0
+REARME = 300.0             # tras este tiempo sin disparos, la pausa vuelve a la inicial
+TROCEO = 0.5               # las esperas se trocean para atender a una cancelación
+
+TIPOS_REINTENTO = ('http', 'fragment', 'extractor')   # claves de retry_sleep_functions de yt-dlp
+NOMBRE_FALLIDAS = '.ytmusicdown-fallidas.json'
+
+LIMITACION = re.compile(r'HTTP Error (429|403)\b')
+
+def espera_reintento(n):
+    """Segundos antes del reintento n (desde 0): exponencial con 'full jitter', hasta ESPERA_MAXIMA."""
+    return random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** n))
+
+def clave_host(entrada):
+    """Host al que va una entrada ('www.youtube.com'); sin URL HTTP, su extractor."""
+    for campo in ('url', 'webpage_url', 'original_url'):
+        host = urlparse(entrada.get(campo) or '').hostname
+        if host:
+            return host
+    return entrada.get('ie_key') or entrada.get('extractor_key') or 'desconocido'
+
+def lineas_fallidas(fallidas, maximo=None):
+    """Líneas '03 - Título: error' para mostrar ResultadoDescarga.fallidas (como mucho maximo)."""
+    lineas = [f"{p['posicion'] or 0:02d} - {p['titulo'] or 'Pista'}: {p['error']}" for p in fallidas[:maximo]]
+    if maximo is not None and len(fallidas) > maximo:
+        lineas.append(f'... y {len(fallidas) - maximo} más')
+    return lineas
+
+def _esperar_hasta(hasta, control):
+    while time.monotonic() < hasta:
+        if control and control.cancelado:
+            return
+        time.sleep(min(TROCEO, hasta - time.monotonic()))
+
+class Cortacircuitos:
+    def __init__(self, pausa_inicial=PAUSA_INICIAL, pausa_maxima=PAUSA_MAXIMA):
+        self.pausa_inicial = pausa_inicial
+        self.pausa_maxima = pausa_maxima
+        self._lock = threading.Lock()
+        self._hosts = {}   # host -> (abierto hasta, última pausa, último disparo)
+
+    def disparar(self, host):
+        """Abre el circuito del host y devuelve la pausa; si ya estaba abierto no lo alarga y devuelve None."""
+        ahora = time.monotonic()
+        with self._lock:
+            hasta, pausa, disparo = self._hosts.get(host, (0.0, 0.0, 0.0))
+            if ahora < hasta:
+                return None
+            pausa = min(self.pausa_maxima, pausa * 2) if ahora - disparo < REARME and pausa else self.pausa_inicial
+            self._hosts[host] = (ahora + pausa, pausa, ahora)
+        return pausa
+
+    def restante(self, host):
+        """Segundos que le quedan abierto al circuito del host (0 si está cerrado)."""
+        with self._lock:
+            hasta = self._hosts.get(host, (0.0,))[0]
+        return max(0.0, hasta - time.monotonic())
+
+    def esperar(self, host, control=None):
+        """Bloquea mientras el circuito del host esté abierto (o hasta que se cancele)."""
+        with self._lock:
+            hasta = self._hosts.get(host, (0.0,))[0]
+        _esperar_hasta(hasta, control)
+
+    def opciones_pista(self, ydl_opts, host, control=None):
+        """Copia de ydl_opts cuyos reintentos y transferencias respetan el circuito del host."""
+        def dormir(espera):
+            def dormir_tipo(n):
+                # yt-dlp duerme sin interrupción lo que devuelve esta función: la espera (la del
+                # circuito y la del reintento) se hace aquí, a trozos, y a yt-dlp se le devuelve 0
+                self.esperar(host, control)
+                _esperar_hasta(time.monotonic() + espera(n), control)
+                return 0
+            return dormir_tipo
+
+        funciones = ydl_opts.get('retry_sleep_functions') or {}
+        def hook(d):
+            if d['status'] == 'downloading':
+                self.esperar(host, control)
+
+        return {
+            **ydl_opts,
+            'retry_sleep_functions': {**funciones, **{tipo: dormir(funciones.get(tipo, espera_reintento))
+                                                      for tipo in TIPOS_REINTENTO}},
+            'progress_hooks': [*ydl_opts.get('progress_hooks', ()), hook],
+        }
+
+    def observador(self, host, al_estado=None):
+        """Observador de LoggerPista que dispara el circuito ante un 429 o 403 y lo cuenta con al_estado(texto)."""
+        def observar(nivel, mensaje):
+            # Los reintentos de las descargas llegan como debug ('[download] Got error: ...')
+            if LIMITACION.search(mensaje):
+                pausa = self.disparar(host)
+                if pausa and al_estado:
+                    al_estado(f'{host} limita las peticiones; pausa de {pausa:.0f} s para todas sus descargas')
+        return observar
+
+# Compartido por todos los trabajos del proceso: un host que limita frena a todos
+CORTACIRCUITOS = Cortacircuitos()
+
+class LoggerPista:
+    """Logger de yt-dlp para una pista, con observadores(nivel, mensaje) de todo lo que escribe.
+
+    Con un logger, yt-dlp deja de filtrar la salida por quiet/verbose/no_warnings; aquí se
+    repite ese filtro para que la consola muestre lo mismo que sin él. Si las opciones ya
+    traían un logger, se le pasa todo a él.
+    """
+
+    def __init__(self, ydl_opts, observadores=()):
+        self.observadores = list(observadores)
+        self.anterior = ydl_opts.get('logger')
+        self.quiet = ydl_opts.get('quiet')
+        self.verbose = ydl_opts.get('verbose')
+        self.no_warnings = ydl_opts.get('no_warnings')
+        self.ultimo_error = None
+
+    def _observar(self, nivel, mensaje):
+        for observador in self.observadores:
+            observador(nivel, mensaje)
+
+    def debug(self, mensaje):
+        self._observar('debug', mensaje)
+        if self.anterior:
+            self.anterior.debug(mensaje)
+        elif mensaje.startswith('[debug] '):
+            if self.verbose:
+                print(mensaje, file=sys.stderr)
+        elif self.verbose or not self.quiet:
+            print(mensaje)
+
+    def info(self, mensaje):
+        self.debug(mensaje)   # yt-dlp no lo usa; se trata como debug
+
+    def warning(self, mensaje):
+        self._observar('warning', mensaje)
+        if self.anterior:
+            self.anterior.warning(mensaje)
+        elif not self.no_warnings:
+            print(f'WARNING: {mensaje}', file=sys.stderr)
+
+    def error(self, mensaje):
+        self.ultimo_error = re.sub(r'^ERROR:\s*', '', mensaje)
+        self._observar('error', mensaje)
+        if self.anterior:
+            self.anterior.error(mensaje)
+        else:
+            print(mensaje, file=sys.stderr)
+
+class ColaFallidas:
+    """Pistas de una carpeta que no se pudieron descargar, guardadas junto a su índice."""
+
+    def __init__(self, carpeta):
+        self.ruta = os.path.join(carpeta, NOMBRE_FALLIDAS)
+        self._lock = threading.Lock()
+        self._pistas = {}
+        self._nuevas = set()
+        if os.path.exists(self.ruta):
+            with open(self.ruta, encoding='utf-8') as f:
+                self._pistas = json.load(f)
+
+    @staticmethod
+    def _clave(entrada):
+        return clave_info(entrada) if entrada.get('id') else entrada.get('url')
+
+    def anotar(self, entrada, posicion, error):
+        """Añade (o vuelve a contar) una pista fallida en esta ejecución."""
+        clave = self._clave(entrada)
+        with self._lock:
+            anterior = self._pistas.get(clave, {})
+            self._pistas[clave] = {
+                'posicion': posicion,
+                'titulo': entrada.get('title'),
+                'error': error or 'error desconocido',
+                'intentos': anterior.get('intentos', 0) + 1,
+                'fecha': int(time.time()),
+                'entrada': _serializable(entrada),
+            }
+            self._nuevas.add(clave)
+            self._guardar()
+
+    def quitar(self, entrada):
+        clave = self._clave(entrada)
+        with self._lock:
+            self._nuevas.discard(clave)
+            if self._pistas.pop(clave, None) is not None:
+                self._guardar()
+
+    def de_esta_ejecucion(self):
+        """[(posicion, entrada)] de lo que falló en esta ejecución, en orden de playlist."""
+        with self._lock:
+            pistas = [self._pistas[clave] for clave in self._nuevas]
+        return sorted(((p['posicion'], p['entrada']) for p in pistas), key=lambda par: par[0] or 0)
+
+    def resumen(self):
+        """[{posicion, titulo, error, intentos}] de lo que sigue fallido en esta ejecución, por posición."""
+        with self._lock:
+            pistas = [{k: v for k, v in self._pistas[clave].items() if k != 'entrada'} for clave in self._nuevas]
+        return sorted(pistas, key=lambda p: p['posicion'] or 0)
+
+    def _guardar(self):
+        # Con el lock tomado. Sin fallidas, el archivo sobra
+        if not self._pistas:
+            if os.path.exists(self.ruta):
+                os.remove(self.ruta)
+            return
+        temporal = self.ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self._pistas, f, ensure_ascii=False, indent=1)
+        os.replace(temporal, self.ruta)
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import clave_url
+from .motor import expandir_playlist, expandir_playlist_progresiva, opciones_expansion
+from .sesion import SESION_HTTP, youtube_dl
+
+# ============ RESOLUCIÓN CONCURRENTE DE UN LOTE ============
+#
+# Un lote trae cientos de enlaces y extraer cada uno es una llamada bloqueante de yt-dlp
+# en la que casi todo es esperar a la red. resolver_lote las lanza a la vez desde un
+# bucle de asyncio: cada extracción corre en un hilo de un ThreadPoolExecutor y un
+# semáforo limita cuántas hay en vuelo. Una URL repetida en el lote (p. ej. con dos
+# perfiles) se extrae una sola vez, y cada resultado se entrega en cuanto termina, de
+# modo que las descargas de los primeros enlaces empiezan sin esperar al más lento.
+#
+# Solo se hace la extracción plana que haría después descargar_playlist; el resultado
+# se le pasa como resolucion para que no la repita. Con progresiva=True es la de
+# expandir_playlist_progresiva: se pide solo la primera página y el trabajo sigue
+# paginando al descargar, así que en una playlist enorme la primera pista tampoco espera
+# a las demás. Cada resolución progresiva lleva su propio YoutubeDL, que es el que pide
+# las páginas siguientes. Con progresiva=False (o si la caché ya tiene la playlist) se
+# pagina entera con expandir_playlist: crear un YoutubeDL registra todos sus extractores
+# (~0,1 s de CPU, con el GIL tomado), así que cada hilo del pool crea uno y lo reutiliza
+# para todas sus URL. Con la SesionHTTP, esos YoutubeDL comparten cookies y conexiones
+# con las descargas.
+
+RESOLUCIONES_SIMULTANEAS = 16
+
+async def resolver_lote(urls, cookiefile=None, cache=None, simultaneas=RESOLUCIONES_SIMULTANEAS, sesion=SESION_HTTP,
+                        progresiva=True):
+    """Generador asíncrono de (url, resolucion, error), una vez por URL distinta y en el orden en que terminan.
+
+    resolucion es el (info_playlist, entradas) de expandir_playlist_progresiva (entradas se
+    pagina al consumirse, una sola vez) o, con progresiva=False, el de expandir_playlist.
+    Es None si la extracción falló; en ese caso error lleva el mensaje.
+    """
+    distintas = list(dict.fromkeys(urls))
+    if not distintas:
+        return
+    bucle = asyncio.get_running_loop()
+    semaforo = asyncio.Semaphore(simultaneas)
+    pool = ThreadPoolExecutor(min(simultaneas, len(distintas)), thread_name_prefix='resolucion')
+    locales = threading.local()
+    creados = []
+
+    def extraer(url):
+        if progresiva and not (cache and cache.obtener(clave_url(url))):
+            return expandir_playlist_progresiva(url, cookiefile, sesion)
+        if not hasattr(locales, 'ydl'):
+            locales.ydl = youtube_dl(opciones_expansion(cookiefile), sesion)
+            creados.append(locales.ydl)
+        return expandir_playlist(url, cookiefile, cache, locales.ydl)
+
+    async def resolver(url):
+        async with semaforo:
+            try:
+                resolucion = await bucle.run_in_executor(pool, extraer, url)
+            except Exception as e:
+                return url, None, str(e)
+        return url, resolucion, None
+
+    tareas = [asyncio.ensure_future(resolver(url)) for url in distintas]
+    try:
+        for siguiente in asyncio.as_completed(tareas):
+            yield await siguiente
+    finally:
+        # Si el consumidor se detiene, las extracciones que no han empezado ya no se lanzan;
+        # las que están en marcha terminan antes de cerrar los YoutubeDL que usan
+        for tarea in tareas:
+            tarea.cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
+        for ydl in creados:
+            ydl.close()
+
+def resolver_y_entregar(urls, al_resolver, cookiefile=None, cache=None, simultaneas=RESOLUCIONES_SIMULTANEAS,
+                        sesion=SESION_HTTP, progresiva=True):
+    """Resuelve urls con resolver_lote y llama a al_resolver(url, resolucion, error) con cada una.
+
+    Bloquea hasta que se han entregado todas; al_resolver corre en el hilo que llama.
+    """
+    async def entregar():
+        async for url, resolucion, error in resolver_lote(urls, cookiefile, cache, simultaneas, sesion, progresiva):
+            al_resolver(url, resolucion, error)
+
+    asyncio.run(entregar())
@@ -0,0 +1,164 @@
+import os
+from dataclasses import dataclass
+
+from .etiquetas import EXTENSIONES_CON_CARATULA, argumentos_caratula, argumentos_etiquetas
+from .indice import IndiceDescargas
+from .metricas import medir
+from .politica import decidir
+from .sonoridad import clave_normalizada
+from .transcodificacion import CALIDADES_RECODIFICACION, CODECS, PipelineTranscodificacion, temporal_ffmpeg
+
+# ============ VARIAS SALIDAS DE UNA SOLA DESCARGA ============
+#
+# Con un PerfilMultiple ('MP3+MP4-720') cada pista se baja una sola vez: el vídeo a la
+# mayor altura pedida y su audio AAC, en dos archivos que yt-dlp no une (unirlos sería
+# otra pasada de ffmpeg). Después, una única orden de ffmpeg por pista los lee como dos
+# entradas y escribe todas las salidas a la vez:
+#   - los perfiles de audio recodifican (o copian) solo el flujo de audio;
+#   - el MP4 a la altura descargada copia los dos flujos, sin recodificar;
+#   - un MP4 más bajo reescala el vídeo con libx264 y copia el audio.
+# Cada perfil va a su subcarpeta ('mp3-192', 'mp4-720') con su propio índice, así que
+# cada salida se sincroniza y se deduplica igual que si se hubiera descargado sola. Las
+# etiquetas y la carátula de un Etiquetador van en esa misma orden, y el filtro de un
+# Normalizador, en la de cada salida de audio: la pista se mide una vez para todas.
+
+PRESET_VIDEO = 'veryfast'
+CRF_VIDEO = '23'
+CALIDAD_AAC = '192'    # kbps del audio del MP4 si el original no es AAC
+
+@dataclass(frozen=True)
+class Salida:
+    destino: str
+    argumentos: tuple     # opciones de ffmpeg de esta salida: flujos y códecs
+    accion: str           # 'copiar' o 'transcodificar'
+
+def _salida_audio(perfil, acodec, origen, base, normalizar=False, audio=(), entrada=0):
+    decision = decidir(perfil.codec, acodec, origen, recodificar=normalizar)
+    destino = os.path.join(perfil.clave, f'{base}.{decision.extension}')
+    if decision.accion == 'transcodificar':
+        codificador, _ = CODECS[decision.codec]
+        calidad = perfil.calidad or CALIDADES_RECODIFICACION[decision.codec]
+        return Salida(destino, ('-map', f'{entrada}:a:0', *audio, '-c:a', codificador, '-b:a', f'{calidad}k'),
+                      'transcodificar')
+    # Aunque el contenedor coincida, la salida va a otra carpeta: se copia el flujo igualmente
+    return Salida(destino, ('-map', f'{entrada}:a:0', '-c:a', 'copy'), 'copiar')
+
+def _salida_video(perfil, info, origen, base, entrada=0):
+    altura = info.get('height')
+    argumentos = ['-map', '0:v:0?', '-map', f'{entrada}:a:0?']
+    if perfil.calidad and altura and altura > int(perfil.calidad):
+        argumentos += ['-vf', f'scale=-2:{perfil.calidad}', '-c:v', 'libx264', '-preset', PRESET_VIDEO,
+                       '-crf', CRF_VIDEO]
+        accion = 'transcodificar'
+    else:
+        argumentos += ['-c:v', 'copy']
+        accion = 'copiar'
+    if decidir('aac', info.get('acodec'), origen).accion == 'transcodificar':
+        argumentos += ['-c:a', 'aac', '-b:a', f'{CALIDAD_AAC}k']
+        accion = 'transcodificar'
+    else:
+        argumentos += ['-c:a', 'copy']
+    return Salida(os.path.join(perfil.clave, f'{base}.mp4'), (*argumentos, '-movflags', '+faststart'), accion)
+
+def planificar_salidas(perfiles, origen, info, carpeta, normalizar=False, audio=()):
+    """[Salida] de cada perfil para el archivo origen, con los destinos dentro de carpeta.
+
+    Con normalizar=True, las salidas de audio se recodifican siempre, con las opciones audio.
+    Si info trae 'audio_aparte', el audio se toma de ese archivo, la segunda entrada de ffmpeg.
+    """
+    info = info or {}
+    base = os.path.splitext(os.path.basename(origen))[0]
+    aparte = info.get('audio_aparte')
+    entrada = 1 if aparte else 0
+    salidas = []
+    for perfil in perfiles:
+        if perfil.codec:
+            salida = _salida_audio(perfil, info.get('acodec'), aparte or origen, base, normalizar, audio, entrada)
+        else:
+            salida = _salida_video(perfil, info, aparte or origen, base, entrada)
+        salidas.append(Salida(os.path.join(carpeta, salida.destino), salida.argumentos, salida.accion))
+    return salidas
+
+def comando_ffmpeg_salidas(origen, salidas, ffmpeg='ffmpeg', etiquetas=None, caratula=None, audio_aparte=None):
+    """Una sola orden de ffmpeg que lee origen (y audio_aparte) una vez y escribe cada salida en su temporal."""
+    orden = [ffmpeg, '-y', '-loglevel', 'error', '-i', origen]
+    if audio_aparte:
+        orden += ['-i', audio_aparte]
+    if caratula:
+        orden += ['-i', caratula]
+    entrada_caratula = 2 if audio_aparte else 1
+    for salida in salidas:
+        extension = os.path.splitext(salida.destino)[1].lstrip('.')
+        orden += salida.argumentos
+        if caratula and extension in EXTENSIONES_CON_CARATULA:
+            orden += argumentos_caratula(entrada_caratula, caratula)
+        orden += [*argumentos_etiquetas(etiquetas or {}, extension), temporal_ffmpeg(salida.destino)]
+    return orden
+
+class IndicesPerfiles:
+    """Un IndiceDescargas por perfil, cada uno en su subcarpeta de la playlist."""
+
+    def __init__(self, carpeta, perfil_multiple, almacen=None, normalizar=None, info_playlist=None):
+        self.carpeta = carpeta
+        self.perfiles = perfil_multiple.perfiles
+        self.indices = []
+        for perfil in self.perfiles:
+            subcarpeta = os.path.join(carpeta, perfil.clave)
+            os.makedirs(subcarpeta, exist_ok=True)
+            # Solo las salidas de audio se normalizan: la del MP4 sigue valiendo con o sin normalizar
+            clave = clave_normalizada(perfil.clave, normalizar, info_playlist) if perfil.codec else perfil.clave
+            self.indices.append(IndiceDescargas(subcarpeta, clave, almacen))
+        # Las pistas no se enlazan del almacén en bloque: basta que falte una salida para bajarla
+        self.almacen = None
+
+    def pendiente(self, entrada):
+        return any(indice.pendiente(entrada) for indice in self.indices)
+
+    def registrar(self, info, archivos):
+        """archivos: la salida de cada perfil, en el orden de los perfiles."""
+        for indice, archivo in zip(self.indices, archivos):
+            indice.registrar(info, archivo)
+
+class PipelineSalidas(PipelineTranscodificacion):
+    """PipelineTranscodificacion que escribe las salidas de todos los perfiles de un IndicesPerfiles."""
+
+    def __init__(self, indice, procesos=None, capacidad=None, ffmpeg='ffmpeg', control=None, diario=None,
+                 metricas=None, etiquetador=None, normalizador=None, progreso=None):
+        super().__init__(None, None, procesos, capacidad, ffmpeg, indice, control, diario, metricas, etiquetador,
+                         normalizador, progreso)
+
+    def _planificar(self, origen, info, audio=()):
+        return planificar_salidas(self.indice.perfiles, origen, info, self.indice.carpeta,
+                                  self.normalizador is not None, audio)
+
+    def _finales(self, origen, info):
+        return [(salida.destino, temporal_ffmpeg(salida.destino)) for salida in self._planificar(origen, info)]
+
+    def _fuente_audio(self, origen, info):
+        return (info or {}).get('audio_aparte') or origen
+
+    def _registrar(self, info, destinos):
+        self.indice.registrar(info, destinos)
+
+    def _procesar(self, origen, info):
+        pista = info.get('playlist_index') if info else None
+        aparte = (info or {}).get('audio_aparte')
+        audio = self.normalizador.argumentos(self._fuente_audio(origen, info), info) if self.normalizador else ()
+        salidas = self._planificar(origen, info, audio)
+        accion = 'transcodificar' if any(s.accion == 'transcodificar' for s in salidas) else 'copiar'
+        with medir(self.metricas, 'transcodificacion', pista, accion=accion, salidas=len(salidas)):
+            etiquetas = self.etiquetador.etiquetas(info) if self.etiquetador else None
+            caratula = self.etiquetador.caratula(info) if self.etiquetador else None
+            temporales = [temporal_ffmpeg(salida.destino) for salida in salidas]
+            orden = comando_ffmpeg_salidas(origen, salidas, self.ffmpeg, etiquetas, caratula, aparte)
+            if not self._ejecutar(orden, temporales):
+                return None
+        with medir(self.metricas, 'escritura', pista):
+            for salida, temporal in zip(salidas, temporales):
+                os.replace(temporal, salida.destino)
+            os.remove(origen)
+            if aparte:
+                os.remove(aparte)
+            if info:
+                self._registrar(info, [salida.destino for salida in salidas])
+        return accion
@@ -0,0 +1,224 @@
+import functools
+import inspect
+import threading
+from urllib.parse import urlparse
+
+# ============ SESIÓN HTTP COMPARTIDA ============
+#
+# Cada pista usa su propio YoutubeDL y, sin más, cada uno vuelve a cargar cookies.txt y
+# crea sus propios manejadores de peticiones: cada pista abre conexiones nuevas (con su
+# handshake TLS) a los mismos servidores de la CDN. SesionHTTP guarda, por combinación
+# de opciones de red, un tarro de cookies y un RequestDirector de yt-dlp, y los YoutubeDL
+# que crea con youtube_dl() los comparten: la extracción de metadatos, las pistas y los
+# trabajos del proceso reutilizan las mismas conexiones keep-alive.
+#
+# El pool de conexiones es el del manejador 'requests' de yt-dlp (urllib3), que se usa
+# si el módulo requests está instalado; con urllib, cada petición abre su conexión y
+# compartir la sesión solo ahorra la carga de las cookies. SesionHTTP.estadisticas
+# cuenta, por host, las peticiones enviadas y las conexiones abiertas para ellas.
+#
+# yt-dlp no ofrece una forma pública de compartir su tarro y su director entre varios
+# YoutubeDL: la sesión sustituye sus propiedades cookiejar y _request_director, y para
+# contar conexiones pide la sesión de 'requests' con el _get_instance privado de su
+# manejador. Antes de hacerlo, compartible() comprueba que todo sigue ahí; con una
+# versión de yt-dlp que lo cambie, youtube_dl() da YoutubeDL independientes, como sin
+# sesión, y tests/test_sesion.py falla para avisar de que hay que adaptarla.
+
+# Opciones de yt-dlp con las que se construyen los manejadores y el tarro de cookies;
+# dos YoutubeDL comparten sesión si coinciden en todas
+OPCIONES_RED = (
+    'cookiefile', 'cookiesfrombrowser', 'proxy', 'source_address', 'socket_timeout', 'nocheckcertificate',
+    'legacyserverconnect', 'impersonate', 'http_headers', 'compat_opts', 'enable_file_urls',
+    'client_certificate', 'client_certificate_key', 'client_certificate_password', 'debug_printtraffic',
+)
+
+class _Conjunto:
+    """Tarro de cookies y RequestDirector de una combinación de OPCIONES_RED."""
+
+    def __init__(self, opciones, estadisticas):
+        import yt_dlp
+
+        # Un YoutubeDL propio, silencioso, construye las piezas compartidas y es su dueño
+        self.base = yt_dlp.YoutubeDL({**opciones, 'quiet': True, 'no_warnings': True})
+        self.tarro = self.base.cookiejar
+        self.director = self.base._request_director
+        self.estadisticas = estadisticas
+        self._lock_cookies = threading.Lock()
+        self._pools()   # crea ya la sesión de 'requests': si la crearan dos hilos a la vez habría dos pools
+        enviar = self.director.send
+
+        def send(request):
+            try:
+                return enviar(request)
+            finally:
+                estadisticas.anotar(request.url, self._pools())
+        self.director.send = send
+
+    def _pools(self):
+        # Pools de urllib3 del manejador 'requests' (uno por host); sin él, no hay pools que mirar
+        manejador = getattr(self.director, 'handlers', {}).get('Requests')
+        if manejador is None or not hasattr(manejador, '_get_instance'):
+            return ()
+        session = manejador._get_instance(cookiejar=self.tarro, legacy_ssl_support=None)
+        pools = []
+        for adaptador in set(session.adapters.values()):
+            gestor = adaptador.poolmanager
+            for clave in list(gestor.pools.keys()):
+                pool = gestor.pools.get(clave)
+                if pool is not None:
+                    pools.append(pool)
+        return pools
+
+    def guardar_cookies(self):
+        # Todas las pistas cierran su YoutubeDL a la vez: el archivo se escribe de uno en uno
+        with self._lock_cookies:
+            self.tarro.save()
+
+class EstadisticasSesion:
+    """Peticiones y conexiones nuevas por host, acumuladas desde que se creó la sesión."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._peticiones = {}
+        self._pools = {}      # id(pool) -> (pool, host, conexiones abiertas)
+        self.con_pool = False
+
+    def anotar(self, url, pools):
+        host = urlparse(url).hostname or url
+        with self._lock:
+            self._peticiones[host] = self._peticiones.get(host, 0) + 1
+            for pool in pools:
+                # Se guarda el pool: si urllib3 lo descarta, sus conexiones siguen contando
+                self._pools[id(pool)] = (pool, pool.host, pool.num_connections)
+                self.con_pool = True
+
+    def por_host(self):
+        """{host: (peticiones, conexiones)}. Sin pool de conexiones, cada petición abre una."""
+        with self._lock:
+            conexiones = {}
+            for _, host, abiertas in self._pools.values():
+                conexiones[host] = conexiones.get(host, 0) + abiertas
+            return {host: (peticiones, conexiones.get(host, 0) if self.con_pool else peticiones)
+                    for host, peticiones in self._peticiones.items()}
+
+    def resumen(self):
+        """(peticiones, conexiones, reutilizadas): reutilizadas son los handshakes ahorrados."""
+        datos = self.por_host().values()
+        peticiones = sum(p for p, _ in datos)
+        conexiones = min(peticiones, sum(c for _, c in datos))
+        return peticiones, conexiones, peticiones - conexiones
+
+class SesionHTTP:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conjuntos = {}
+        self.estadisticas = EstadisticasSesion()
+
+    def _conjunto(self, ydl_opts):
+        opciones = {clave: ydl_opts[clave] for clave in OPCIONES_RED if ydl_opts.get(clave) is not None}
+        clave = repr(sorted(opciones.items()))
+        with self._lock:
+            conjunto = self._conjuntos.get(clave)
+            if conjunto is None:
+                conjunto = self._conjuntos[clave] = _Conjunto(opciones, self.estadisticas)
+            return conjunto
+
+    def preparar(self, ydl_opts=None):
+        """Crea ya el tarro y el director de ydl_opts, para que no los pague el primer trabajo."""
+        if compartible():
+            self._conjunto(ydl_opts or {})
+
+    def youtube_dl(self, ydl_opts):
+        """YoutubeDL(ydl_opts) que usa las cookies y las conexiones de la sesión."""
+        if not compartible():
+            import yt_dlp
+
+            return yt_dlp.YoutubeDL(ydl_opts)
+        return _clase_youtube_dl()(ydl_opts, self._conjunto(ydl_opts))
+
+    def cerrar(self):
+        """Guarda las cookies y cierra las conexiones abiertas; la sesión puede volver a usarse."""
+        with self._lock:
+            conjuntos, self._conjuntos = list(self._conjuntos.values()), {}
+        for conjunto in conjuntos:
+            conjunto.base.close()
+
+def linea_estadisticas(sesion):
+    """'120 peticiones HTTP en 9 conexiones (111 reutilizadas)', o None si no hubo peticiones."""
+    peticiones, conexiones, reutilizadas = sesion.estadisticas.resumen()
+    if not peticiones:
+        return None
+    return f'{peticiones} peticiones HTTP en {conexiones} conexiones ({reutilizadas} reutilizadas)'
+
+def youtube_dl(ydl_opts, sesion=None):
+    """YoutubeDL de la sesión o, sin sesión, uno independiente como los de siempre."""
+    if sesion is None:
+        import yt_dlp
+
+        return yt_dlp.YoutubeDL(ydl_opts)
+    return sesion.youtube_dl(ydl_opts)
+
+@functools.cache
+def compartible():
+    """True si el yt-dlp instalado tiene las piezas internas que SesionHTTP sustituye."""
+    import yt_dlp
+    from yt_dlp.networking import RequestDirector
+
+    atributos = vars(yt_dlp.YoutubeDL)
+    return (all(isinstance(atributos.get(nombre), (property, functools.cached_property))
+                for nombre in ('cookiejar', '_request_director'))
+            and callable(getattr(RequestDirector, 'send', None))
+            and _instancias_requests())
+
+def _instancias_requests():
+    # _Conjunto._pools llama a _get_instance(cookiejar=..., legacy_ssl_support=None) del manejador
+    # 'requests', que pasa esos argumentos a _create_instance. Sin requests instalado no hay pools
+    from yt_dlp.networking import common
+
+    manejadores = getattr(common, '_REQUEST_HANDLERS', None)
+    if not isinstance(manejadores, dict):
+        return False
+    manejador = manejadores.get('Requests')
+    if manejador is None:
+        return True
+    crear = getattr(manejador, '_create_instance', None)
+    if not callable(getattr(manejador, '_get_instance', None)) or not callable(crear):
+        return False
+    try:
+        inspect.signature(crear).bind(None, cookiejar=None, legacy_ssl_support=None)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+_CLASE = None
+
+def _clase_youtube_dl():
+    # La subclase se crea al primer uso para no importar yt_dlp al cargar el módulo
+    global _CLASE
+    if _CLASE is None:
+        import yt_dlp
+
+        class YoutubeDLCompartido(yt_dlp.YoutubeDL):
+            def __init__(self, params, conjunto):
+                # Antes del __init__ de yt-dlp, que ya lee las cookies
+                self._conjunto = conjunto
+                super().__init__(params)
+
+            @property
+            def cookiejar(self):
+                return self._conjunto.tarro
+
+            @property
+            def _request_director(self):
+                # Como no queda en __dict__, close() no cierra las conexiones compartidas
+                return self._conjunto.director
+
+            def save_cookies(self):
+                if self.params.get('cookiefile') is not None:
+                    self._conjunto.guardar_cookies()
+
+        _CLASE = YoutubeDLCompartido
+    return _CLASE
+
+# Compartida por todos los trabajos del proceso
+SESION_HTTP = SesionHTTP()
@@ -0,0 +1,289 @@
+import contextlib
+import json
+import math
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from .indice import clave_info
+from .metricas import medir
+from .transcodificacion import CREATIONFLAGS
+
+# ============ NORMALIZACIÓN DE SONORIDAD (EBU R128) ============
+#
+# Con normalizar='pista' o 'album', el volumen de cada pista se ajusta en la misma orden
+# de ffmpeg que la transcodifica, sin una pasada aparte sobre los archivos ya escritos.
+# Antes hay que medirla: el filtro loudnorm de ffmpeg analiza el audio descargado (EBU
+# R128: sonoridad integrada, pico real, rango) y esa medida se aplica después en modo
+# lineal, que es una ganancia fija y no comprime la dinámica.
+#
+# Las medidas se hacen en un grupo de procesos ffmpeg aparte, que empieza con cada pista
+# en cuanto se descarga, así que el análisis avanza mientras llegan las siguientes. Dentro
+# de una PipelineTranscodificacion, ese grupo comparte sus turnos: medir y transcodificar
+# no lanzan entre los dos más procesos ffmpeg que núcleos. Las medidas se guardan en
+# CacheSonoridad por ID de vídeo: una resincronización, otro perfil o las salidas de un
+# PerfilMultiple reutilizan la medida sin volver a analizar el audio.
+#
+# En modo 'album' todas las pistas de la playlist reciben la misma ganancia, la que
+# lleva al objetivo la sonoridad del álbum entero, calculada con las medidas guardadas
+# de sus pistas (también las de sincronizaciones anteriores). Como hay que conocerlas
+# todas, las pistas esperan descargadas hasta que termina la última y solo entonces
+# pasan a ffmpeg. Para no llenar el disco, si esperan más de RETENIDOS_MAXIMOS (ver
+# transcodificacion.py) la ganancia se fija con las medidas que haya en ese momento y
+# las demás pistas ya no esperan. Las pistas ya escritas no se reescriben al cambiar la
+# ganancia.
+#
+# Ajustar el volumen obliga a recodificar: con normalización, un audio que se copiaría
+# tal cual (Opus para 'OPUS', AAC para 'M4A') se recodifica en su mismo códec. Solo se
+# normalizan las salidas de audio; el MP4 conserva el audio original.
+#
+# Una salida normalizada no vale por la misma sin normalizar: clave_normalizada añade el
+# modo a la clave del perfil en el índice de la carpeta y en el almacén. En modo 'album'
+# lleva además la playlist, porque la ganancia es la de ese álbum y no la de otro.
+
+RUTA_SONORIDAD = os.path.join(os.path.expanduser('~'), '.ytmusicdown', 'sonoridad.sqlite3')
+MODOS_NORMALIZACION = ('pista', 'album')
+OBJETIVO_LUFS = -16.0
+PICO_MAXIMO = -1.5       # dBTP
+RANGO_MAXIMO = 11.0      # LU; loudnorm solo lo usa si tiene que pasar a modo dinámico
+FRECUENCIA_MUESTREO = 48000   # loudnorm remuestrea a 192 kHz: la salida vuelve a esta si el info no trae asr
+
+def clave_normalizada(clave, normalizar=None, info_playlist=None):
+    """Clave de perfil del índice y del almacén para salidas normalizadas ('mp3-192+pista')."""
+    if not normalizar:
+        return clave
+    if normalizar == 'album' and info_playlist and info_playlist.get('id'):
+        # Los ID de playlist no llevan separadores de ruta: la clave es también una carpeta del almacén
+        return f"{clave}+album-{info_playlist['id']}"
+    return f'{clave}+{normalizar}'
+
+@dataclass(frozen=True)
+class Medida:
+    lufs: float           # sonoridad integrada
+    pico: float           # pico real, en dBTP
+    rango: float          # LRA, en LU
+    umbral: float         # umbral de la puerta relativa
+    duracion: float = None
+
+    @property
+    def silencio(self):
+        return math.isinf(self.lufs)
+
+def comando_analisis(origen, ffmpeg='ffmpeg', objetivo=OBJETIVO_LUFS):
+    """Orden de ffmpeg que mide origen con loudnorm y escribe la medida en JSON por stderr."""
+    return [ffmpeg, '-hide_banner', '-nostats', '-i', origen, '-map', '0:a:0',
+            '-af', f'loudnorm=I={objetivo}:TP={PICO_MAXIMO}:LRA={RANGO_MAXIMO}:print_format=json', '-f', 'null', '-']
+
+def leer_medida(salida, duracion=None):
+    """Medida a partir del stderr de comando_analisis. ValueError si no trae el JSON de loudnorm."""
+    inicio = salida.rfind('{')
+    final = salida.find('}', inicio)
+    if inicio < 0 or final < 0:
+        raise ValueError('ffmpeg no devolvió la medida de loudnorm')
+    datos = json.loads(salida[inicio:final + 1])
+    return Medida(float(datos['input_i']), float(datos['input_tp']), float(datos['input_lra']),
+                  float(datos['input_thresh']), duracion)
+
+def filtro_pista(medida, objetivo=OBJETIVO_LUFS):
+    """Filtro loudnorm de segunda pasada, lineal, con la medida de la pista."""
+    return (f'loudnorm=I={objetivo}:TP={PICO_MAXIMO}:LRA={RANGO_MAXIMO}:measured_I={medida.lufs}:'
+            f'measured_TP={medida.pico}:measured_LRA={medida.rango}:measured_thresh={medida.umbral}:linear=true')
+
+def ganancia_album(medidas, objetivo=OBJETIVO_LUFS):
+    """dB que llevan el conjunto de medidas al objetivo sin que el pico más alto pase de PICO_MAXIMO.
+
+    La sonoridad del álbum es la media de la energía de cada pista ponderada por su
+    duración (sin duración, cada pista pesa lo mismo). None si no hay nada que medir.
+    """
+    medidas = [medida for medida in medidas if not medida.silencio]
+    if not medidas:
+        return None
+    pesos = [medida.duracion or 1.0 for medida in medidas]
+    energia = sum(peso * 10 ** (medida.lufs / 10) for peso, medida in zip(pesos, medidas)) / sum(pesos)
+    ganancia = objetivo - 10 * math.log10(energia)
+    return min(ganancia, PICO_MAXIMO - max(medida.pico for medida in medidas))
+
+class CacheSonoridad:
+    """Medidas EBU R128 por clave de pista ('Youtube:id'), en SQLite. El audio de un ID no cambia: no caducan."""
+
+    def __init__(self, ruta=RUTA_SONORIDAD):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conexion(self):
+        # Se abre al primer uso: la caché del proceso existe aunque nadie normalice
+        if self._db is None:
+            if self.ruta != ':memory:':
+                os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            self._db = sqlite3.connect(self.ruta, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''CREATE TABLE IF NOT EXISTS sonoridad (
+                clave TEXT PRIMARY KEY,
+                lufs REAL NOT NULL,
+                pico REAL NOT NULL,
+                rango REAL NOT NULL,
+                umbral REAL NOT NULL,
+                duracion REAL,
+                creado REAL NOT NULL)''')
+        return self._db
+
+    def obtener(self, clave):
+        return self.obtener_varias([clave]).get(clave)
+
+    def obtener_varias(self, claves):
+        """{clave: Medida} de las claves que tienen medida guardada."""
+        claves = list(claves)
+        medidas = {}
+        with self._lock:
+            db = self._conexion()
+            # Por tandas, por debajo del límite de parámetros de SQLite
+            for inicio in range(0, len(claves), 500):
+                tanda = claves[inicio:inicio + 500]
+                for clave, *valores in db.execute(
+                        f'SELECT clave, lufs, pico, rango, umbral, duracion FROM sonoridad '
+                        f'WHERE clave IN ({",".join("?" * len(tanda))})', tanda):
+                    medidas[clave] = Medida(*valores)
+        return medidas
+
+    def guardar(self, clave, medida):
+        with self._lock:
+            self._conexion().execute(
+                'INSERT OR REPLACE INTO sonoridad VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (clave, medida.lufs, medida.pico, medida.rango, medida.umbral, medida.duracion, time.time()))
+
+    def cerrar(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+# Compartida por todos los trabajos del proceso
+CACHE_SONORIDAD = CacheSonoridad()
+
+class Normalizador:
+    """Mide las pistas de una playlist en paralelo y da el filtro de ffmpeg que las normaliza."""
+
+    def __init__(self, modo='pista', cache=CACHE_SONORIDAD, ffmpeg='ffmpeg', procesos=None, control=None,
+                 metricas=None, objetivo=OBJETIVO_LUFS, turnos=None):
+        """turnos: semáforo de procesos ffmpeg compartido con quien transcodifica (None: solo cuenta procesos)."""
+        if modo not in MODOS_NORMALIZACION:
+            raise ValueError(f'Modo de normalización desconocido: {modo} (opciones: {", ".join(MODOS_NORMALIZACION)})')
+        self.modo = modo
+        self.cache = cache
+        self.ffmpeg = ffmpeg or 'ffmpeg'
+        self.control = control
+        self.metricas = metricas
+        self.objetivo = objetivo
+        self.turnos = turnos
+        self._pool = ThreadPoolExecutor(procesos or os.cpu_count() or 1, thread_name_prefix='sonoridad')
+        self._lock = threading.Lock()
+        self._lock_album = threading.Lock()
+        self._medidas = {}     # origen -> Future de su Medida (None si no se pudo medir)
+        self._claves = set()   # pistas del álbum, para la ganancia de 'album'
+        self._ganancia = None
+        self.album_cerrado = False
+        self.analizadas = 0    # pistas que hubo que analizar (el resto salió de la caché)
+
+    @property
+    def por_album(self):
+        return self.modo == 'album'
+
+    def recorrer(self, entradas):
+        """Devuelve entradas tal cual, anotando cada pista como parte del álbum."""
+        for entrada in entradas:
+            if entrada and entrada.get('id') and (entrada.get('ie_key') or entrada.get('extractor_key')):
+                with self._lock:
+                    self._claves.add(clave_info(entrada))
+            yield entrada
+
+    def analizar(self, origen, info=None):
+        """Empieza a medir origen, si su pista no tiene ya medida guardada."""
+        info = info or {}
+        clave = clave_info(info) if info.get('id') else None
+        with self._lock:
+            if origen in self._medidas:
+                return
+            if clave:
+                self._claves.add(clave)
+            self._medidas[origen] = self._pool.submit(self._medir, origen, clave, info)
+
+    def _medir(self, origen, clave, info):
+        if clave and self.cache:
+            medida = self.cache.obtener(clave)
+            if medida:
+                return medida
+        if self.control and self.control.cancelado:
+            return None
+        with medir(self.metricas, 'sonoridad', info.get('playlist_index')):
+            medida = self._ejecutar(origen, info.get('duration'))
+        if medida and clave and self.cache:
+            self.cache.guardar(clave, medida)
+        return medida
+
+    def _ejecutar(self, origen, duracion):
+        with self.turnos or contextlib.nullcontext():
+            if self.control and self.control.cancelado:
+                return None
+            try:
+                proceso = subprocess.Popen(comando_analisis(origen, self.ffmpeg, self.objetivo),
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                                           errors='replace', creationflags=CREATIONFLAGS)
+            except OSError:
+                return None
+            while True:
+                try:
+                    _, salida = proceso.communicate(timeout=0.2)
+                    break
+                except subprocess.TimeoutExpired:
+                    if self.control and self.control.cancelado:
+                        proceso.kill()
+                        proceso.communicate()
+                        return None
+        with self._lock:
+            self.analizadas += 1
+        try:
+            return leer_medida(salida, duracion) if proceso.returncode == 0 else None
+        except (ValueError, KeyError):
+            return None
+
+    def cerrar_album(self):
+        """Espera a las medidas empezadas y fija, una sola vez, la ganancia del álbum; llamar antes de argumentos."""
+        with self._lock_album:
+            if self.album_cerrado:
+                return self._ganancia
+            with self._lock:
+                futuros = list(self._medidas.values())
+                claves = list(self._claves)
+            for futuro in futuros:
+                futuro.result()
+            if self.cache:
+                medidas = self.cache.obtener_varias(claves).values()
+            else:
+                # Sin caché, la ganancia sale solo de las pistas medidas en esta ejecución
+                medidas = [futuro.result() for futuro in futuros if futuro.result()]
+            self._ganancia = ganancia_album(medidas, self.objetivo)
+            self.album_cerrado = True
+            return self._ganancia
+
+    def argumentos(self, origen, info=None):
+        """Opciones de ffmpeg para la salida de audio de origen; () si no hay medida con la que normalizar."""
+        with self._lock:
+            futuro = self._medidas.get(origen)
+        if self.por_album:
+            if self._ganancia is None:
+                return ()
+            return ('-af', f'volume={self._ganancia:.2f}dB')
+        medida = futuro.result() if futuro else None
+        if not medida or medida.silencio:
+            return ()
+        # loudnorm sale a 192 kHz: se vuelve a la frecuencia original
+        frecuencia = (info or {}).get('asr') or FRECUENCIA_MUESTREO
+        return ('-af', filtro_pista(medida, self.objetivo), '-ar', str(frecuencia))
+
+    def cerrar(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,238 @@
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from .control import ControlTrabajo, TrabajoCancelado
+from .metricas import MetricasTrabajo
+from .motor import descargar_playlist
+from .progreso import ColaProgreso
+
+# ============ COLA DE TRABAJOS ============
+#
+# Cada URL con su perfil es un trabajo. Un número fijo de hilos toma siempre el trabajo
+# pendiente de mayor prioridad (a igual prioridad, el más antiguo) y lo descarga con
+# descargar_playlist. Cada trabajo tiene su propio ControlTrabajo y su ColaProgreso, así
+# que pausar o cancelar uno no afecta a los demás.
+#
+# Con un DiarioTrabajos, la cola sobrevive a un cierre o una caída: al crear el gestor
+# se reanudan los trabajos que quedaron sin terminar. Cerrar el gestor interrumpe los
+# trabajos pero los deja en el diario; cancelar uno lo borra de él.
+#
+# Con metricas=True, cada trabajo mide sus etapas (ver metricas.py) y, si se indica
+# carpeta_eventos, escribe su log de eventos en 'trabajo-<id>-<fecha>.jsonl'.
+#
+# Con un PlanificadorAnchoBanda, los trabajos en curso se reparten a partes iguales su
+# límite de ancho de banda (ver ancho_banda.py).
+
+TRABAJOS_SIMULTANEOS = 2
+
+EN_COLA = 'En cola'
+EN_CURSO = 'Descargando'
+PAUSADO = 'Pausado'
+COMPLETADO = 'Completado'
+CANCELADO = 'Cancelado'
+ERROR = 'Error'
+
+@dataclass
+class Trabajo:
+    id: int
+    url: str
+    destino: str
+    perfil: object
+    prioridad: int = 0
+    opciones: dict = field(default_factory=dict)
+    estado: str = EN_COLA
+    error: str = None
+    resultado: object = None
+    control: ControlTrabajo = field(default_factory=ControlTrabajo)
+    progreso: ColaProgreso = field(default_factory=ColaProgreso)
+    metricas: MetricasTrabajo = None
+    resolucion: tuple = None     # (info_playlist, entradas) ya extraídos; no se guarda en el diario
+
+    @property
+    def terminado(self):
+        return self.estado in (COMPLETADO, CANCELADO, ERROR)
+
+class GestorTrabajos:
+    def __init__(self, max_trabajos=TRABAJOS_SIMULTANEOS, al_terminar=None, diario=None, metricas=False,
+                 carpeta_eventos=None, planificador=None, ajustes=None, **opciones_motor):
+        """ajustes (AjustesDescarga) y opciones_motor (cookiefile, opciones...) valen para todos los trabajos."""
+        self.ajustes = ajustes
+        self.opciones_motor = opciones_motor
+        self.al_terminar = al_terminar
+        self.diario = diario
+        self.metricas = metricas or bool(carpeta_eventos)
+        self.carpeta_eventos = carpeta_eventos
+        self.planificador = planificador
+        self._ids = itertools.count(1)
+        self._trabajos = {}
+        self._pendientes = []
+        self._cond = threading.Condition()
+        self._cerrando = False
+        if diario:
+            for id_trabajo, url, destino, perfil, prioridad, opciones, pausado in diario.pendientes():
+                trabajo = Trabajo(id_trabajo, url, destino, perfil, prioridad, opciones)
+                if pausado:
+                    trabajo.control.pausar()
+                    trabajo.estado = PAUSADO
+                self._trabajos[trabajo.id] = trabajo
+                self._pendientes.append(trabajo)
+        self._hilos = [threading.Thread(target=self._trabajar, daemon=True) for _ in range(max(1, max_trabajos))]
+        for hilo in self._hilos:
+            hilo.start()
+
+    # --- API ---
+
+    def agregar(self, url, destino, perfil='MP3', prioridad=0, resolucion=None, **opciones):
+        """Encola un trabajo; opciones sustituye a las opciones_motor solo para él.
+
+        resolucion es un (info_playlist, entradas) ya extraído de url, p. ej. por resolver_lote.
+        Si entradas es un iterador (una resolución progresiva), solo puede usarla un trabajo.
+        """
+        with self._cond:
+            if self.diario:
+                texto_perfil = perfil if isinstance(perfil, str) else perfil.clave
+                id_trabajo = self.diario.crear(url, destino, texto_perfil, prioridad, opciones)
+            else:
+                id_trabajo = next(self._ids)
+            if resolucion and isinstance(resolucion[1], list):
+                # Lista propia: la descarga la vacía y la misma resolución puede servir a varios perfiles
+                resolucion = (resolucion[0], list(resolucion[1]))
+            trabajo = Trabajo(id_trabajo, url, destino, perfil, prioridad, opciones, resolucion=resolucion)
+            self._trabajos[trabajo.id] = trabajo
+            self._pendientes.append(trabajo)
+            self._cond.notify()
+        return trabajo
+
+    def trabajos(self):
+        with self._cond:
+            return list(self._trabajos.values())
+
+    def pausar(self, id_trabajo):
+        with self._cond:
+            trabajo = self._trabajos[id_trabajo]
+            if not trabajo.terminado:
+                trabajo.control.pausar()
+                trabajo.estado = PAUSADO
+                if self.diario:
+                    self.diario.actualizar(id_trabajo, pausado=True)
+
+    def reanudar(self, id_trabajo):
+        with self._cond:
+            trabajo = self._trabajos[id_trabajo]
+            if trabajo.estado == PAUSADO:
+                trabajo.control.reanudar()
+                trabajo.estado = EN_COLA if trabajo in self._pendientes else EN_CURSO
+                if self.diario:
+                    self.diario.actualizar(id_trabajo, pausado=False)
+                self._cond.notify()
+
+    def cancelar(self, id_trabajo):
+        with self._cond:
+            trabajo = self._trabajos[id_trabajo]
+            if trabajo.terminado:
+                return
+            trabajo.control.cancelar()
+            if trabajo not in self._pendientes:
+                return  # el hilo que lo descarga lo dará por cancelado
+            self._pendientes.remove(trabajo)
+            self._finalizar(trabajo, CANCELADO)
+        self._avisar(trabajo)
+
+    def cambiar_prioridad(self, id_trabajo, prioridad):
+        with self._cond:
+            self._trabajos[id_trabajo].prioridad = prioridad
+            if self.diario:
+                self.diario.actualizar(id_trabajo, prioridad=prioridad)
+
+    def esperar(self):
+        """Bloquea hasta que no quede ningún trabajo pendiente ni en curso."""
+        with self._cond:
+            self._cond.wait_for(lambda: all(t.terminado for t in self._trabajos.values()))
+
+    def cerrar(self):
+        """Cancela todo lo que quede y espera a que los hilos terminen.
+
+        Los trabajos interrumpidos siguen en el diario y se reanudan con el próximo gestor.
+        """
+        with self._cond:
+            self._cerrando = True
+            for trabajo in self._trabajos.values():
+                if not trabajo.terminado:
+                    trabajo.control.cancelar()
+            cancelados, self._pendientes = self._pendientes, []
+            for trabajo in cancelados:
+                self._finalizar(trabajo, CANCELADO)
+            self._cond.notify_all()
+        for trabajo in cancelados:
+            self._avisar(trabajo)
+        for hilo in self._hilos:
+            hilo.join()
+
+    # --- Hilos de trabajo ---
+
+    def _siguiente(self):
+        # Trabajo pendiente de mayor prioridad que no esté en pausa; None si toca cerrar
+        while True:
+            if self._cerrando:
+                return None
+            listos = [t for t in self._pendientes if not t.control.pausado]
+            if listos:
+                trabajo = max(listos, key=lambda t: (t.prioridad, -t.id))
+                self._pendientes.remove(trabajo)
+                trabajo.estado = EN_CURSO
+                return trabajo
+            self._cond.wait()
+
+    def _trabajar(self):
+        while True:
+            with self._cond:
+                trabajo = self._siguiente()
+            if trabajo is None:
+                return
+            # La resolución solo sirve para el primer intento; no se retiene mientras dura la cola
+            resolucion, trabajo.resolucion = trabajo.resolucion, None
+            diario = self.diario.trabajo(trabajo.id) if self.diario else None
+            if self.metricas:
+                trabajo.metricas = MetricasTrabajo(self._ruta_eventos(trabajo), trabajo.id)
+            cuota = self.planificador.cuota(trabajo.id, control=trabajo.control) if self.planificador else None
+            try:
+                resultado = descargar_playlist(
+                    trabajo.url, trabajo.destino, trabajo.perfil, progreso=trabajo.progreso, control=trabajo.control,
+                    diario=diario, metricas=trabajo.metricas, ancho_banda=cuota, resolucion=resolucion,
+                    ajustes=self.ajustes, **{**self.opciones_motor, **trabajo.opciones})
+            except TrabajoCancelado:
+                estado, error, resultado = CANCELADO, None, None
+            except Exception as e:
+                estado, error, resultado = ERROR, str(e), None
+            else:
+                estado, error = COMPLETADO, None
+            finally:
+                if cuota:
+                    cuota.cerrar()
+            with self._cond:
+                trabajo.resultado = resultado
+                trabajo.error = error
+                self._finalizar(trabajo, estado)
+            if trabajo.metricas:
+                trabajo.metricas.evento('trabajo', estado=estado, error=error)
+                trabajo.metricas.cerrar()
+            self._avisar(trabajo)
+
+    def _ruta_eventos(self, trabajo):
+        if not self.carpeta_eventos:
+            return None
+        return os.path.join(self.carpeta_eventos, f"trabajo-{trabajo.id}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+
+    def _finalizar(self, trabajo, estado):
+        trabajo.estado = estado
+        if self.diario and not (estado == CANCELADO and self._cerrando):
+            self.diario.terminar(trabajo.id)
+        self._cond.notify_all()
+
+    def _avisar(self, trabajo):
+        # Fuera del lock: al_terminar puede tardar (p. ej. un messagebox) sin frenar la cola
+        if self.al_terminar:
+            self.al_terminar(trabajo)
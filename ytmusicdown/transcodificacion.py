@@ -0,0 +1,374 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from .etiquetas import (ETIQUETAS_PLAYLIST, EXTENSIONES_CON_CARATULA, argumentos_caratula, argumentos_etiquetas,
+                        comando_reetiquetar)
+from .indice import clave_info
+from .metricas import medir
+from .politica import decidir
+
+# ============ TRANSCODIFICACIÓN EN SEGUNDO PLANO ============
+#
+# Las descargas dejan el audio original (opus/m4a) en una cola acotada y un grupo de
+# procesos ffmpeg, uno por núcleo, lo lleva al formato del perfil. Así la red no espera
+# al codificador ni el codificador a la red. Cuando la cola está llena, el hilo de
+# descarga se bloquea al encolar: eso limita los archivos pendientes en disco.
+#
+# Qué hace ffmpeg con cada archivo (nada, copiar el flujo o recodificar) lo decide
+# politica.decidir con el códec que yt-dlp anotó en el info de la pista. Con un
+# Etiquetador, la misma orden escribe además las etiquetas y la carátula, y con un
+# Normalizador, el filtro que ajusta la sonoridad de la pista (ver sonoridad.py). Los
+# análisis de sonoridad del Normalizador toman turno con las transcodificaciones: entre
+# todos no hay más procesos ffmpeg a la vez que procesos.
+
+# En Windows evita que cada ffmpeg abra una consola cuando la app se empaqueta con --noconsole
+CREATIONFLAGS = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+CODECS = {
+    'aac': ('aac', 'm4a'),
+    'mp3': ('libmp3lame', 'mp3'),
+    'opus': ('libopus', 'opus'),
+}
+# kbps al recodificar en su mismo códec un perfil que no fija calidad ('AUDIO')
+CALIDADES_RECODIFICACION = {'aac': '192', 'mp3': '192', 'opus': '160'}
+# Descargas que esperan en disco a la ganancia de la normalización por álbum, como mucho
+RETENIDOS_MAXIMOS = 32
+
+@dataclass
+class Diagnostico:
+    duracion: float = 0.0
+    espera_red: float = 0.0      # segundos que los transcodificadores pasaron sin trabajo
+    espera_cpu: float = 0.0      # segundos que las descargas pasaron bloqueadas por la cola llena
+    procesos: int = 1
+    transcodificados: int = 0
+    copiados: int = 0            # pistas que llegaron con el códec del perfil (copia o nada)
+    errores: int = 0
+
+    @property
+    def limitado_por(self):
+        # Se compara el bloqueo de las descargas con el ocio medio de cada transcodificador
+        return 'cpu' if self.espera_cpu > self.espera_red / max(1, self.procesos) else 'red'
+
+def comando_ffmpeg(origen, destino, codec='mp3', calidad='192', ffmpeg='ffmpeg', etiquetas=None, caratula=None,
+                   audio=()):
+    """Orden de ffmpeg que transcodifica a codec o, con codec=None, copia el flujo de audio.
+
+    etiquetas ({clave: valor}) y caratula (ruta de una imagen) se escriben en la misma pasada.
+    audio son opciones más para el audio al transcodificar, como el filtro de un Normalizador.
+    """
+    extension = os.path.splitext(destino)[1].lstrip('.').lower()
+    orden = [ffmpeg, '-y', '-loglevel', 'error', '-i', origen]
+    if caratula and extension in EXTENSIONES_CON_CARATULA:
+        orden += ['-i', caratula, '-map', '0:a:0', *argumentos_caratula(1, caratula)]
+    else:
+        orden += ['-vn']
+    if codec is None:
+        orden += ['-c:a', 'copy']
+    else:
+        orden += [*audio, '-c:a', CODECS[codec][0], '-b:a', f'{calidad}k']
+    return orden + argumentos_etiquetas(etiquetas or {}, extension) + [destino]
+
+def copiar_reetiquetada(origen, destino, info=None, etiquetador=None, ffmpeg='ffmpeg'):
+    """Copia con ffmpeg una pista del almacén con las etiquetas de playlist de etiquetador; True si sale bien.
+
+    Sin etiquetador, la copia sale sin las etiquetas de playlist que tuviera.
+    """
+    if etiquetador:
+        etiquetas, caratula = etiquetador.etiquetas_playlist(info), etiquetador.caratula(info)
+    else:
+        etiquetas, caratula = dict.fromkeys(ETIQUETAS_PLAYLIST, ''), None
+    orden = comando_reetiquetar(origen, destino, etiquetas, caratula, ffmpeg or 'ffmpeg')
+    try:
+        return subprocess.run(orden, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              creationflags=CREATIONFLAGS).returncode == 0
+    except OSError:
+        return False
+
+class PipelineTranscodificacion:
+    def __init__(self, codec='mp3', calidad='192', procesos=None, capacidad=None, ffmpeg='ffmpeg',
+                 indice=None, control=None, diario=None, metricas=None, etiquetador=None, normalizador=None,
+                 progreso=None):
+        self.codec = codec
+        self.calidad = calidad
+        self.ffmpeg = ffmpeg or 'ffmpeg'
+        self.procesos = procesos or os.cpu_count() or 1
+        self.indice = indice
+        self.control = control
+        self.diario = diario
+        self.metricas = metricas
+        self.etiquetador = etiquetador
+        self.normalizador = normalizador
+        self.progreso = progreso
+        self.turnos = threading.Semaphore(self.procesos)
+        if normalizador and normalizador.turnos is None:
+            normalizador.turnos = self.turnos
+        self._encolados = set()
+        self._avisar = set()   # orígenes llegados de la descarga, que el progreso muestra 'Convirtiendo'
+        self._retenidos = []   # con normalización por álbum, hasta fijar la ganancia del álbum
+        self._cola = queue.Queue(maxsize=capacidad or self.procesos * 2)
+        self._lock = threading.Lock()
+        self._hilos = []
+        self._inicio = None
+        self.diagnostico = Diagnostico(procesos=self.procesos)
+
+    def __enter__(self):
+        self._inicio = time.monotonic()
+        for _ in range(self.procesos):
+            hilo = threading.Thread(target=self._trabajar, daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def encolar(self, origen, info=None):
+        """Añade un archivo descargado; bloquea mientras la cola esté llena."""
+        with self._lock:
+            # Un archivo reanudado del diario puede volver a llegar desde yt-dlp ("ya descargado")
+            if os.path.abspath(origen) in self._encolados:
+                return
+            self._encolados.add(os.path.abspath(origen))
+        if self.diario:
+            self.diario.anotar_postproceso(origen, info or {})
+        if self.normalizador:
+            self.normalizador.analizar(self._fuente_audio(origen, info), info)
+            if self.normalizador.por_album and not self.normalizador.album_cerrado:
+                self._retener(origen, info)
+                return
+        inicio = time.monotonic()
+        self._cola.put((origen, info))
+        with self._lock:
+            self.diagnostico.espera_cpu += time.monotonic() - inicio
+
+    def encolar_descarga(self, info):
+        """Callback para descargar_entradas: encola el archivo que dejó yt-dlp."""
+        origen = archivo_descargado(info)
+        if origen:
+            if self.progreso:
+                with self._lock:
+                    self._avisar.add(os.path.abspath(origen))
+            self.encolar(origen, info)
+        elif self.progreso:
+            # Sin archivo que convertir no queda nada pendiente
+            self.progreso.pista_terminada(info.get('playlist_index'), info.get('title'), False)
+
+    def reanudar_pendientes(self):
+        """Retoma los archivos que un intento anterior dejó esperando a ffmpeg.
+
+        Devuelve las claves de índice de esas pistas, que ya no hay que volver a descargar.
+        """
+        retomadas = set()
+        if not self.diario:
+            return retomadas
+        for origen, info in self.diario.postproceso_pendiente():
+            if info.get('id'):
+                retomadas.add(clave_info(info))
+            finales = self._finales(origen, info)
+            for _, temporal in finales:
+                if os.path.exists(temporal):
+                    os.remove(temporal)  # salida de un ffmpeg interrumpido a medias
+            if all(os.path.exists(destino) and destino != origen for destino, _ in finales):
+                # ffmpeg ya terminó (las salidas se renombran de forma atómica): solo faltaba anotarlo
+                for archivo in {origen, self._fuente_audio(origen, info)}:
+                    if os.path.exists(archivo):
+                        os.remove(archivo)
+                if self.indice and info:
+                    self._registrar(info, [destino for destino, _ in finales])
+                self.diario.postproceso_hecho(origen)
+            elif os.path.exists(origen):
+                self.encolar(origen, info)
+            else:
+                retomadas.discard(clave_info(info) if info.get('id') else None)
+                self.diario.postproceso_hecho(origen)
+        return retomadas
+
+    def _retener(self, origen, info):
+        # La pista espera a la ganancia del álbum. Con RETENIDOS_MAXIMOS esperando, la ganancia
+        # se fija con las medidas que ya hay y las pistas siguientes pasan sin esperar
+        with self._lock:
+            self._retenidos.append((origen, info))
+            if len(self._retenidos) < RETENIDOS_MAXIMOS:
+                return
+        self._soltar_retenidos()
+
+    def _soltar_retenidos(self):
+        self.normalizador.cerrar_album()
+        with self._lock:
+            retenidos, self._retenidos = self._retenidos, []
+        for tarea in retenidos:
+            self._cola.put(tarea)
+
+    def cerrar(self):
+        if self.normalizador and self.normalizador.por_album:
+            self._soltar_retenidos()
+        for _ in self._hilos:
+            self._cola.put(None)
+        for hilo in self._hilos:
+            hilo.join()
+        self._hilos = []
+        if self.normalizador:
+            self.normalizador.cerrar()
+        self.diagnostico.duracion = time.monotonic() - self._inicio
+        return self.diagnostico
+
+    def _trabajar(self):
+        while True:
+            inicio = time.monotonic()
+            tarea = self._cola.get()
+            with self._lock:
+                self.diagnostico.espera_red += time.monotonic() - inicio
+            if tarea is None:
+                return
+            origen, info = tarea
+            if self.control and self.control.cancelado:
+                continue
+            try:
+                accion = self._procesar(origen, info)
+            except Exception as e:
+                # Un fallo al mover, registrar o etiquetar la pista no deja la cola sin quien la vacíe
+                accion = None
+                self._anotar_error(origen, info, e)
+            self._avisar_terminada(origen, info, accion)
+            if self.diario and not (self.control and self.control.cancelado):
+                # Con un ffmpeg cancelado, el archivo sigue pendiente para cuando se reanude
+                self.diario.postproceso_hecho(origen)
+            with self._lock:
+                if accion == 'transcodificar':
+                    self.diagnostico.transcodificados += 1
+                elif accion:
+                    self.diagnostico.copiados += 1
+                else:
+                    self.diagnostico.errores += 1
+
+    def _anotar_error(self, origen, info, error):
+        print(f'ERROR: postproceso de {os.path.basename(origen)}: {error}', file=sys.stderr)
+        if self.metricas:
+            pista = info.get('playlist_index') if info else None
+            self.metricas.evento('error', pista=pista, etapa='postproceso', error=str(error))
+
+    def _avisar_terminada(self, origen, info, accion):
+        # La descarga la dejó 'Convirtiendo': acaba aquí, cuando ffmpeg deja (o no) el archivo final
+        with self._lock:
+            if os.path.abspath(origen) not in self._avisar:
+                return
+            self._avisar.discard(os.path.abspath(origen))
+        self.progreso.pista_terminada(info.get('playlist_index'), info.get('title'), accion is not None)
+
+    def _procesar(self, origen, info):
+        """Lleva un archivo descargado al formato final y lo registra; devuelve la acción o None si falla."""
+        pista = info.get('playlist_index') if info else None
+        decision = self._decidir(origen, info)
+        with medir(self.metricas, 'transcodificacion', pista, accion=decision.accion):
+            salida = self._transcodificar(origen, decision, info)
+        if not salida:
+            return None
+        with medir(self.metricas, 'escritura', pista):
+            destino = self._colocar(origen, salida, decision)
+            if self.indice and info:
+                self._registrar(info, [destino])
+        return decision.accion
+
+    def _fuente_audio(self, origen, info):
+        """Archivo del que sale el audio de origen: el propio origen."""
+        return origen
+
+    def _decidir(self, origen, info):
+        return decidir(self.codec, (info or {}).get('acodec'), origen, recodificar=self.normalizador is not None)
+
+    def _destino(self, origen, decision):
+        return os.path.splitext(origen)[0] + '.' + decision.extension
+
+    def _finales(self, origen, info):
+        """[(destino, temporal)] de los archivos que deja el postproceso de origen."""
+        decision = self._decidir(origen, info)
+        destino = self._destino(origen, decision)
+        return [(destino, temporal_ffmpeg(destino))]
+
+    def _registrar(self, info, destinos):
+        self.indice.registrar(info, destinos[0])
+
+    def _transcodificar(self, origen, decision, info=None):
+        """Salida de ffmpeg aún con su nombre temporal; origen si no hace falta ffmpeg, o None si falla."""
+        destino = self._destino(origen, decision)
+        mismo = os.path.abspath(destino) == os.path.abspath(origen)
+        if not self.etiquetador and decision.accion != 'transcodificar' and (decision.accion == 'conservar' or mismo):
+            return origen
+        # Con etiquetas, un archivo que se conservaría se reescribe con -c:a copy para llevarlas
+        etiquetas = self.etiquetador.etiquetas(info) if self.etiquetador else None
+        caratula = self.etiquetador.caratula(info) if self.etiquetador else None
+        audio = ()
+        if self.normalizador and decision.accion == 'transcodificar':
+            audio = self.normalizador.argumentos(self._fuente_audio(origen, info), info)
+        calidad = self.calidad or CALIDADES_RECODIFICACION.get(decision.codec)
+        temporal = temporal_ffmpeg(destino)
+        orden = comando_ffmpeg(origen, temporal, decision.codec, calidad, self.ffmpeg, etiquetas, caratula, audio)
+        if not self._ejecutar(orden, [temporal]):
+            return None
+        return temporal
+
+    def _colocar(self, origen, salida, decision):
+        # Deja la salida de ffmpeg con su nombre final y borra la descarga a la que sustituye
+        if salida == origen:
+            return origen
+        destino = self._destino(origen, decision)
+        os.replace(salida, destino)
+        if os.path.abspath(destino) != os.path.abspath(origen):
+            os.remove(origen)
+        return destino
+
+    def _ejecutar(self, orden, temporales):
+        # True si ffmpeg terminó bien; si no, borra las salidas a medias
+        with self.turnos:
+            try:
+                proceso = subprocess.Popen(orden, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                           creationflags=CREATIONFLAGS)
+            except OSError:
+                # ffmpeg no encontrado: se cuenta como error sin matar al hilo, o la cola se quedaría llena
+                return False
+            codigo = self._esperar(proceso)
+        if codigo == 0:
+            return True
+        for temporal in temporales:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        return False
+
+    def _esperar(self, proceso):
+        # Con un trabajo cancelado, ffmpeg se mata en vez de dejarlo terminar
+        while True:
+            try:
+                return proceso.wait(timeout=0.2)
+            except subprocess.TimeoutExpired:
+                if self.control and self.control.cancelado:
+                    proceso.kill()
+                    proceso.wait()
+                    return -1
+
+def temporal_ffmpeg(destino):
+    # Termina en la extensión final para que ffmpeg elija el contenedor por ella
+    return destino + '.tmp' + os.path.splitext(destino)[1]
+
+def archivo_descargado(info):
+    if not info:
+        return None
+    descargas = info.get('requested_downloads') or []
+    if descargas and descargas[0].get('filepath'):
+        return descargas[0]['filepath']
+    return info.get('filepath')
+
+def separar_flujos(info):
+    """info de una pista bajada con un selector 'vídeo,audio': con la altura del vídeo y el audio en 'audio_aparte'.
+
+    archivo_descargado sigue siendo el vídeo. Con una sola descarga, devuelve info tal cual.
+    """
+    descargas = [descarga for descarga in (info or {}).get('requested_downloads') or () if descarga.get('filepath')]
+    if len(descargas) < 2:
+        return info
+    video, audio = descargas[0], descargas[-1]
+    return {**info, 'height': video.get('height'), 'acodec': audio.get('acodec'), 'audio_aparte': audio['filepath']}